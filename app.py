@@ -1,83 +1,356 @@
+import time
 import streamlit as st
+from concurrent.futures import ThreadPoolExecutor
 from modules.post_generator import SocialMediaPostGenerator
 from modules.scrape_summary import ScrapeSummaryGenerator
-from modules.utils import download_image  # Import the download_image function
+from modules.image_store import ImageStore
 from modules.image_generator import ImageGenerator
+from modules.instrumentation import trace
+from modules.job_client import JobClient
+from modules.pipeline import record_run
+from modules.platforms import PLATFORMS, parse_platforms
+from modules.run_history import get_run_history
+from modules.settings import get_settings
 
 st.set_page_config(layout="wide")
 
+# Generators, clients and compiled chains are built once per process and shared by all sessions.
+# ScrapeSummaryGenerator holds per-page state, so it is created per run but reuses the shared chains.
+@st.cache_resource
+def get_post_generator(use_cache, mode):
+    return SocialMediaPostGenerator(use_cache=use_cache, mode=mode)
+
+@st.cache_resource
+def get_image_generator():
+    return ImageGenerator()
+
+# Generated images are downloaded once and served from local disk on every rerun
+@st.cache_resource
+def get_image_store():
+    return ImageStore()
+
+# With JOB_SERVICE_URL set the app is a thin client: work runs on the job service (service.py)
+# and survives refreshes and disconnects
+@st.cache_resource
+def get_job_client():
+    job_service_url = get_settings().job_service_url
+    return JobClient(job_service_url) if job_service_url else None
+
+# Speculative image generation runs here, off the script thread, while posts are written
+@st.cache_resource
+def get_speculation_executor():
+    return ThreadPoolExecutor(max_workers=4, thread_name_prefix="speculative-images")
+
+image_store = get_image_store()
+job_client = get_job_client()
+
+@st.cache_data(max_entries=32)
+def fetch_service_image(image_key):
+    return job_client.image(image_key)
+
+def load_image(image_key):
+    # Images generated by the job service live on its disk
+    return fetch_service_image(image_key) if job_client else image_store.get(image_key)
+
 # Title of the App
 st.title("Social Media Post Generator w/ Langchain, GPT 4o and Dal-E v3")
 
 # Initialize session state variables if they don't exist
-if "twitter_posts" not in st.session_state:
-    st.session_state.twitter_posts = []
-if "facebook_posts" not in st.session_state:
-    st.session_state.facebook_posts = []
-if "twitter_image_url" not in st.session_state:
-    st.session_state.twitter_image_url = None
-if "facebook_image_url" not in st.session_state:
-    st.session_state.facebook_image_url = None
+# Posts and image keys by platform name
+if "posts" not in st.session_state:
+    st.session_state.posts = {}
+if "image_keys" not in st.session_state:
+    st.session_state.image_keys = {}
 if "topic" not in st.session_state:
     st.session_state.topic = ""
 if "summary" not in st.session_state:
     st.session_state.summary = ""
+if "timings" not in st.session_state:
+    st.session_state.timings = []
+if "post_errors" not in st.session_state:
+    st.session_state.post_errors = {}
+if "speculative_images" not in st.session_state:
+    st.session_state.speculative_images = {}
+if "loaded_run" not in st.session_state:
+    st.session_state.loaded_run = None
 
 # URL Input
 url = st.text_input("Enter the URL of the post:")
 
+# Unchecking skips the response cache so "Generate" asks the model for fresh posts
+use_cache = st.sidebar.checkbox("Reuse cached LLM responses", value=True)
+# Streaming renders text as tokens arrive; cached responses arrive at once
+stream_output = st.sidebar.checkbox("Stream output", value=True)
+# Each platform is one more concurrent call in parallel mode, so more platforms barely add wall time
+platforms = st.sidebar.multiselect(
+    "Platforms", list(PLATFORMS), default=list(parse_platforms(get_settings().post_platforms)),
+    format_func=lambda name: PLATFORMS[name].display_name,
+)
+# "combined" generates every platform in one call, sending the summary only once
+post_mode = st.sidebar.selectbox("Post generation mode", ["parallel", "combined"])
+# Variants are generated concurrently, one DALL-E request each
+image_variants = st.sidebar.number_input("Image variants per platform", min_value=1, max_value=4, value=1)
+# Long pages keep only the chunks most relevant to their title within this budget
+summary_token_budget = st.sidebar.number_input("Summary input token budget (0 = whole page)", min_value=0, value=0, step=1000)
+# Starts every selected platform's images as soon as the summary is ready so the image buttons only reveal them.
+# Images that are never revealed are still billed.
+speculative_images = st.sidebar.checkbox("Generate images while posts are written", value=False)
+# Wall time, tokens and estimated cost of every stage of the latest run
+show_timings = st.sidebar.checkbox("Show timing panel", value=False)
+
 # Placeholder for the summary
 summary_placeholder = st.empty()
 
+def load_run(run):
+    # Shows a run from the history instead of generating it again
+    st.session_state.summary = run["summary"]
+    st.session_state.topic = run["topic"]
+    st.session_state.source_url = run["source_url"]
+    st.session_state.posts = run["posts"]
+    st.session_state.post_errors = run["post_errors"]
+    st.session_state.image_keys = run["image_keys"]
+    st.session_state.timings = []
+    st.session_state.loaded_run = {"id": run["id"], "created_at": run["created_at"]}
+
+# Runs are kept in the run history (RUN_HISTORY_PATH); in thin-client mode the job service writes them
+run_history = get_run_history()
+
+# An article generated before is shown at once; "Generate" regenerates it
+if url and st.session_state.get("history_url") != url:
+    st.session_state.history_url = url
+    previous_run = run_history.latest(url)
+    if previous_run:
+        load_run(previous_run)
+
+history_query = st.sidebar.text_input("Search history (URL or words)")
+if history_query:
+    for run in run_history.search(history_query, limit=10):
+        label = f"{run['topic'] or run['source_url']} ({time.strftime('%Y-%m-%d %H:%M', time.localtime(run['created_at']))})"
+        if st.sidebar.button(label, key=f"history_run_{run['id']}"):
+            load_run(run)
+
+def follow_posts_job(job_id):
+    # Shows the progress of a job on the job service and loads its result into the session
+    status_box = st.empty()
+    st.subheader("The Summary")
+    summary_box = st.empty()
+    speculation_started = False
+    try:
+        for job in job_client.follow(job_id, timeout=get_settings().job_wait_seconds):
+            status_box.info(f"Job {job['status']}" + (f": {job['stage']}" if job["stage"] else ""))
+            if job["result"] and job["result"].get("summary"):
+                summary_box.text(job["result"]["summary"])
+                # Images are started while the service is still writing the posts
+                if speculative_images and not speculation_started and job["status"] == "running":
+                    st.session_state.summary = job["result"]["summary"]
+                    st.session_state.topic = job["result"]["topic"]
+                    start_speculative_images()
+                    speculation_started = True
+    except KeyError:
+        status_box.warning("That job is no longer known to the job service.")
+        del st.query_params["job"]
+        return
+    except TimeoutError:
+        # The job id stays in the page URL, so a refresh keeps following it
+        status_box.warning("The job is taking longer than expected. Refresh the page to keep waiting for it.")
+        return
+    status_box.empty()
+    st.session_state.loaded_job = job_id
+    st.session_state.loaded_run = None
+    if job["status"] == "error":
+        st.error(f"An error occurred during post generation: {job['error']}")
+        return
+
+    result = job["result"]
+    st.session_state.summary = result["summary"]
+    st.session_state.topic = result["topic"]
+    st.session_state.source_url = result["source_url"]
+    st.session_state.posts = result["posts"]
+    st.session_state.post_errors = result["post_errors"]
+    st.session_state.timings = result["timings"]
+
+# Image prompt per platform, built from the summary alone; sizes come from the platform registry
+def build_image_prompt(platform):
+    return f"Generate an image suitable for a {PLATFORMS[platform].display_name} post about {st.session_state.topic}. {st.session_state.summary}"
+
+def create_and_store_images(image_generator, image_prompt, size, variants):
+    # Makes no Streamlit calls, so it can also run on the speculation executor
+    with trace() as image_trace:
+        image_keys, errors = [], []
+        for image_url in image_generator.iter_images(image_prompt, num_images=variants, size=size):
+            # A failed variant is reported; the others are still kept
+            if isinstance(image_url, Exception):
+                errors.append(f"{type(image_url).__name__}: {image_url}")
+                continue
+            image_key = ImageStore.make_key(image_prompt, size, len(image_keys))
+            image_store.put(image_key, image_url)
+            image_keys.append(image_key)
+    return {"image_keys": image_keys, "errors": errors, "timings": image_trace.to_dicts()}
+
+def wait_for_image_job(job_id):
+    job = job_client.wait(job_id, timeout=get_settings().job_wait_seconds)
+    if job["status"] == "error":
+        raise RuntimeError(job["error"])
+    return job["result"]
+
+def start_speculative_images():
+    # Called once the summary is known: starts every platform's images in the background
+    st.session_state.speculative_images = {}
+    for platform in platforms:
+        key = (build_image_prompt(platform), PLATFORMS[platform].image_size, image_variants)
+        if job_client:
+            st.session_state.speculative_images[key] = job_client.submit_images(*key)
+        else:
+            st.session_state.speculative_images[key] = get_speculation_executor().submit(
+                create_and_store_images, get_image_generator(), *key
+            )
+
+def generate_images(image_prompt, size):
+    # Returns the keys of the `image_variants` images for the prompt, and the errors of variants that
+    # failed, revealing speculative ones if they match
+    speculative = st.session_state.speculative_images.pop((image_prompt, size, image_variants), None)
+    if speculative is not None:
+        try:
+            result = wait_for_image_job(speculative) if job_client else speculative.result()
+            st.session_state.timings += result["timings"]
+            return result["image_keys"], result.get("errors", [])
+        except TimeoutError:
+            raise
+        except Exception:
+            # A failed speculation is retried below like a normal click
+            pass
+
+    if job_client:
+        result = wait_for_image_job(job_client.submit_images(image_prompt, size, image_variants))
+    else:
+        result = create_and_store_images(get_image_generator(), image_prompt, size, image_variants)
+    st.session_state.timings += result["timings"]
+    return result["image_keys"], result.get("errors", [])
+
 if st.button("Generate Social Media Posts"):
-    if url:
-        # First spinner: Generate the summary
-        with st.spinner('Generating summary...'):
-            try:
-                # Initialize the generator for summary
-                generator = ScrapeSummaryGenerator()
-                # Extract and summarize the content
-                docs = generator.load_and_clean_documents(url)
-                split_docs = generator.split_documents(docs)
-                generator.summarize(split_docs)
-                summary_info = generator.get_summary_info()
-                st.session_state.summary = summary_info["summary"]
-                st.session_state.topic = summary_info["topic"]
-                st.session_state.source_url = summary_info["source_url"]
-
-                # Display the summary
-                st.subheader("The Summary")
-                st.text(st.session_state.summary)
-
-            except Exception as e:
-                st.error(f"An error occurred during summary generation: {e}")
-
-        # Second spinner: Generate the social media posts
-        with st.spinner('Generating posts...'):
-            try:
-                # Initialize post generator
-                post_generator = SocialMediaPostGenerator()
-                # Generate social media posts
-                social_media_posts = post_generator.generate_social_media_posts(
-                    st.session_state.summary, 
-                    st.session_state.topic, 
-                    st.session_state.source_url
-                )
-
-                # Save posts to session state
-                st.session_state.twitter_posts = social_media_posts["branches"]["twitter"]
-                st.session_state.facebook_posts = social_media_posts["branches"]["facebook"]
-
-            except Exception as e:
-                st.error(f"An error occurred during post generation: {e}")
+    st.session_state.loaded_run = None
+    if not platforms:
+        st.warning("Please select at least one platform.")
+    elif url and job_client:
+        try:
+            job_id = job_client.submit_posts(url, use_cache=use_cache, post_mode=post_mode, summary_token_budget=summary_token_budget, platforms=platforms)
+        except Exception as e:
+            st.error(f"The job service did not accept the job: {e}")
+        else:
+            # The job id goes into the page URL so a refresh picks the running job back up
+            st.query_params["job"] = job_id
+            follow_posts_job(job_id)
+    elif url:
+        # Every stage of this run is collected for the timing panel
+        with trace() as run_trace:
+            # First spinner: Generate the summary
+            with st.spinner('Generating summary...'):
+                try:
+                    # Initialize the generator for summary
+                    generator = ScrapeSummaryGenerator(use_cache=use_cache, summary_token_budget=summary_token_budget)
+                    # Extract and summarize the content
+                    docs = generator.load_and_clean_documents(url)
+                    split_docs = generator.split_documents(docs)
+
+                    # Display the summary
+                    st.subheader("The Summary")
+                    summary_box = st.empty()
+                    if stream_output:
+                        summary_text = ""
+                        for chunk in generator.stream_summary(split_docs):
+                            summary_text += chunk
+                            summary_box.text(summary_text)
+                    else:
+                        generator.summarize(split_docs)
+
+                    summary_info = generator.get_summary_info()
+                    st.session_state.summary = summary_info["summary"]
+                    st.session_state.topic = summary_info["topic"]
+                    st.session_state.source_url = summary_info["source_url"]
+                    summary_box.text(st.session_state.summary)
+                    if summary_info["reused_from"]:
+                        st.caption(f"Summary reused from {summary_info['reused_from']} (same article)")
+                    if speculative_images:
+                        start_speculative_images()
+
+                except Exception as e:
+                    st.error(f"An error occurred during summary generation: {e}")
+
+            # Second spinner: Generate the social media posts
+            with st.spinner('Generating posts...'):
+                try:
+                    # Shared post generator
+                    post_generator = get_post_generator(use_cache, post_mode)
+                    if stream_output:
+                        # Render each platform's posts as their JSON streams in
+                        stream_cols = st.columns(len(platforms))
+                        placeholders = {platform: stream_cols[idx].empty() for idx, platform in enumerate(platforms)}
+                        streamed_posts = {platform: [] for platform in platforms}
+                        stream_errors = {}
+                        for platform, posts in post_generator.stream_social_media_posts(
+                            st.session_state.summary,
+                            st.session_state.topic,
+                            st.session_state.source_url,
+                            platforms
+                        ):
+                            if isinstance(posts, Exception):
+                                # The other platforms keep streaming; this one is reported below
+                                stream_errors[platform] = f"{type(posts).__name__}: {posts}"
+                                streamed_posts[platform] = []
+                                continue
+                            streamed_posts[platform] = posts if isinstance(posts, list) else [posts]
+                            with placeholders[platform].container():
+                                for post in streamed_posts[platform]:
+                                    if isinstance(post, dict):
+                                        st.code(post.get(PLATFORMS[platform].post_key, ""), language="text")
+
+                        # The columns below render the final posts
+                        for placeholder in placeholders.values():
+                            placeholder.empty()
+                        # Streamed posts are checked once complete; only failing ones are regenerated
+                        branches = post_generator.validate_and_repair(
+                            {platform: posts for platform, posts in streamed_posts.items() if platform not in stream_errors},
+                            st.session_state.summary,
+                            st.session_state.topic,
+                            st.session_state.source_url
+                        )
+                        social_media_posts = {
+                            "branches": {**{platform: [] for platform in stream_errors}, **branches},
+                            "errors": stream_errors,
+                        }
+                    else:
+                        # Generate social media posts
+                        social_media_posts = post_generator.generate_social_media_posts(
+                            st.session_state.summary, 
+                            st.session_state.topic, 
+                            st.session_state.source_url,
+                            platforms
+                        )
+
+                    # Save posts to session state
+                    st.session_state.posts = social_media_posts["branches"]
+                    st.session_state.post_errors = social_media_posts["errors"]
+                    record_run(
+                        {"summary": st.session_state.summary, "topic": st.session_state.topic, "source_url": st.session_state.source_url},
+                        social_media_posts["branches"],
+                        social_media_posts["errors"],
+                    )
+
+                except Exception as e:
+                    st.error(f"An error occurred during post generation: {e}")
+        st.session_state.timings = run_trace.to_dicts()
 
     else:
         st.warning("Please enter a URL.")
+elif job_client and "job" in st.query_params and st.session_state.get("loaded_job") != st.query_params["job"]:
+    follow_posts_job(st.query_params["job"])
+elif st.session_state.loaded_run:
+    generated_at = time.strftime("%Y-%m-%d %H:%M", time.localtime(st.session_state.loaded_run["created_at"]))
+    st.info(f"Previously generated on {generated_at}. Click \"Generate Social Media Posts\" to regenerate.")
+    st.subheader("The Summary")
+    st.text(st.session_state.summary)
 
 
-# Two-column layout for Twitter and Facebook posts
-col1, col2 = st.columns(2)
-
 # Custom CSS for styling the code block
 custom_css = """
     <style>
@@ -98,43 +371,65 @@ custom_css = """
 
 st.markdown(custom_css, unsafe_allow_html=True)
 
-# Display the Twitter posts and image generation
-with col1:
-    st.subheader("Twitter Posts")
-    for idx, post in enumerate(st.session_state.twitter_posts):
-        st.code(post["tweet"], language="text")
-    
-    # Generate Twitter Image button (disabled until Twitter posts are generated)
-    if st.session_state.twitter_posts:
-        if st.button("Generate Twitter Image", key="generate_twitter_image"):
-            with st.spinner('Generating Twitter image...'):
-                image_generator = ImageGenerator()
-                st.session_state.twitter_image_url = image_generator.create_image(f"Generate an image suitable for a Twitter post about {st.session_state.topic}. {st.session_state.summary}", size="1024x1024")
-
-    # Display Twitter image if generated
-    if st.session_state.twitter_image_url:
-        st.image(st.session_state.twitter_image_url, caption="Twitter Image", use_column_width=True)
-        img_data = download_image(st.session_state.twitter_image_url)
-        st.download_button(label="Download Twitter Image", data=img_data, file_name="twitter_image.png", mime="image/png")
-
-# Display the Facebook posts and image generation
-with col2:
-    st.subheader("Facebook Posts")
-    for idx, post in enumerate(st.session_state.facebook_posts):
-        if isinstance(post, dict) and "fb_post" in post:
-            st.code(post["fb_post"], language="text")
+def show_platform(platform):
+    # One platform's posts, its image button and its images
+    spec = PLATFORMS[platform]
+    noun = spec.qualified_noun[:1].upper() + spec.qualified_noun[1:]
+    st.subheader(f"{spec.display_name} Posts")
+    if platform in st.session_state.post_errors:
+        st.error(f"{spec.display_name} posts could not be generated: {st.session_state.post_errors[platform]}")
+    posts = st.session_state.posts.get(platform, [])
+    for idx, post in enumerate(posts):
+        if isinstance(post, dict) and spec.post_key in post:
+            st.code(post[spec.post_key], language="text")
+            if post.get("problems"):
+                st.warning(f"{noun} {idx+1} {'; '.join(post['problems'])}.")
         else:
-            st.error(f"Error in generating Facebook post {idx+1}. Please try regenerating.")    
-    
-    # Generate Facebook Image button (disabled until Facebook posts are generated)
-    if st.session_state.facebook_posts:
-        if st.button("Generate Facebook Image", key="generate_facebook_image"):
-            with st.spinner('Generating Facebook image...'):
-                image_generator = ImageGenerator()
-                st.session_state.facebook_image_url = image_generator.create_image(f"Generate an image suitable for a Facebook post about {st.session_state.topic}. {st.session_state.summary}", size="1792x1024")
-
-    # Display Facebook image if generated
-    if st.session_state.facebook_image_url:
-        st.image(st.session_state.facebook_image_url, caption="Facebook Image", use_column_width=True)
-        img_data = download_image(st.session_state.facebook_image_url)
-        st.download_button(label="Download Facebook Image", data=img_data, file_name="facebook_image.png", mime="image/png")
+            st.error(f"Error in generating {noun} {idx+1}. Please try regenerating.")
+
+    # Generate Image button (disabled until the platform's posts are generated)
+    if posts:
+        if st.button(f"Generate {spec.display_name} Image", key=f"generate_{platform}_image"):
+            with st.spinner(f'Generating {spec.display_name} image...'):
+                try:
+                    image_keys, image_errors = generate_images(build_image_prompt(platform), spec.image_size)
+                    st.session_state.image_keys[platform] = image_keys
+                    run_history.set_images(st.session_state.source_url, platform, image_keys)
+                    for error in image_errors:
+                        st.warning(f"A {spec.display_name} image could not be generated: {error}")
+                except TimeoutError:
+                    st.error(f"The {spec.display_name} images did not finish in time. Please try again.")
+                except Exception as e:
+                    st.error(f"The {spec.display_name} images could not be generated: {e}")
+
+    # Display the platform's images if generated
+    for idx, image_key in enumerate(st.session_state.image_keys.get(platform, [])):
+        img_data = load_image(image_key)
+        if img_data is None:
+            continue
+        st.image(img_data, caption=f"{spec.display_name} Image {idx+1}", use_column_width=True)
+        st.download_button(label=f"Download {spec.display_name} Image {idx+1}", data=img_data, file_name=f"{platform}_image_{idx+1}.png", mime="image/png", key=f"download_{platform}_image_{idx}")
+
+# One column per platform with posts or errors (the selected ones before the first run), at most three to a row
+shown_platforms = [
+    platform for platform in PLATFORMS if platform in st.session_state.posts or platform in st.session_state.post_errors
+] or platforms
+for row_start in range(0, len(shown_platforms), 3):
+    row = shown_platforms[row_start:row_start + 3]
+    for col, platform in zip(st.columns(max(len(row), 2)), row):
+        with col:
+            show_platform(platform)
+
+# Timing panel: one row per stage of the latest run, slowest first
+if show_timings and st.session_state.timings:
+    with st.expander("Timing", expanded=True):
+        timings = sorted(st.session_state.timings, key=lambda span: span["duration_seconds"] or 0, reverse=True)
+        st.caption(
+            f"Total {sum(span['duration_seconds'] or 0 for span in timings):.2f} s of stage time, "
+            f"{sum(span['prompt_tokens'] + span['completion_tokens'] for span in timings)} tokens, "
+            f"estimated ${sum(span['cost_usd'] for span in timings):.4f}"
+        )
+        st.dataframe(
+            [{key: span.get(key) for key in ("stage", "duration_seconds", "retries", "prompt_tokens", "cached_tokens", "completion_tokens", "cost_usd", "error")} for span in timings],
+            use_container_width=True,
+        )
@@ -0,0 +1,46 @@
+import argparse
+
+from modules.batch_runner import read_urls, run_batch
+from modules.instrumentation import get_recorder, start_metrics_server
+from modules.platforms import PLATFORMS
+from modules.settings import get_settings
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate social media posts for a file of URLs.")
+    parser.add_argument("urls_file", help="Text file with one URL per line")
+    parser.add_argument("-o", "--output", default="results.jsonl", help="JSONL file results are appended to")
+    parser.add_argument("--scrape-concurrency", type=int, default=8)
+    parser.add_argument("--summarize-concurrency", type=int, default=4)
+    parser.add_argument("--post-concurrency", type=int, default=4)
+    parser.add_argument("--post-mode", choices=["parallel", "combined"], default="parallel",
+                        help="One call per platform, or all platforms in one call")
+    parser.add_argument("--platforms", default=get_settings().post_platforms,
+                        help=f"Comma-separated platforms to write posts for, from: {', '.join(PLATFORMS)}")
+    parser.add_argument("--queue-size", type=int, default=16, help="Max items waiting in front of each stage")
+    parser.add_argument("--metrics-port", type=int, default=get_settings().metrics_port,
+                        help="Serve Prometheus metrics on this port while the batch runs")
+    parser.add_argument("--metrics-file", help="Write the final Prometheus metrics to this file")
+    args = parser.parse_args()
+
+    if args.metrics_port:
+        start_metrics_server(args.metrics_port)
+
+    counts = run_batch(
+        read_urls(args.urls_file),
+        args.output,
+        scrape_concurrency=args.scrape_concurrency,
+        summarize_concurrency=args.summarize_concurrency,
+        post_concurrency=args.post_concurrency,
+        queue_size=args.queue_size,
+        post_mode=args.post_mode,
+        platforms=args.platforms,
+    )
+    print(f"Done: {counts['ok']} succeeded, {counts['error']} failed. Results in {args.output}")
+    if args.metrics_file:
+        with open(args.metrics_file, "w", encoding="utf-8") as f:
+            f.write(get_recorder().render_prometheus())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,362 @@
+"""
+Load test of the Streamlit app with concurrent simulated sessions.
+
+Starts the stub web and OpenAI-compatible endpoints (see benchmarks/stubs.py), runs
+`streamlit run app.py` against them in a subprocess and drives it with headless clients
+that speak Streamlit's browser websocket protocol, so sessions share one server process
+the way users share a replica. Each session opens the page, enters its own article URL,
+clicks "Generate Social Media Posts" with "Reuse cached LLM responses" unticked (so every
+session does the full work), optionally generates an image, then reruns the script a few
+times like a user changing widgets.
+
+For each concurrency level it reports per-step latency percentiles, completed sessions
+per minute, the server's RSS growth per open session and the saturation point: the first
+level where throughput grows by less than 10% over the previous level or the p95 of
+generating posts exceeds --max-slowdown times its p50 at the first level. A warm-up
+visit runs first and is not reported. RSS is read from /proc and is only reported on
+Linux. With --images, image generation is paced by the app's DALL-E rate limit (5 per
+minute), so keep the levels small. tiktoken's encoding files must be in its local cache
+(TIKTOKEN_CACHE_DIR).
+
+    python -m benchmarks.app_load
+    python -m benchmarks.app_load --sessions 1,4,16,32 --latency 0.5 --images --reruns 5
+"""
+import argparse
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.pipeline_bench import percentile
+from benchmarks.stubs import PAGE_SIZES, stub_environment
+
+APP_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app.py")
+
+URL_LABEL = "Enter the URL of the post:"
+CACHE_LABEL = "Reuse cached LLM responses"
+GENERATE_LABEL = "Generate Social Media Posts"
+IMAGE_LABEL = "Generate Twitter Image"
+
+STEPS = ("open", "enter_url", "generate", "image", "rerun")
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def rss_bytes(pid):
+    # Resident set size of a process, or None where /proc is not available (not Linux)
+    try:
+        with open(f"/proc/{pid}/status", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        return None
+    return None
+
+
+def start_app(port, state_dir):
+    """
+    Starts `streamlit run app.py` on `port` with its caches, run history and images in
+    `state_dir`, and waits until it answers its health check.
+
+    Returns:
+        subprocess.Popen: The server process.
+    """
+    import requests
+
+    env = {
+        **os.environ,
+        "LLM_CACHE_PATH": os.path.join(state_dir, "llm_cache.sqlite"),
+        "SUMMARY_INDEX_PATH": os.path.join(state_dir, "summaries.sqlite"),
+        "RUN_HISTORY_PATH": os.path.join(state_dir, "runs.sqlite"),
+        "IMAGE_STORE_DIR": os.path.join(state_dir, "images"),
+    }
+    # The app runs the pipeline itself rather than as a thin client
+    env.pop("JOB_SERVICE_URL", None)
+    process = subprocess.Popen(
+        [
+            sys.executable, "-m", "streamlit", "run", APP_PATH,
+            "--server.headless=true", f"--server.port={port}", "--server.fileWatcherType=none",
+            "--browser.gatherUsageStats=false",
+        ],
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"streamlit exited with status {process.returncode}")
+        try:
+            if requests.get(f"http://127.0.0.1:{port}/_stcore/health", timeout=1).ok:
+                return process
+        except requests.RequestException:
+            pass
+        time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError("streamlit did not become healthy within 60 s")
+
+
+class AppSession:
+    """
+    One simulated browser tab: a websocket session that reruns the app's script with
+    chosen widget values and waits for each run to finish.
+
+    Args:
+        ws_url (str): The app's websocket endpoint, e.g. "ws://127.0.0.1:8501/_stcore/stream".
+    """
+
+    def __init__(self, ws_url):
+        self.ws_url = ws_url
+        self.connection = None
+        self.page_script_hash = ""
+        self.widgets = {}  # label -> widget id, from the latest run
+        self.errors = []  # error alerts and exceptions of the latest run
+        self.code_blocks = 0  # st.code elements (posts) of the latest run
+        self._messages = {}  # cached ForwardMsgs by hash, for later references
+
+    async def connect(self):
+        from tornado.websocket import websocket_connect
+
+        self.connection = await websocket_connect(self.ws_url, subprotocols=["streamlit"])
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+
+    async def rerun(self, widget_states=(), timeout=300):
+        """
+        Reruns the script with `widget_states` and waits for the run to finish.
+
+        Args:
+            widget_states (iterable): WidgetState protos; widgets left out get their defaults.
+            timeout (float): Seconds to wait for the run.
+
+        Returns:
+            float: Seconds from sending the rerun to the end of the script run.
+        """
+        from streamlit.proto.BackMsg_pb2 import BackMsg
+
+        message = BackMsg()
+        message.rerun_script.query_string = ""
+        message.rerun_script.page_script_hash = self.page_script_hash
+        message.rerun_script.widget_states.widgets.extend(widget_states)
+        self.widgets, self.errors, self.code_blocks = {}, [], 0
+        start = time.perf_counter()
+        await self.connection.write_message(message.SerializeToString(), binary=True)
+        await asyncio.wait_for(self._read_until_finished(), timeout)
+        return time.perf_counter() - start
+
+    async def _read_until_finished(self):
+        from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+
+        while True:
+            data = await self.connection.read_message()
+            if data is None:
+                raise ConnectionError("The app closed the websocket")
+            message = ForwardMsg()
+            message.ParseFromString(data)
+            if message.WhichOneof("type") == "ref_hash":
+                message = self._messages[message.ref_hash]
+            elif message.hash:
+                self._messages[message.hash] = message
+            kind = message.WhichOneof("type")
+            if kind == "new_session":
+                self.page_script_hash = message.new_session.page_script_hash
+            elif kind == "delta" and message.delta.WhichOneof("type") == "new_element":
+                self._collect(message.delta.new_element)
+            elif kind == "script_finished" and message.script_finished != ForwardMsg.FINISHED_EARLY_FOR_RERUN:
+                return
+
+    def _collect(self, element):
+        from streamlit.proto.Alert_pb2 import Alert
+
+        kind = element.WhichOneof("type")
+        if kind in ("button", "text_input", "checkbox"):
+            widget = getattr(element, kind)
+            self.widgets[widget.label] = widget.id
+        elif kind == "alert" and element.alert.format == Alert.ERROR:
+            self.errors.append(element.alert.body)
+        elif kind == "exception":
+            self.errors.append(element.exception.message)
+        elif kind == "code":
+            self.code_blocks += 1
+
+
+def widget_state(widget_id, **value):
+    from streamlit.proto.WidgetStates_pb2 import WidgetState
+
+    return WidgetState(id=widget_id, **value)
+
+
+async def run_session(session, url, args):
+    """
+    Runs one user's visit and returns the seconds each step took. Raises if the app
+    showed an error or wrote no posts.
+    """
+    timings = {step: [] for step in STEPS}
+    await session.connect()
+    timings["open"].append(await session.rerun())
+    form = [
+        widget_state(session.widgets[URL_LABEL], string_value=url),
+        widget_state(session.widgets[CACHE_LABEL], bool_value=args.reuse_cache),
+    ]
+    timings["enter_url"].append(await session.rerun(form))
+    timings["generate"].append(
+        await session.rerun(form + [widget_state(session.widgets[GENERATE_LABEL], trigger_value=True)])
+    )
+    if session.errors or not session.code_blocks:
+        raise RuntimeError(session.errors[0] if session.errors else "No posts were shown")
+    if args.images:
+        timings["image"].append(
+            await session.rerun(form + [widget_state(session.widgets[IMAGE_LABEL], trigger_value=True)])
+        )
+    for _ in range(args.reruns):
+        timings["rerun"].append(await session.rerun(form))
+    if session.errors:
+        raise RuntimeError(session.errors[0])
+    return timings
+
+
+async def run_level(ws_url, sessions, web, pid, args, label):
+    """
+    Runs `sessions` visits at once, each with its own article URL, and samples the server's
+    RSS while they are open.
+
+    Returns:
+        dict: Latencies by step, wall seconds, errors, and baseline and peak RSS in bytes.
+    """
+    baseline = rss_bytes(pid)
+    peak = [baseline]
+    done = asyncio.Event()
+
+    async def sample_memory():
+        while not done.is_set():
+            rss = rss_bytes(pid)
+            if rss is not None:
+                peak[0] = max(peak[0] or 0, rss)
+            await asyncio.sleep(0.1)
+
+    clients = [AppSession(ws_url) for _ in range(sessions)]
+    sampler = asyncio.create_task(sample_memory())
+    start = time.perf_counter()
+    # Every URL is new to the app, so no session is answered from the run history
+    outcomes = await asyncio.gather(
+        *(
+            run_session(client, f"{web.page_url(args.page)}/{label}-session-{i}", args)
+            for i, client in enumerate(clients)
+        ),
+        return_exceptions=True,
+    )
+    wall = time.perf_counter() - start
+    # Sessions stay connected until the whole level is done, so the peak holds all of them
+    done.set()
+    await sampler
+    for client in clients:
+        client.close()
+
+    latencies = {step: [] for step in STEPS}
+    errors = []
+    for outcome in outcomes:
+        if isinstance(outcome, BaseException):
+            errors.append(f"{type(outcome).__name__}: {outcome}")
+            continue
+        for step, values in outcome.items():
+            latencies[step].extend(values)
+    return {"latencies": latencies, "wall": wall, "errors": errors, "baseline_rss": baseline, "peak_rss": peak[0]}
+
+
+def report(sessions, result):
+    completed = sessions - len(result["errors"])
+    per_minute = completed / result["wall"] * 60
+    memory = (
+        f"{(result['peak_rss'] - result['baseline_rss']) / sessions / 1_000_000:6.1f} MB/session"
+        if result["baseline_rss"] is not None else "   n/a MB/session"
+    )
+    print(f"sessions={sessions:<4} {per_minute:7.1f} sessions/min  wall {result['wall']:6.1f} s  {memory}  errors {len(result['errors'])}")
+    for step in STEPS:
+        values = result["latencies"][step]
+        if values:
+            print(
+                f"    {step:<10} p50 {percentile(values, 50):6.2f} s  p95 {percentile(values, 95):6.2f} s  "
+                f"p99 {percentile(values, 99):6.2f} s  max {max(values):6.2f} s"
+            )
+    for error in sorted(set(result["errors"]))[:3]:
+        print(f"    error: {error}")
+    return per_minute
+
+
+def saturation_point(levels, results, throughputs, max_slowdown):
+    """
+    Returns (sessions, reason) for the first saturated level, or None.
+    """
+    first = results[0]["latencies"]["generate"]
+    base_p50 = percentile(first, 50) if first else None
+    for index, sessions in enumerate(levels):
+        generate = results[index]["latencies"]["generate"]
+        if results[index]["errors"]:
+            return sessions, f"{len(results[index]['errors'])} session(s) failed"
+        if base_p50 and generate and percentile(generate, 95) > max_slowdown * base_p50:
+            return sessions, f"generate p95 is over {max_slowdown:g}x the first level's p50 ({base_p50:.2f} s)"
+        if index and throughputs[index] < 1.1 * throughputs[index - 1]:
+            return sessions, "throughput grew by less than 10% over the previous level"
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", default="1,2,4,8,16", help="Comma-separated concurrent session counts")
+    parser.add_argument("--page", default="medium", choices=sorted(PAGE_SIZES), help="Article page every session uses")
+    parser.add_argument("--images", action="store_true", help="Also click \"Generate Twitter Image\"")
+    parser.add_argument("--reruns", type=int, default=3, help="Plain reruns per session after the posts")
+    parser.add_argument("--reuse-cache", action="store_true", help="Leave \"Reuse cached LLM responses\" ticked")
+    parser.add_argument("--max-slowdown", type=float, default=3.0,
+                        help="Saturated when generate p95 exceeds this multiple of the first level's p50")
+    parser.add_argument("--latency", type=float, default=0.2, help="Stub LLM time to first byte in seconds")
+    parser.add_argument("--seconds-per-token", type=float, default=0.0005, help="Stub LLM generation time per token")
+    parser.add_argument("--image-latency", type=float, default=1.0, help="Stub image generation time in seconds")
+    parser.add_argument("--port", type=int, default=None, help="Port for the app. Default is any free port.")
+    args = parser.parse_args()
+    levels = [int(level) for level in args.sessions.split(",")]
+
+    with stub_environment(
+        latency=args.latency, seconds_per_token=args.seconds_per_token, image_latency=args.image_latency
+    ) as (web, api), tempfile.TemporaryDirectory(prefix="app-load-") as state_dir:
+        port = args.port or free_port()
+        process = start_app(port, state_dir)
+        try:
+            ws_url = f"ws://127.0.0.1:{port}/_stcore/stream"
+            print(f"App on port {port}")
+            # Imports, shared clients and compiled chains are built by a first visit that is not reported
+            warmup = asyncio.run(run_level(ws_url, 1, web, process.pid, args, "warmup"))
+            if warmup["errors"]:
+                raise RuntimeError(f"Warm-up session failed: {warmup['errors'][0]}")
+            if warmup["peak_rss"] is not None:
+                print(f"Server RSS after warm-up: {warmup['peak_rss'] / 1_000_000:.0f} MB\n")
+            results, throughputs = [], []
+            for index, sessions in enumerate(levels):
+                result = asyncio.run(run_level(ws_url, sessions, web, process.pid, args, f"level-{index}"))
+                results.append(result)
+                throughputs.append(report(sessions, result))
+
+            saturated = saturation_point(levels, results, throughputs, args.max_slowdown)
+            print()
+            if saturated:
+                print(f"Saturated at {saturated[0]} concurrent sessions: {saturated[1]}")
+            else:
+                print(f"Not saturated up to {levels[-1]} concurrent sessions")
+            print(f"Stub API requests: {api.requests}")
+        finally:
+            process.terminate()
+            process.wait(timeout=30)
+
+
+if __name__ == "__main__":
+    main()
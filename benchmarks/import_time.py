@@ -0,0 +1,96 @@
+"""
+Guards cold-start import time of the modules used by the app and workers.
+
+Each module is imported in a fresh interpreter with `python -X importtime`, and the
+cumulative import time of the module itself is compared to its budget. The command
+exits non-zero when a budget is exceeded, so it can run in CI.
+
+    python -m benchmarks.import_time
+    python -m benchmarks.import_time --top 15
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+# Cumulative import budgets in milliseconds. Heavy dependencies (LangChain, the OpenAI SDK,
+# tiktoken, requests, PIL) are imported on first use, so none of these should pull them in.
+BUDGETS_MS = {
+    "modules.settings": 50,
+    "modules.utils": 50,
+    "modules.instrumentation": 50,
+    "modules.model_router": 50,
+    "modules.platforms": 50,
+    "modules.scrape_summary": 75,
+    "modules.post_generator": 75,
+    "modules.image_generator": 75,
+    "modules.pipeline": 100,
+    "modules.batch_runner": 200,
+}
+
+HEAVY_PACKAGES = ("langchain", "langchain_core", "langchain_community", "langchain_openai", "openai", "tiktoken")
+
+
+def measure(module, runs=3):
+    """
+    Imports a module in fresh interpreters and parses the -X importtime report.
+
+    Args:
+        module (str): Dotted module name.
+        runs (int): Number of cold imports; the fastest is kept. Default is 3.
+
+    Returns:
+        tuple: (cumulative milliseconds of the module import, list of (ms, name) for every import,
+        set of heavy packages that were imported).
+    """
+    best = None
+    for _ in range(runs):
+        code = f"import sys, {module}; print(','.join(p for p in {HEAVY_PACKAGES!r} if p in sys.modules))"
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", code],
+            capture_output=True,
+            text=True,
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+            check=True,
+        )
+        lines = []
+        for line in result.stderr.splitlines():
+            if not line.startswith("import time:") or "cumulative" in line:
+                continue
+            _, cumulative, name = line[len("import time:"):].split("|")
+            lines.append((int(cumulative) / 1000, name.strip(), len(name) - len(name.lstrip())))
+        # importtime lists children before their parent, indented deeper; keep the module's subtree
+        position = next(i for i, (_, name, _) in enumerate(lines) if name == module)
+        total, _, depth = lines[position]
+        imports = []
+        for ms, name, indent in reversed(lines[:position]):
+            if indent <= depth:
+                break
+            imports.append((ms, name))
+        heavy = {name for name in result.stdout.strip().split(",") if name}
+        if best is None or total < best[0]:
+            best = (total, imports, heavy)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--top", type=int, default=0, help="Also list the N slowest imports per module")
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    failed = False
+    for module, budget in BUDGETS_MS.items():
+        total, imports, heavy = measure(module, args.runs)
+        status = "ok" if total <= budget and not heavy else "FAIL"
+        failed = failed or status == "FAIL"
+        note = f", eagerly imports {', '.join(sorted(heavy))}" if heavy else ""
+        print(f"{status:>4}  {module:<26} {total:8.1f} ms (budget {budget} ms){note}")
+        for ms, name in sorted(imports, reverse=True)[:args.top]:
+            print(f"      {ms:8.1f} ms  {name}")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Offline benchmark of the multi-provider model router.
+
+Starts one stub OpenAI-compatible endpoint per simulated provider, each with its own
+latency and error rate, routes summarize-sized calls for a tier through them and reports
+which backend served each call, per-backend rolling stats and the end-to-end latency
+compared with always using the slowest ("openai") backend.
+
+    python -m benchmarks.model_router
+    python -m benchmarks.model_router --calls 40 --tier standard --groq-error-rate 0.3
+"""
+import argparse
+import os
+import statistics
+import time
+
+from langchain_core.messages import HumanMessage
+
+from benchmarks.stubs import PARAGRAPH, StubOpenAIServer
+from modules.model_router import Backend, ModelRouter
+
+PROMPT = "Please summarize the following content.\n\nContent: " + PARAGRAPH * 20
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=30)
+    parser.add_argument("--tier", default="standard", choices=("fast", "standard", "best"))
+    parser.add_argument("--openai-latency", type=float, default=0.6)
+    parser.add_argument("--anthropic-latency", type=float, default=0.4)
+    parser.add_argument("--groq-latency", type=float, default=0.1)
+    parser.add_argument("--groq-error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    servers = {
+        "openai": StubOpenAIServer(latency=args.openai_latency).start(),
+        "anthropic": StubOpenAIServer(latency=args.anthropic_latency).start(),
+        "groq": StubOpenAIServer(latency=args.groq_latency, error_rate=args.groq_error_rate, error_status=503).start(),
+    }
+    os.environ.setdefault("LLM_MAX_ATTEMPTS", "2")
+    router = ModelRouter([
+        Backend("openai", "gpt-4o", "best", servers["openai"].api_base, "stub-key"),
+        Backend("anthropic", "claude-3-5-haiku-latest", "standard", servers["anthropic"].api_base, "stub-key"),
+        Backend("groq", "llama-3.1-70b-versatile", "standard", servers["groq"].api_base, "stub-key"),
+    ])
+    # A separate backend object so the baseline calls do not count in the router's stats
+    baseline = ModelRouter([Backend("openai", "gpt-4o", "best", servers["openai"].api_base, "stub-key")])
+    messages = [HumanMessage(PROMPT)]
+
+    try:
+        for label, current in (("routed", router), ("openai only", baseline)):
+            latencies, errors = [], 0
+            for _ in range(args.calls):
+                start = time.perf_counter()
+                try:
+                    current.invoke(args.tier, messages, None, temperature=0, use_cache=False)
+                except Exception:
+                    errors += 1
+                latencies.append(time.perf_counter() - start)
+            print(
+                f"{label:>12}: p50 {statistics.median(latencies):.2f}s, max {max(latencies):.2f}s, "
+                f"total {sum(latencies):.1f}s, {errors} failed"
+            )
+        print()
+        for name, stats in router.stats().items():
+            latency = stats["median_latency_seconds"]
+            print(
+                f"{name:>36} [{stats['tier']:>8}]: {stats['calls']:>3} calls, {stats['error_rate']:.0%} errors, "
+                + (f"p50 {latency:.2f}s" if latency is not None else "no successful calls")
+            )
+    finally:
+        for server in servers.values():
+            server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""
+Offline end-to-end benchmark of the pipeline stages.
+
+Runs every stage against local stub servers (see benchmarks/stubs.py), so no network
+or API key is needed, and reports per-stage latency percentiles, throughput at each
+concurrency level and peak Python memory of load_and_clean_documents per page size.
+tiktoken's encoding files must be in its local cache (TIKTOKEN_CACHE_DIR).
+
+    python -m benchmarks.pipeline_bench
+    python -m benchmarks.pipeline_bench --concurrency 1,8,32 --requests 64 --latency 0.5
+    HEDGE_REQUESTS=true python -m benchmarks.pipeline_bench --error-rate 0.05 --tail-rate 0.05
+"""
+import argparse
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.stubs import PAGE_SIZES, stub_environment
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(q / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def run_concurrently(func, requests, concurrency):
+    """
+    Calls `func(i)` for i in range(requests) with `concurrency` threads.
+
+    Returns:
+        tuple: (list of per-call latencies in seconds, total wall-clock seconds, error count)
+    """
+    def timed(i):
+        start = time.perf_counter()
+        try:
+            func(i)
+            return time.perf_counter() - start, None
+        except Exception as e:
+            return time.perf_counter() - start, e
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(timed, range(requests)))
+    wall = time.perf_counter() - start
+    return [latency for latency, _ in results], wall, sum(1 for _, error in results if error)
+
+
+def report(stage, concurrency, latencies, wall, errors):
+    print(
+        f"{stage:<28} c={concurrency:<3} p50 {percentile(latencies, 50) * 1000:8.1f} ms  "
+        f"p95 {percentile(latencies, 95) * 1000:8.1f} ms  p99 {percentile(latencies, 99) * 1000:8.1f} ms  "
+        f"{len(latencies) / wall:7.1f} req/s  errors {errors}"
+    )
+
+
+def peak_memory(func):
+    # An untraced warm-up call first, so lazy imports and one-off setup are not counted
+    func()
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def build_stages(web, page):
+    from modules.image_generator import ImageGenerator
+    from modules.image_store import ImageStore
+    from modules.post_generator import SocialMediaPostGenerator
+    from modules.scrape_summary import ScrapeSummaryGenerator
+
+    url = web.page_url(page)
+    generator = ScrapeSummaryGenerator(use_cache=False)
+    docs = generator.load_and_clean_documents(url)
+    split_docs = generator.split_documents(docs)
+    generator.summarize(split_docs)
+    summary = generator.summary
+    post_generator = SocialMediaPostGenerator(use_cache=False)
+    image_generator = ImageGenerator(images_per_minute=100_000)
+    image_store = ImageStore(tempfile.mkdtemp(prefix="bench-images-"))
+
+    def summarize(i):
+        ScrapeSummaryGenerator(use_cache=False).summarize(split_docs)
+
+    def generate_image(i):
+        image_url = image_generator.create_image(f"benchmark image {i}")
+        image_store.put(ImageStore.make_key(f"benchmark image {i}", "1024x1024"), image_url)
+
+    return {
+        "load_and_clean_documents": lambda i: ScrapeSummaryGenerator(use_cache=False).load_and_clean_documents(url),
+        "split_documents": lambda i: generator.split_documents(docs),
+        "summarize": summarize,
+        "generate_social_media_posts": lambda i: post_generator.generate_social_media_posts(summary, generator.topic, url),
+        "image_generate_and_store": generate_image,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", default="1,4,16", help="Comma-separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=32, help="Calls per stage and concurrency level")
+    parser.add_argument("--page", default="medium", choices=sorted(PAGE_SIZES), help="Page used for the LLM stages")
+    parser.add_argument("--latency", type=float, default=0.2, help="Stub LLM time to first byte in seconds")
+    parser.add_argument("--seconds-per-token", type=float, default=0.0005, help="Stub LLM generation time per token")
+    parser.add_argument("--image-latency", type=float, default=1.0, help="Stub image generation time in seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of stub API requests answered with 429")
+    parser.add_argument("--tail-rate", type=float, default=0.0, help="Share of stub API requests delayed by --tail-latency")
+    parser.add_argument("--tail-latency", type=float, default=5.0, help="Extra delay of slow stub API requests")
+    args = parser.parse_args()
+    levels = [int(level) for level in args.concurrency.split(",")]
+
+    with stub_environment(
+        latency=args.latency,
+        seconds_per_token=args.seconds_per_token,
+        image_latency=args.image_latency,
+        error_rate=args.error_rate,
+        tail_rate=args.tail_rate,
+        tail_latency=args.tail_latency,
+    ) as (web, api):
+        from modules.scrape_summary import ScrapeSummaryGenerator
+
+        print("Peak memory of load_and_clean_documents")
+        for page, size in PAGE_SIZES.items():
+            peak = peak_memory(lambda: ScrapeSummaryGenerator(use_cache=False).load_and_clean_documents(web.page_url(page)))
+            print(f"  {page:<8} {size / 1000:8.0f} kB page  peak {peak / 1_000_000:8.2f} MB")
+
+        print(f"\nStage latency and throughput ({args.page} page, {args.requests} calls per level)")
+        for stage, func in build_stages(web, args.page).items():
+            for concurrency in levels:
+                report(stage, concurrency, *run_concurrently(func, args.requests, concurrency))
+
+        print(f"\nStub API requests: {api.requests}")
+
+
+if __name__ == "__main__":
+    main()
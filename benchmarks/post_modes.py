@@ -0,0 +1,86 @@
+"""
+Compares the "parallel" and "combined" post generation modes.
+
+Input tokens are computed offline from the rendered prompts. With --live, each mode is
+also run against the configured OpenAI endpoint and wall-clock latency plus the token
+usage reported by the API are measured; --stub runs the live comparison against the
+local stub endpoint instead.
+
+    python -m benchmarks.post_modes
+    python -m benchmarks.post_modes --live --runs 5
+    python -m benchmarks.post_modes --stub --runs 5
+    python -m benchmarks.post_modes --stub --platforms twitter,facebook,linkedin,instagram,threads,mastodon
+"""
+import argparse
+import statistics
+import time
+from contextlib import nullcontext
+
+from langchain_community.callbacks import get_openai_callback
+
+from modules.platforms import parse_platforms
+from modules.post_generator import SocialMediaPostGenerator, combined_prompt, post_prompt
+from modules.token_counter import count_tokens
+from benchmarks.stubs import stub_environment
+
+SAMPLE_TOPIC = "How to Get Started with Google Ads"
+SAMPLE_URL = "https://example.com/blog-post"
+SAMPLE_SUMMARY = (
+    "Google Ads lets businesses reach customers at the moment they search for related products. "
+    "The article walks through setting up an account, choosing campaign goals, researching keywords, "
+    "writing ad copy, setting budgets and bids, and tracking conversions to measure return on ad spend. "
+) * 40
+
+
+def prompt_tokens(summary, topic, url, platforms):
+    inputs = {"summary_str": summary, "topic": topic, "url": url}
+    return {
+        "parallel": sum(count_tokens(post_prompt(platform).format(**inputs)) for platform in platforms),
+        "combined": count_tokens(combined_prompt(platforms).format(**inputs)),
+    }
+
+
+def run_live(mode, runs, summary, topic, url, platforms):
+    generator = SocialMediaPostGenerator(mode=mode, use_cache=False, platforms=platforms)
+    latencies, prompt_totals, completion_totals = [], [], []
+    for _ in range(runs):
+        with get_openai_callback() as usage:
+            start = time.perf_counter()
+            generator.generate_social_media_posts(summary, topic, url)
+            latencies.append(time.perf_counter() - start)
+        prompt_totals.append(usage.prompt_tokens)
+        completion_totals.append(usage.completion_tokens)
+    return {
+        "p50_seconds": statistics.median(latencies),
+        "max_seconds": max(latencies),
+        "prompt_tokens": statistics.mean(prompt_totals),
+        "completion_tokens": statistics.mean(completion_totals),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--live", action="store_true", help="Call the model and measure latency")
+    parser.add_argument("--stub", action="store_true", help="Like --live, against the local stub endpoint")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--platforms", default="twitter,facebook", help="Comma-separated platforms to write posts for")
+    args = parser.parse_args()
+    platforms = parse_platforms(args.platforms)
+
+    summary_tokens = count_tokens(SAMPLE_SUMMARY)
+    print(f"Summary: {summary_tokens} tokens, {len(platforms)} platform(s)")
+    for mode, tokens in prompt_tokens(SAMPLE_SUMMARY, SAMPLE_TOPIC, SAMPLE_URL, platforms).items():
+        print(f"{mode:>9}: {tokens} rendered prompt tokens")
+
+    if args.live or args.stub:
+        with stub_environment() if args.stub else nullcontext():
+            for mode in ("parallel", "combined"):
+                stats = run_live(mode, args.runs, SAMPLE_SUMMARY, SAMPLE_TOPIC, SAMPLE_URL, platforms)
+                print(
+                    f"{mode:>9}: p50 {stats['p50_seconds']:.2f}s, max {stats['max_seconds']:.2f}s, "
+                    f"{stats['prompt_tokens']:.0f} prompt / {stats['completion_tokens']:.0f} completion tokens"
+                )
+
+
+if __name__ == "__main__":
+    main()
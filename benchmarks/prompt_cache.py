@@ -0,0 +1,148 @@
+"""
+Reports how many prompt tokens of each stage a provider can serve from its prompt cache.
+
+Every stage's prompt is rendered offline for two different articles. The part both renderings
+start with is the static prefix; OpenAI caches prefixes of at least 1024 tokens, in 128-token
+steps, so the cacheable tokens are the prefix rounded down to a step, or none below the minimum.
+With --stub, the summary and posts are also generated for both articles against the local stub
+endpoint, which simulates OpenAI's prompt cache, and the prompt and cached tokens recorded per
+stage from the API usage fields are reported for the second article.
+
+    python -m benchmarks.prompt_cache
+    python -m benchmarks.prompt_cache --stub
+    python -m benchmarks.prompt_cache --platforms twitter,facebook,linkedin,instagram,threads,mastodon
+"""
+import argparse
+from collections import defaultdict
+
+from modules.platforms import get_platform, parse_platforms
+from modules.post_generator import _build_prompts, combined_prompt, post_prompt
+from modules.token_counter import count_tokens
+from benchmarks.stubs import PROMPT_CACHE_MIN_TOKENS, PROMPT_CACHE_STEP_TOKENS, stub_environment
+
+ARTICLES = (
+    {
+        "topic": "How to Get Started with Google Ads",
+        "url": "https://example.com/google-ads",
+        "text": (
+            "Google Ads lets businesses reach customers at the moment they search for related products. "
+            "The article walks through setting up an account, choosing campaign goals, researching keywords, "
+            "writing ad copy, setting budgets and bids, and tracking conversions to measure return on ad spend. "
+        ) * 20,
+    },
+    {
+        "topic": "Email Marketing for Small Shops",
+        "url": "https://example.com/email-marketing",
+        "text": (
+            "Newsletters remain one of the cheapest ways for a small shop to bring customers back. "
+            "The guide covers growing a list with sign-up incentives, segmenting subscribers by purchase history, "
+            "writing subject lines that get opened, and automating welcome and abandoned-cart sequences. "
+        ) * 20,
+    },
+)
+
+ROLES = {"human": "user", "ai": "assistant"}
+
+
+def cacheable(tokens):
+    # OpenAI caches prompt prefixes of at least 1024 tokens, in 128-token steps
+    if tokens < PROMPT_CACHE_MIN_TOKENS:
+        return 0
+    return tokens - (tokens - PROMPT_CACHE_MIN_TOKENS) % PROMPT_CACHE_STEP_TOKENS
+
+
+def render(prompt, **inputs):
+    # The messages as sent, joined the way the stub endpoint compares prefixes
+    return "".join(f"<{ROLES.get(message.type, message.type)}>{message.content}" for message in prompt.format_messages(**inputs))
+
+
+def stage_prompts(platforms):
+    """
+    Returns (stage, prompt, inputs for an article) for every prompt the pipeline sends.
+    """
+    from modules.scrape_summary import MAP_PROMPT, REDUCE_PROMPT, SUMMARY_PROMPT
+
+    def summary_inputs(article):
+        return {"context": article["text"], "token_limit": 5000}
+
+    def post_inputs(article):
+        return {"summary_str": article["text"], "topic": article["topic"], "url": article["url"]}
+
+    def repair_inputs(article):
+        return {**post_inputs(article), "problems": "- Post 1 does not include the URL", "count": 1}
+
+    stages = [
+        ("summarize", SUMMARY_PROMPT, summary_inputs),
+        ("summarize.map", MAP_PROMPT, summary_inputs),
+        ("summarize.reduce", REDUCE_PROMPT, summary_inputs),
+    ]
+    for platform in platforms:
+        stages.append((f"post.{platform}", post_prompt(platform), post_inputs))
+        stages.append((f"post.repair.{platform}", _build_prompts(get_platform(platform))["repair_prompt"], repair_inputs))
+    stages.append(("post.combined", combined_prompt(platforms), post_inputs))
+    return stages
+
+
+def prefix_report(platforms):
+    """
+    Returns {stage: (prompt tokens, static prefix tokens, cacheable tokens)} from the rendered prompts.
+    """
+    report = {}
+    for name, prompt, inputs in stage_prompts(platforms):
+        first, second = (render(prompt, **inputs(article)) for article in ARTICLES)
+        shared = next((i for i, (a, b) in enumerate(zip(first, second)) if a != b), min(len(first), len(second)))
+        prefix = count_tokens(first[:shared])
+        report[name] = (count_tokens(second), prefix, cacheable(prefix))
+    return report
+
+
+def run_stub(platforms):
+    """
+    Generates the summary and posts for each article against the stub endpoint.
+
+    Returns:
+        dict: {stage: (prompt tokens, cached tokens)} recorded for the last article.
+    """
+    from langchain_core.documents import Document
+
+    from modules.instrumentation import trace
+    from modules.post_generator import SocialMediaPostGenerator
+    from modules.scrape_summary import ScrapeSummaryGenerator
+
+    post_generator = SocialMediaPostGenerator(use_cache=False, platforms=platforms)
+    for article in ARTICLES:
+        generator = ScrapeSummaryGenerator(use_cache=False)
+        generator.topic, generator.source_url = article["topic"], article["url"]
+        docs = [Document(page_content=article["text"], metadata={"source": article["url"], "title": article["topic"]})]
+        with trace() as current:
+            generator.summarize(generator.split_documents(docs))
+            post_generator.generate_social_media_posts(generator.summary, article["topic"], article["url"])
+    usage = defaultdict(lambda: [0, 0])
+    for span in current.spans:
+        if span.prompt_tokens:
+            usage[span.name][0] += span.prompt_tokens
+            usage[span.name][1] += span.cached_tokens
+    return {name: tuple(tokens) for name, tokens in usage.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--stub", action="store_true", help="Also run both articles against the local stub endpoint")
+    parser.add_argument("--platforms", default="twitter,facebook", help="Comma-separated platforms to write posts for")
+    args = parser.parse_args()
+    platforms = parse_platforms(args.platforms)
+
+    print(f"{'stage':<28} {'prompt':>8} {'static':>8} {'cacheable':>10}")
+    for name, (total, prefix, cached) in prefix_report(platforms).items():
+        print(f"{name:<28} {total:>8} {prefix:>8} {cached:>10}")
+
+    if args.stub:
+        with stub_environment():
+            usage = run_stub(platforms)
+        print(f"\nStub endpoint, second article\n{'stage':<28} {'prompt':>8} {'cached':>8}")
+        for name, (prompt_tokens, cached_tokens) in usage.items():
+            print(f"{name:<28} {prompt_tokens:>8} {cached_tokens:>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,421 @@
+"""
+Local stand-ins for the public web and the OpenAI API, used by the offline benchmarks.
+
+StubWebServer serves generated article pages of configurable size, a sitemap and an RSS
+feed listing them (with ETags for conditional requests) plus a PNG for image downloads. StubOpenAIServer implements the parts of the OpenAI HTTP API the pipeline uses
+(chat completions, streaming included, and image generation) with configurable latency
+and output length. `stub_environment()` starts both, points the OpenAI SDK at them and
+keeps the pipeline's caches and state files in a temporary directory.
+"""
+import hashlib
+import json
+import os
+import random
+import re
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO
+
+PAGE_SIZES = {"small": 4_000, "medium": 40_000, "large": 400_000, "huge": 2_000_000}
+
+# OpenAI's automatic prompt caching: prefixes of at least 1024 tokens are cached in 128-token steps
+PROMPT_CACHE_MIN_TOKENS = 1024
+PROMPT_CACHE_STEP_TOKENS = 128
+
+BOILERPLATE = """
+<header><nav><a href="/">Home</a> <a href="/blog">Blog</a> <a href="/about">About</a> <a href="/contact">Contact</a></nav></header>
+<div class="cookie-banner">We use cookies to improve your experience. <button>Accept</button></div>
+"""
+
+FOOTER = """
+<aside class="related-posts"><h3>Related posts</h3><ul>{related}</ul></aside>
+<footer><p>Copyright 2024 Example Co. All rights reserved.</p><a href="/privacy">Privacy</a></footer>
+"""
+
+PARAGRAPH = (
+    "Search advertising lets a business reach customers at the moment they look for a product. "
+    "Campaigns start with a clear goal, a researched keyword list and a budget that matches the expected "
+    "return. Ad copy should speak to the searcher's intent, and conversion tracking closes the loop by "
+    "showing which keywords and ads actually produce sales. "
+)
+
+
+def build_page(size, title="Stub Article"):
+    """
+    Builds an HTML article page of roughly `size` bytes with typical boilerplate around it.
+
+    Args:
+        size (int): Target page size in bytes.
+        title (str): The page title.
+
+    Returns:
+        bytes: The encoded HTML page.
+    """
+    related = "".join(f'<li><a href="/post/{i}">Related post number {i}</a></li>' for i in range(20))
+    shell = f"<html><head><title>{title}</title></head><body>{BOILERPLATE}<article><h1>{title}</h1>{{body}}</article>{FOOTER.format(related=related)}</body></html>"
+    paragraph = f"<p>{PARAGRAPH}</p>"
+    count = max(1, (size - len(shell)) // len(paragraph))
+    return shell.replace("{body}", paragraph * count).encode("utf-8")
+
+
+def build_png(width=64, height=64):
+    from PIL import Image
+
+    byte_arr = BytesIO()
+    Image.new("RGB", (width, height), (80, 120, 200)).save(byte_arr, format="PNG")
+    return byte_arr.getvalue()
+
+
+class _QuietHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body, content_type, headers=None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class _ServerThread:
+    def __init__(self, handler):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        self.server.daemon_threads = True
+        self.server.stub = self
+        # Clients that stop reading early (capped page fetches) reset the connection; not an error here
+        self.server.handle_error = lambda request, client_address: None
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def base_url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class _WebHandler(_QuietHandler):
+    def do_GET(self):
+        stub = self.server.stub
+        path = self.path.split("?")[0]
+        match = re.fullmatch(r"/page/(\w+)(?:/.*)?", path)
+        if match and match.group(1) in stub.pages:
+            self._send_conditional(stub.pages[match.group(1)], "text/html; charset=utf-8")
+        elif path == "/sitemap.xml":
+            self._send_conditional(stub.sitemap(), "application/xml")
+        elif path == "/feed.xml":
+            self._send_conditional(stub.rss(), "application/rss+xml")
+        elif self.path.startswith("/image.png"):
+            self._send(200, stub.png, "image/png")
+        else:
+            self._send(404, b"not found", "text/plain")
+
+    def _send_conditional(self, body, content_type):
+        etag = f'"{hashlib.sha1(body).hexdigest()}"'
+        if self.headers.get("If-None-Match") == etag:
+            self.server.stub.record(304)
+            self._send(304, b"", content_type, {"ETag": etag})
+        else:
+            self.server.stub.record(200)
+            self._send(200, body, content_type, {"ETag": etag})
+
+
+class StubWebServer(_ServerThread):
+    """
+    Serves `/page/<name>` for every entry of `page_sizes`, `/sitemap.xml` and `/feed.xml`
+    listing the pages, and `/image.png`. Pages and feeds answer If-None-Match with a 304.
+    `responses` counts the page and feed responses by status.
+    """
+
+    def __init__(self, page_sizes=None):
+        super().__init__(_WebHandler)
+        self.pages = {name: build_page(size, title=f"Stub Article ({name})") for name, size in (page_sizes or PAGE_SIZES).items()}
+        self.lastmod = {name: "2024-01-01T00:00:00+00:00" for name in self.pages}
+        self.png = build_png()
+        self.responses = {}
+        self._lock = threading.Lock()
+
+    def page_url(self, name):
+        return f"{self.base_url}/page/{name}"
+
+    def update_page(self, name, body):
+        # Replaces a page and bumps its lastmod in the sitemap and feed, like a CMS edit
+        self.pages[name] = body
+        self.lastmod[name] = time.strftime("%Y-%m-%dT%H:%M:%S+00:00", time.gmtime())
+
+    def record(self, status):
+        with self._lock:
+            self.responses[status] = self.responses.get(status, 0) + 1
+
+    def sitemap(self):
+        entries = "".join(
+            f"<url><loc>{self.page_url(name)}</loc><lastmod>{self.lastmod[name]}</lastmod></url>" for name in self.pages
+        )
+        return f'<?xml version="1.0"?><urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">{entries}</urlset>'.encode()
+
+    def rss(self):
+        items = "".join(
+            f"<item><title>{name}</title><link>{self.page_url(name)}</link><guid>{self.page_url(name)}</guid></item>"
+            for name in self.pages
+        )
+        return f'<?xml version="1.0"?><rss version="2.0"><channel><title>Stub</title>{items}</channel></rss>'.encode()
+
+
+def _fake_words(count):
+    words = PARAGRAPH.split()
+    return " ".join(words[i % len(words)] for i in range(count))
+
+
+class _OpenAIHandler(_QuietHandler):
+    def do_POST(self):
+        stub = self.server.stub
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        stub.record(self.path)
+        fault = stub.inject_fault()
+        if fault == "error":
+            status = stub.error_status
+            body = {"error": {"message": "Injected failure", "type": "server_error" if status >= 500 else "rate_limit_error"}}
+            self._send(status, json.dumps(body).encode(), "application/json")
+            return
+        if fault == "slow":
+            time.sleep(stub.tail_latency)
+        if self.path.endswith("/chat/completions"):
+            self._chat(stub, request)
+        elif self.path.endswith("/images/generations"):
+            time.sleep(stub.image_latency)
+            body = {"created": int(time.time()), "data": [{"url": stub.image_url, "revised_prompt": request.get("prompt")}]}
+            self._send(200, json.dumps(body).encode(), "application/json")
+        else:
+            self._send(404, b"{}", "application/json")
+
+    def _chat(self, stub, request):
+        prompt = "\n".join(str(message.get("content", "")) for message in request.get("messages", []))
+        content = stub.completion_for(prompt)
+        prompt_tokens = max(1, len(prompt) // 4)
+        completion_tokens = max(1, len(content) // 4)
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+            "prompt_tokens_details": {"cached_tokens": stub.cached_tokens(request.get("messages", []))},
+        }
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        time.sleep(stub.latency)
+
+        if not request.get("stream"):
+            body = {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": request.get("model", "stub"),
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+                "usage": usage,
+            }
+            time.sleep(stub.seconds_per_token * completion_tokens)
+            self._send(200, json.dumps(body).encode(), "application/json")
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        pieces = [content[i:i + 16] for i in range(0, len(content), 16)]
+        for index, piece in enumerate(pieces):
+            chunk = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": request.get("model", "stub"),
+                "choices": [{"index": 0, "delta": {"role": "assistant", "content": piece} if index == 0 else {"content": piece}, "finish_reason": None}],
+            }
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+            self.wfile.flush()
+            time.sleep(stub.seconds_per_token * 4)
+        final = {
+            "id": completion_id,
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": request.get("model", "stub"),
+            "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}],
+        }
+        if request.get("stream_options", {}).get("include_usage"):
+            final["usage"] = usage
+        self.wfile.write(f"data: {json.dumps(final)}\n\ndata: [DONE]\n\n".encode())
+        self.wfile.flush()
+        self.close_connection = True
+
+
+class StubOpenAIServer(_ServerThread):
+    """
+    OpenAI-compatible endpoint with deterministic output.
+
+    Args:
+        latency (float): Seconds before the first byte of every response.
+        seconds_per_token (float): Extra generation time per completion token.
+        completion_tokens (int): Approximate length of free-text completions (summaries).
+        image_latency (float): Seconds per image generation request.
+        image_url (str): URL returned for generated images.
+        error_rate (float): Share of requests answered with `error_status` instead.
+        error_status (int): Status of injected failures. Default is 429.
+        tail_rate (float): Share of requests delayed by an extra `tail_latency` seconds.
+        tail_latency (float): Extra delay of the slow tail.
+        seed (int): Seed of the fault injection.
+    """
+
+    def __init__(self, latency=0.2, seconds_per_token=0.0005, completion_tokens=300, image_latency=1.0, image_url="",
+                 error_rate=0.0, error_status=429, tail_rate=0.0, tail_latency=5.0, seed=0):
+        super().__init__(_OpenAIHandler)
+        self.latency = latency
+        self.seconds_per_token = seconds_per_token
+        self.completion_tokens = completion_tokens
+        self.image_latency = image_latency
+        self.image_url = image_url
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.tail_rate = tail_rate
+        self.tail_latency = tail_latency
+        self._random = random.Random(seed)
+        self.requests = {}
+        self._lock = threading.Lock()
+        self._prompt_prefixes = set()
+
+    @property
+    def api_base(self):
+        return f"{self.base_url}/v1"
+
+    def cached_tokens(self, messages):
+        """
+        Simulates OpenAI's prompt caching: returns the tokens of the longest prefix of the
+        messages that an earlier request started with, in 128-token steps from 1024 tokens
+        (4 characters per token), and remembers this request's prefixes.
+        """
+        prompt = "".join(f"<{message.get('role')}>{message.get('content', '')}" for message in messages)
+        step = PROMPT_CACHE_STEP_TOKENS * 4
+        ends = range(PROMPT_CACHE_MIN_TOKENS * 4, len(prompt) + 1, step)
+        digests = [hashlib.sha1(prompt[:end].encode()).digest() for end in ends]
+        cached = 0
+        with self._lock:
+            for end, digest in zip(ends, digests):
+                if digest not in self._prompt_prefixes:
+                    break
+                cached = end // 4
+            self._prompt_prefixes.update(digests)
+        return cached
+
+    def record(self, path):
+        with self._lock:
+            self.requests[path] = self.requests.get(path, 0) + 1
+
+    def inject_fault(self):
+        with self._lock:
+            draw = self._random.random()
+        if draw < self.error_rate:
+            return "error"
+        if draw < self.error_rate + self.tail_rate:
+            return "slow"
+        return None
+
+    def completion_for(self, prompt):
+        """
+        Picks a completion that parses for the prompt: JSON posts for post prompts,
+        free text otherwise.
+        """
+        url = re.search(r"https?://\S+?(?=[\s.,]*$|[\s.,]+\s)", prompt, re.MULTILINE)
+        url = url.group(0) if url else "https://example.com"
+        from modules.platforms import PLATFORMS
+
+        def posts(platform):
+            if platform.name == "twitter":
+                text = "Stub tweet {} about search ads. #ads Learn more: {}"
+            else:
+                words = _fake_words(60 if platform.max_characters > 1000 else 20)
+                text = f"Stub {platform.display_name} post {{}}. {words} Read more: {{}}"
+            return [{platform.post_key: text.format(i + 1, url)} for i in range(3)]
+
+        # Combined prompts have one schema property per platform, single ones a property per post
+        combined = [platform for platform in PLATFORMS.values() if f'"{platform.name}"' in prompt]
+        if combined:
+            return json.dumps({platform.name: posts(platform) for platform in combined})
+        for platform in PLATFORMS.values():
+            if f'"{platform.post_key}"' in prompt:
+                return json.dumps(posts(platform))
+        return _fake_words(int(self.completion_tokens * 0.75))
+
+
+@contextmanager
+def stub_environment(**openai_options):
+    """
+    Starts a StubWebServer and a StubOpenAIServer and points the OpenAI SDK at the latter.
+
+    The response cache, summary index, run history, image store, job queue and feed state
+    live in a temporary directory that is removed on exit, so runs neither read nor leave
+    behind the real ones. Settings, shared clients, the stores opened from them and the
+    chains compiled from them are reset on entry and exit so they pick up both.
+
+    Args:
+        **openai_options: Passed to StubOpenAIServer.
+
+    Yields:
+        tuple: (StubWebServer, StubOpenAIServer)
+    """
+    from modules import dedup, llm_cache, llm_clients, model_router, post_generator, run_history, scrape_summary, settings
+
+    caches = (
+        settings.get_settings, dedup.get_summary_index, run_history.get_run_history,
+        llm_clients.get_chat_model, llm_clients.get_openai_client, model_router.get_model_router,
+        post_generator._build_chains, post_generator._build_combined_chain, scrape_summary._build_chains,
+    )
+
+    def reset():
+        for cache in caches:
+            cache.cache_clear()
+        with llm_cache._default_cache_lock:
+            llm_cache._default_cache = None
+
+    web = StubWebServer().start()
+    openai_options.setdefault("image_url", f"{web.base_url}/image.png")
+    api = StubOpenAIServer(**openai_options).start()
+    state_dir = tempfile.mkdtemp(prefix="smg-stub-")
+    environment = {
+        "OPENAI_BASE_URL": api.api_base,
+        "OPENAI_API_KEY": "stub-key",
+        "USER_AGENT": "smg-benchmark",
+        "LLM_CACHE_PATH": os.path.join(state_dir, "llm_cache.sqlite"),
+        "SUMMARY_INDEX_PATH": os.path.join(state_dir, "summaries.sqlite"),
+        "RUN_HISTORY_PATH": os.path.join(state_dir, "runs.sqlite"),
+        "IMAGE_STORE_DIR": os.path.join(state_dir, "images"),
+        "JOB_QUEUE_PATH": os.path.join(state_dir, "jobs.sqlite"),
+        "FEED_STATE_PATH": os.path.join(state_dir, "feeds.sqlite"),
+    }
+    saved = {name: os.environ.get(name) for name in environment}
+    os.environ.update(environment)
+    reset()
+    try:
+        yield web, api
+    finally:
+        for name, value in saved.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+        reset()
+        api.stop()
+        web.stop()
+        shutil.rmtree(state_dir, ignore_errors=True)
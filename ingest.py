@@ -0,0 +1,51 @@
+import argparse
+
+from modules.batch_runner import read_urls
+from modules.feed_ingest import FeedIngester, FeedState
+from modules.instrumentation import start_metrics_server
+from modules.platforms import PLATFORMS
+from modules.settings import get_settings
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Generate social media posts for the new or changed articles of sitemaps and RSS/Atom feeds."
+    )
+    parser.add_argument("feeds_file", help="Text file with one sitemap or feed URL per line")
+    parser.add_argument("-o", "--output", default="results.jsonl", help="JSONL file results are appended to")
+    parser.add_argument("--state", default=get_settings().feed_state_path, help="SQLite file of what was already seen")
+    parser.add_argument("--max-per-feed", type=int, default=20, help="New or changed entries taken from each feed per run, newest first")
+    parser.add_argument("--mark-seen", action="store_true",
+                        help="Record the current entries as seen without processing them (first run)")
+    parser.add_argument("--scrape-concurrency", type=int, default=8)
+    parser.add_argument("--summarize-concurrency", type=int, default=4)
+    parser.add_argument("--post-concurrency", type=int, default=4)
+    parser.add_argument("--post-mode", choices=["parallel", "combined"], default="parallel",
+                        help="One call per platform, or all platforms in one call")
+    parser.add_argument("--platforms", default=get_settings().post_platforms,
+                        help=f"Comma-separated platforms to write posts for, from: {', '.join(PLATFORMS)}")
+    parser.add_argument("--metrics-port", type=int, default=get_settings().metrics_port,
+                        help="Serve Prometheus metrics on this port while the run lasts")
+    args = parser.parse_args()
+
+    if args.metrics_port:
+        start_metrics_server(args.metrics_port)
+
+    ingester = FeedIngester(
+        FeedState(args.state),
+        max_articles_per_feed=args.max_per_feed,
+        scrape_concurrency=args.scrape_concurrency,
+        summarize_concurrency=args.summarize_concurrency,
+        post_concurrency=args.post_concurrency,
+        post_mode=args.post_mode,
+        platforms=args.platforms,
+    )
+    counts = ingester.run(read_urls(args.feeds_file), args.output, mark_seen=args.mark_seen)
+    print(
+        f"{counts['feeds']} feed(s), {counts['failed_feeds']} failed. {counts['pending']} article(s) checked: "
+        f"{counts['ok']} processed, {counts['skipped']} unchanged, {counts['error']} failed. Results in {args.output}"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,207 @@
+# modules/batch_runner.py
+import asyncio
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from modules import pipeline
+from modules.instrumentation import Trace, run_in_trace
+from modules.post_generator import SocialMediaPostGenerator
+
+_DONE = object()
+
+
+def read_urls(path):
+    """
+    Reads URLs from a text file, one per line. Blank lines and lines starting with "#" are skipped.
+
+    Args:
+        path (str): Path to the URL file.
+
+    Yields:
+        str: Each URL in file order.
+    """
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            url = line.strip()
+            if url and not url.startswith("#"):
+                yield url
+
+
+class BatchRunner:
+    """
+    Runs many URLs through scrape -> summarize -> post generation as an asyncio pipeline.
+
+    Every stage has its own worker count and a bounded input queue, so a slow stage
+    applies backpressure to the stages in front of it instead of buffering the whole
+    URL list in memory. The blocking generator calls run on a thread pool sized to
+    the total number of workers. Results are appended to a JSONL file as soon as each
+    URL finishes, in completion order.
+
+    `scrape` replaces `pipeline.scrape` as the first step; returning None skips the URL
+    without a record. `on_record` is called with every record before it is written.
+    """
+
+    def __init__(self, scrape_concurrency=8, summarize_concurrency=4, post_concurrency=4, queue_size=16,
+                 post_mode="parallel", scrape=None, on_record=None, platforms=None):
+        self.post_generator = SocialMediaPostGenerator(mode=post_mode, platforms=platforms)
+        self.scrape = scrape or pipeline.scrape
+        self.on_record = on_record
+        self.scrape_concurrency = scrape_concurrency
+        self.summarize_concurrency = summarize_concurrency
+        self.post_concurrency = post_concurrency
+        self.queue_size = queue_size
+
+    async def run(self, urls, output_path):
+        """
+        Processes the URLs and streams one JSON record per URL to `output_path`.
+
+        Args:
+            urls (iterable): The URLs to process. Consumed lazily.
+            output_path (str): Path of the JSONL file to append results to.
+
+        Returns:
+            dict: Counts of "ok" and "error" records written and of "skipped" URLs.
+        """
+        loop = asyncio.get_running_loop()
+        executor = ThreadPoolExecutor(
+            max_workers=self.scrape_concurrency + self.summarize_concurrency + self.post_concurrency
+        )
+        scrape_queue = asyncio.Queue(maxsize=self.queue_size)
+        summarize_queue = asyncio.Queue(maxsize=self.queue_size)
+        post_queue = asyncio.Queue(maxsize=self.queue_size)
+        result_queue = asyncio.Queue(maxsize=self.queue_size)
+
+        async def run_blocking(item, func, *args):
+            # Stages recorded in the worker thread join the URL's trace
+            return await loop.run_in_executor(executor, run_in_trace, item["trace"], func, *args)
+
+        async def scrape_stage(item):
+            scraped = await run_blocking(item, self.scrape, item["url"])
+            if scraped is None:
+                item["skipped"] = True
+            else:
+                item["generator"], item["docs"] = scraped
+
+        async def summarize_stage(item):
+            item["summary_info"] = await run_blocking(item, pipeline.summarize, item.pop("generator"), item.pop("docs"))
+
+        async def post_stage(item):
+            item["posts"], item["post_errors"] = await run_blocking(
+                item, pipeline.generate_posts, item["summary_info"], self.post_generator
+            )
+            await run_blocking(item, pipeline.record_run, item["summary_info"], item["posts"], item["post_errors"])
+
+        stages = [
+            ("scrape", scrape_stage, scrape_queue, summarize_queue, self.scrape_concurrency),
+            ("summarize", summarize_stage, summarize_queue, post_queue, self.summarize_concurrency),
+            ("posts", post_stage, post_queue, result_queue, self.post_concurrency),
+        ]
+
+        async def worker(name, handler, in_queue, out_queue):
+            while True:
+                item = await in_queue.get()
+                if item is _DONE:
+                    return
+                if "error" not in item and "skipped" not in item:
+                    try:
+                        await handler(item)
+                    except Exception as e:
+                        item["error"] = {"stage": name, "message": str(e)}
+                await out_queue.put(item)
+
+        async def run_stage(name, handler, in_queue, out_queue, concurrency):
+            workers = [asyncio.create_task(worker(name, handler, in_queue, out_queue)) for _ in range(concurrency)]
+            await asyncio.gather(*workers)
+
+        async def produce():
+            for url in urls:
+                await scrape_queue.put({"url": url, "started": time.perf_counter(), "trace": Trace()})
+
+        async def shutdown_after(task, queue, count):
+            await task
+            for _ in range(count):
+                await queue.put(_DONE)
+
+        counts = {"ok": 0, "error": 0, "skipped": 0}
+
+        async def write_results():
+            with open(output_path, "a", encoding="utf-8") as f:
+                while True:
+                    item = await result_queue.get()
+                    if item is _DONE:
+                        return
+                    if "skipped" in item:
+                        counts["skipped"] += 1
+                        continue
+                    record = self._to_record(item)
+                    if self.on_record:
+                        self.on_record(record)
+                    f.write(json.dumps(record) + "\n")
+                    f.flush()
+                    counts[record["status"]] += 1
+
+        writer = asyncio.create_task(write_results())
+        producer = asyncio.create_task(produce())
+        tasks = [writer, producer, asyncio.create_task(shutdown_after(producer, scrape_queue, self.scrape_concurrency))]
+        for index, (name, handler, in_queue, out_queue, concurrency) in enumerate(stages):
+            stage_task = asyncio.create_task(run_stage(name, handler, in_queue, out_queue, concurrency))
+            tasks.append(stage_task)
+            if index + 1 < len(stages):
+                tasks.append(asyncio.create_task(shutdown_after(stage_task, out_queue, stages[index + 1][4])))
+            else:
+                tasks.append(asyncio.create_task(shutdown_after(stage_task, out_queue, 1)))
+
+        try:
+            # A failure in the writer, on_record or the URL iterator would leave the other
+            # tasks blocked on full queues, so the first one cancels the rest and is re-raised
+            done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+            for task in done:
+                if task.exception() is not None:
+                    raise task.exception()
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            executor.shutdown(wait=False, cancel_futures=True)
+
+        return counts
+
+    @staticmethod
+    def _to_record(item):
+        # A stage can run more than once per URL (map calls, repair rounds), so its time is summed
+        stage_seconds = {}
+        for span in item["trace"].to_dicts():
+            stage_seconds[span["stage"]] = round(stage_seconds.get(span["stage"], 0) + (span["duration_seconds"] or 0), 6)
+        record = {
+            "url": item["url"],
+            "elapsed_seconds": round(time.perf_counter() - item["started"], 3),
+            "trace_id": item["trace"].trace_id,
+            "stage_seconds": stage_seconds,
+        }
+        if "error" in item:
+            record.update(status="error", error=item["error"])
+        else:
+            record.update(
+                status="ok",
+                **item["summary_info"],
+                posts=item["posts"],
+                post_errors=item["post_errors"],
+                token_usage=pipeline.token_usage(item["summary_info"], item["posts"]),
+            )
+        return record
+
+
+def run_batch(urls, output_path, **kwargs):
+    """
+    Synchronous entry point for `BatchRunner.run`.
+
+    Args:
+        urls (iterable): The URLs to process.
+        output_path (str): Path of the JSONL file to append results to.
+        **kwargs: Concurrency settings passed to BatchRunner.
+
+    Returns:
+        dict: Counts of "ok" and "error" records written and of "skipped" URLs.
+    """
+    return asyncio.run(BatchRunner(**kwargs).run(urls, output_path))
@@ -0,0 +1,156 @@
+# modules/chunk_ranker.py
+import re
+from collections import Counter
+
+from modules.token_counter import count_batch, count_document_tokens
+
+WORD_PATTERN = re.compile(r"[a-z0-9]+(?:'[a-z]+)?")
+
+STOPWORDS = frozenset(
+    "a an and are as at be but by for from has have how i in is it its of on or our that the their this to was "
+    "we were what when which who will with you your".split()
+)
+
+
+def tokenize(text):
+    """
+    Lower-cases text and splits it into word terms, dropping stopwords and single characters.
+
+    Args:
+        text (str): The text.
+
+    Returns:
+        list: The terms in order.
+    """
+    return [word for word in WORD_PATTERN.findall(text.lower()) if len(word) > 1 and word not in STOPWORDS]
+
+
+def score_chunks(texts, query="", title_weight=0.5, k1=1.5, b=0.75):
+    """
+    Scores chunks by relevance to a query (the page title) and to the document as a whole.
+
+    The title score is BM25. The centroid score is the cosine similarity of each chunk's
+    TF-IDF vector to the mean of all chunk vectors, which favours chunks about what the rest
+    of the page is about over stray sections. Both are scaled to [0, 1] and mixed by
+    `title_weight`. Runs locally with NumPy on a sparse (CSR) chunk-term matrix, so memory
+    grows with the length of the text rather than with chunks times vocabulary.
+
+    Args:
+        texts (list): The chunk texts.
+        query (str): The query, usually the page title. Empty uses the centroid score only.
+        title_weight (float): Share of the title score in the result. Default is 0.5.
+        k1 (float): BM25 term-frequency saturation. Default is 1.5.
+        b (float): BM25 length normalization. Default is 0.75.
+
+    Returns:
+        numpy.ndarray: One score per chunk.
+    """
+    import numpy as np
+
+    if not texts:
+        return np.zeros(0, dtype=np.float32)
+
+    # CSR layout: the distinct terms of chunk i are indices[indptr[i]:indptr[i + 1]], their counts in data
+    vocabulary = {}
+    indptr, indices, data = [0], [], []
+    for text in texts:
+        counts = Counter(vocabulary.setdefault(term, len(vocabulary)) for term in tokenize(text))
+        indices.extend(counts)
+        data.extend(counts.values())
+        indptr.append(len(indices))
+    total, width = len(texts), max(len(vocabulary), 1)
+    indices = np.array(indices, dtype=np.intp)
+    data = np.array(data, dtype=np.float32)
+    rows = np.repeat(np.arange(total), np.diff(indptr))
+
+    def row_sums(values):
+        return np.bincount(rows, weights=values, minlength=total)
+
+    document_frequency = np.bincount(indices, minlength=width)
+    lengths = row_sums(data)
+
+    # Centroid score: cosine of TF-IDF vectors against their mean
+    idf = np.log((1 + total) / (1 + document_frequency)) + 1
+    tfidf = data * idf[indices]
+    tfidf /= np.maximum(np.sqrt(row_sums(tfidf ** 2)), 1e-9)[rows]
+    centroid = np.bincount(indices, weights=tfidf, minlength=width) / total
+    centroid_scores = row_sums(tfidf * (centroid / max(np.linalg.norm(centroid), 1e-9))[indices])
+
+    query_columns = [vocabulary[term] for term in set(tokenize(query or "")) if term in vocabulary]
+    if not query_columns or title_weight <= 0:
+        return _scale(centroid_scores)
+
+    # Title score: BM25 of the query terms, summed per chunk over the entries of those terms
+    bm25_idf = np.zeros(width)
+    bm25_idf[query_columns] = np.log(
+        1 + (total - document_frequency[query_columns] + 0.5) / (document_frequency[query_columns] + 0.5)
+    )
+    length_norm = k1 * (1 - b + b * lengths / max(lengths.mean(), 1e-9))
+    bm25_scores = row_sums(bm25_idf[indices] * data * (k1 + 1) / (data + length_norm[rows]))
+
+    return title_weight * _scale(bm25_scores) + (1 - title_weight) * _scale(centroid_scores)
+
+
+def _scale(scores):
+    low, high = scores.min(), scores.max()
+    if high - low < 1e-9:
+        return scores * 0 + 1
+    return (scores - low) / (high - low)
+
+
+def _overlap_tokens(docs, model_name):
+    # Tokens each chunk repeats from the tail of the chunk before it (split with add_start_index=True)
+    overlaps = [""] * len(docs)
+    for index in range(1, len(docs)):
+        previous, doc = docs[index - 1], docs[index]
+        previous_start, start = previous.metadata.get("start_index"), doc.metadata.get("start_index")
+        if previous_start is None or start is None or previous.metadata.get("source") != doc.metadata.get("source"):
+            continue
+        previous_end = previous_start + len(previous.page_content)
+        if previous_start <= start < previous_end:
+            overlaps[index] = doc.page_content[:previous_end - start]
+    return count_batch(overlaps, model_name)
+
+
+def prune_to_budget(docs, token_budget, query="", model_name="gpt-4o", title_weight=0.5):
+    """
+    Keeps the most relevant chunks that fit a token budget, in their original order.
+
+    Chunks are ranked with `score_chunks` and taken greedily from the top; a chunk that does
+    not fit is skipped so smaller, lower-ranked chunks can still fill the budget. The budget
+    counts the overlap between adjacent kept chunks once, like `count_document_tokens`, which
+    has the final say. Documents already within the budget are returned unchanged.
+
+    Args:
+        docs (list): The split documents.
+        token_budget (int): Maximum tokens of the kept chunks.
+        query (str): The query, usually the page title.
+        model_name (str): Model whose tokenizer counts the chunks. Default is "gpt-4o".
+        title_weight (float): Share of the title score in the ranking. Default is 0.5.
+
+    Returns:
+        list: The kept documents.
+    """
+    if count_document_tokens(docs, model_name) <= token_budget:
+        return docs
+
+    token_counts = count_batch([doc.page_content for doc in docs], model_name)
+    overlaps = _overlap_tokens(docs, model_name) + [0]
+    scores = score_chunks([doc.page_content for doc in docs], query, title_weight)
+    ranked = sorted(range(len(docs)), key=lambda i: -scores[i])
+    kept, used = set(), 0
+    for index in ranked:
+        # A chunk next to kept chunks only adds what it does not share with them
+        cost = token_counts[index] - (overlaps[index] if index - 1 in kept else 0) - (overlaps[index + 1] if index + 1 in kept else 0)
+        if used + cost <= token_budget:
+            kept.add(index)
+            used += cost
+
+    # Tokens can merge differently where chunks join, so the merged text is counted and the
+    # lowest-ranked chunks dropped until it fits
+    for index in reversed(ranked):
+        if index in kept and count_document_tokens([docs[i] for i in sorted(kept)], model_name) > token_budget:
+            kept.discard(index)
+        elif index in kept:
+            break
+    return [docs[index] for index in sorted(kept)]
@@ -0,0 +1,244 @@
+# modules/content_extractor.py
+import os
+import re
+
+from modules.utils import clean_text
+
+HTML_CONTENT_TYPES = ("text/html", "application/xhtml+xml")
+
+DEFAULT_USER_AGENT = "Mozilla/5.0 (compatible; social-media-gen/1.0)"
+
+# Elements that never hold article text
+STRIP_TAGS = ("script", "style", "noscript", "template", "svg", "canvas", "iframe", "form", "button", "input",
+              "select", "nav", "header", "footer", "aside")
+
+# class/id fragments of navigation, banners and widgets around the article
+BOILERPLATE_PATTERN = re.compile(
+    r"cookie|consent|banner|related|comment|share|social|sidebar|menu|navbar|breadcrumb|footer|header|"
+    r"newsletter|subscribe|promo|advert|\bads?\b|popup|modal|widget|author-bio|pagination",
+    re.IGNORECASE,
+)
+
+BLOCK_TAGS = ("p", "h1", "h2", "h3", "h4", "h5", "h6", "li", "blockquote", "pre", "td", "dd", "dt", "figcaption")
+
+
+class FetchError(Exception):
+    """
+    Raised when a page cannot be used as LLM input (wrong content type, HTTP error).
+    """
+
+
+def fetch_page(url, content_types=HTML_CONTENT_TYPES, etag=None, last_modified=None, max_bytes=5_000_000, timeout=30,
+               chunk_size=64 * 1024):
+    """
+    Downloads a URL with a streaming request, stopping at `max_bytes`.
+
+    The content type is checked from the response headers before the body is read, so
+    unexpected downloads are rejected without being fetched. With `etag` or `last_modified`
+    from an earlier response the request is conditional, and an unchanged resource costs a
+    bodyless 304.
+
+    Args:
+        url (str): The URL to fetch.
+        content_types (tuple): Accepted MIME types; None accepts any. Default is HTML.
+        etag (str): ETag of the copy already seen, sent as If-None-Match (optional).
+        last_modified (str): Last-Modified of the copy already seen, sent as If-Modified-Since (optional).
+        max_bytes (int): Maximum bytes to read. Longer bodies are truncated. Default is 5 MB.
+        timeout (float): Connect and read timeout in seconds. Default is 30.
+        chunk_size (int): Bytes per read. Default is 64 kB.
+
+    Returns:
+        dict: "status" (200 or 304), "body" (empty for 304), "charset" from the headers or None,
+        "truncated", and the "etag" and "last_modified" validators of the response.
+
+    Raises:
+        FetchError: If the response is an HTTP error or of an unexpected content type.
+    """
+    import requests
+
+    headers = {"User-Agent": os.environ.get("USER_AGENT", DEFAULT_USER_AGENT), "Accept": ",".join(content_types or ("*/*",))}
+    if etag:
+        headers["If-None-Match"] = etag
+    if last_modified:
+        headers["If-Modified-Since"] = last_modified
+    with requests.get(url, headers=headers, stream=True, timeout=timeout) as response:
+        if response.status_code >= 400:
+            raise FetchError(f"{url} returned HTTP {response.status_code}")
+        page = {
+            "status": response.status_code,
+            "body": b"",
+            "charset": None,
+            "truncated": False,
+            "etag": response.headers.get("ETag", etag),
+            "last_modified": response.headers.get("Last-Modified", last_modified),
+        }
+        if response.status_code == 304:
+            return page
+
+        content_type = response.headers.get("Content-Type", "")
+        mime_type = content_type.split(";")[0].strip().lower()
+        if content_types and mime_type and mime_type not in content_types:
+            raise FetchError(f"{url} is {mime_type}, not {' or '.join(content_types)}")
+
+        match = re.search(r"charset=([\w-]+)", content_type, re.IGNORECASE)
+        if match:
+            page["charset"] = match.group(1)
+
+        body = bytearray()
+        for chunk in response.iter_content(chunk_size=chunk_size):
+            body += chunk
+            if len(body) >= max_bytes:
+                del body[max_bytes:]
+                page["truncated"] = True
+                break
+        page["body"] = bytes(body)
+    return page
+
+
+def fetch_html(url, max_bytes=5_000_000, timeout=30, chunk_size=64 * 1024):
+    """
+    Downloads an HTML page with a streaming request, stopping at `max_bytes`.
+
+    Args:
+        url (str): The URL of the page.
+        max_bytes (int): Maximum bytes to read. Longer pages are truncated. Default is 5 MB.
+        timeout (float): Connect and read timeout in seconds. Default is 30.
+        chunk_size (int): Bytes per read. Default is 64 kB.
+
+    Returns:
+        tuple: (body bytes, charset from the headers or None, True if the body was truncated)
+
+    Raises:
+        FetchError: If the response is an HTTP error or not HTML.
+    """
+    page = fetch_page(url, max_bytes=max_bytes, timeout=timeout, chunk_size=chunk_size)
+    return page["body"], page["charset"], page["truncated"]
+
+
+def _link_density(element, text_length):
+    link_length = sum(len(link.get_text(" ", strip=True)) for link in element.find_all("a"))
+    return link_length / max(text_length, 1)
+
+
+def _find_main_element(soup):
+    # An explicit <article> or <main> wins; otherwise pick the container whose paragraphs carry the
+    # most text, which is how readability-style extractors find the body
+    candidates = soup.find_all(["article", "main"]) + soup.find_all(attrs={"role": "main"})
+    if candidates:
+        return max(candidates, key=lambda element: len(element.get_text(" ", strip=True)))
+
+    scores = {}
+    for paragraph in soup.find_all("p"):
+        text = paragraph.get_text(" ", strip=True)
+        if len(text) < 25:
+            continue
+        score = 1 + text.count(",") + min(len(text) // 100, 3)
+        parent = paragraph.parent
+        if parent is None:
+            continue
+        scores[parent] = scores.get(parent, 0) + score
+        if parent.parent is not None:
+            scores[parent.parent] = scores.get(parent.parent, 0) + score / 2
+
+    best, best_score = None, 0
+    for element, score in scores.items():
+        score *= 1 - _link_density(element, len(element.get_text(" ", strip=True)))
+        if score > best_score:
+            best, best_score = element, score
+    return best or soup.body or soup
+
+
+def _text_heavy_elements(soup):
+    # ids of the elements holding more than half of the page's paragraph text
+    lengths, total = {}, 0
+    for paragraph in soup.find_all("p"):
+        length = len(paragraph.get_text(" ", strip=True))
+        total += length
+        for parent in paragraph.parents:
+            lengths[id(parent)] = lengths.get(id(parent), 0) + length
+    return {element_id for element_id, length in lengths.items() if total and length > total / 2}
+
+
+def _text_blocks(main):
+    # Yields (text, link text length) per block, in document order. Innermost block tags are one block
+    # each; text outside any block tag (bare text in a <div>, lines split by <br>) is gathered into
+    # blocks of its own, broken at <br> and at container boundaries.
+    from bs4 import NavigableString, Tag
+
+    loose, loose_links = [], 0
+
+    def flush():
+        nonlocal loose, loose_links
+        text = clean_text(" ".join(loose))
+        result = (text, loose_links) if text else None
+        loose, loose_links = [], 0
+        return result
+
+    for node in main.descendants:
+        if isinstance(node, Tag):
+            if node.name in BLOCK_TAGS and not node.find(BLOCK_TAGS):
+                pending = flush()
+                if pending:
+                    yield pending
+                # Nested blocks (a <p> inside an <li>) are emitted by the innermost element only
+                text = clean_text(node.get_text(" "))
+                if text:
+                    yield text, sum(len(link.get_text(" ", strip=True)) for link in node.find_all("a"))
+            elif node.name in ("br", "hr", "div", "section", "article"):
+                pending = flush()
+                if pending:
+                    yield pending
+        elif type(node) is NavigableString and node.strip():
+            parents = []
+            for parent in node.parents:
+                if parent is main:
+                    break
+                parents.append(parent.name)
+            if not any(name in BLOCK_TAGS for name in parents):
+                loose.append(str(node))
+                if "a" in parents:
+                    loose_links += len(node.strip())
+    pending = flush()
+    if pending:
+        yield pending
+
+
+def extract_main_content(html, charset=None):
+    """
+    Extracts the title and main article text of an HTML page.
+
+    Scripts, navigation, headers, footers, asides and elements whose class or id look like
+    banners, share widgets or related-post lists are removed first, except wrappers around the
+    article. The article container is then chosen and its text blocks are returned one per
+    paragraph (bare text in divs counts as well, split at line breaks), with whitespace collapsed
+    and link-heavy blocks (menus, tag clouds) dropped.
+
+    Args:
+        html (bytes or str): The page.
+        charset (str): Encoding from the response headers (optional).
+
+    Returns:
+        tuple: (title or None, main text with paragraphs separated by blank lines)
+    """
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(html, "html.parser", from_encoding=charset if isinstance(html, bytes) else None)
+    title = clean_text(soup.title.get_text()) if soup.title else None
+
+    for element in soup.find_all(STRIP_TAGS):
+        element.decompose()
+    # Layout wrappers around the article can carry boilerplate-looking classes ("site-wrap has-sidebar"),
+    # so ancestors of the likely article and elements holding most of the paragraph text are kept
+    protected = {id(parent) for parent in _find_main_element(soup).parents} | _text_heavy_elements(soup)
+    for element in soup.find_all(True):
+        if element.decomposed or element.name in ("html", "body", "article", "main") or id(element) in protected:
+            continue
+        attributes = " ".join(element.get("class") or []) + " " + (element.get("id") or "")
+        if attributes.strip() and BOILERPLATE_PATTERN.search(attributes):
+            element.decompose()
+
+    main = _find_main_element(soup)
+    blocks = [text for text, link_length in _text_blocks(main) if link_length / len(text) < 0.5]
+    if not blocks:
+        blocks = [clean_text(main.get_text(" "))]
+    return title, "\n\n".join(blocks)
@@ -0,0 +1,211 @@
+# modules/dedup.py
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from functools import lru_cache
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from modules.settings import get_settings
+
+# Query parameters that only track where a click came from
+TRACKING_PARAMS = re.compile(
+    r"^(utm_\w+|fbclid|gclid|dclid|gbraid|wbraid|msclkid|mc_cid|mc_eid|_hs\w+|hsa_\w+|igshid|yclid|ref|ref_src|"
+    r"amp|outputtype|__twitter_impression)$",
+    re.IGNORECASE,
+)
+
+SHINGLE_SIZE = 3
+MIN_SHINGLES = 20
+SIMHASH_BITS = 64
+# 64 bits in eight 8-bit bands: two hashes within 7 bits of each other share at least one band
+BANDS = 8
+MAX_DISTANCE = BANDS - 1
+DEFAULT_MAX_DISTANCE = 5
+
+
+def canonicalize_url(url):
+    """
+    Normalizes the URL variants that point at the same article.
+
+    Lower-cases scheme and host, drops a leading "www.", "amp." or "m." label when at least
+    two labels remain (so "m.example.com" but not "amp.dev" is rewritten), default ports, fragments, tracking parameters
+    (utm_*, fbclid, gclid, ...) and trailing slashes, sorts the remaining query parameters
+    and maps AMP variants (/amp paths, .amp.html) to the regular page.
+
+    Args:
+        url (str): The URL as submitted.
+
+    Returns:
+        str: The canonical URL.
+    """
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower() or "https"
+    labels = (parts.hostname or "").lower().split(".")
+    while len(labels) > 2 and labels[0] in ("www", "amp", "m"):
+        labels.pop(0)
+    host = ".".join(labels)
+    port = parts.port
+    netloc = host if port in (None, 80, 443) else f"{host}:{port}"
+
+    path = re.sub(r"/+", "/", parts.path or "/")
+    path = re.sub(r"\.amp\.html?$", ".html", path)
+    path = re.sub(r"/amp(/|$)", "/", path)
+    if len(path) > 1:
+        path = path.rstrip("/")
+
+    query = sorted((key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True) if not TRACKING_PARAMS.match(key))
+    # https and http serve the same article almost everywhere
+    return urlunsplit(("https" if scheme == "http" else scheme, netloc, path, urlencode(query), ""))
+
+
+def simhash(text):
+    """
+    Computes a 64-bit SimHash of text from hashed word 3-shingles.
+
+    Near-identical texts (the same article with a different header, a changed byline or a
+    syndication note) differ in only a few bits.
+
+    Args:
+        text (str): The cleaned page text.
+
+    Returns:
+        int: The unsigned 64-bit hash, or None if the text is too short to fingerprint.
+    """
+    import numpy as np
+
+    words = re.findall(r"\w+", text.lower())
+    shingles = {" ".join(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)}
+    if len(shingles) < MIN_SHINGLES:
+        return None
+
+    hashes = np.fromiter(
+        (int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "little") for shingle in shingles),
+        dtype=np.uint64,
+        count=len(shingles),
+    )
+    bits = (hashes[:, None] >> np.arange(SIMHASH_BITS, dtype=np.uint64)) & np.uint64(1)
+    votes = bits.sum(axis=0, dtype=np.int64) * 2 - len(shingles)
+    return sum(1 << int(i) for i in np.flatnonzero(votes > 0))
+
+
+def hamming_distance(a, b):
+    return bin(a ^ b).count("1")
+
+
+def _signed(value):
+    # SQLite integers are signed 64-bit
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+def _bands(value):
+    width = SIMHASH_BITS // BANDS
+    return [(value >> (i * width)) & ((1 << width) - 1) for i in range(BANDS)]
+
+
+class SummaryIndex:
+    """
+    Stores summaries by canonical URL and content SimHash so repeated and syndicated pages
+    can reuse an earlier summary instead of running the summarize stage again.
+
+    Near-duplicate lookups only compare hashes that share one of eight 8-bit bands, which
+    is guaranteed for any pair within `max_distance` <= 7 bits.
+    """
+
+    def __init__(self, path, max_distance=DEFAULT_MAX_DISTANCE, ttl_seconds=7 * 24 * 3600):
+        if not 0 <= max_distance <= MAX_DISTANCE:
+            # Wider matches could miss the shared band and be reported as new pages
+            raise ValueError(f"max_distance must be between 0 and {MAX_DISTANCE}, got {max_distance}")
+        self.path = path
+        self.max_distance = max_distance
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS summaries (
+                canonical_url TEXT NOT NULL,
+                model_name TEXT NOT NULL,
+                simhash INTEGER NOT NULL,
+                band0 INTEGER NOT NULL,
+                band1 INTEGER NOT NULL,
+                band2 INTEGER NOT NULL,
+                band3 INTEGER NOT NULL,
+                band4 INTEGER NOT NULL,
+                band5 INTEGER NOT NULL,
+                band6 INTEGER NOT NULL,
+                band7 INTEGER NOT NULL,
+                summary_info TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                PRIMARY KEY (canonical_url, model_name)
+            )
+            """
+        )
+        for band in range(BANDS):
+            self._conn.execute(f"CREATE INDEX IF NOT EXISTS summaries_band{band} ON summaries (band{band})")
+        self._conn.commit()
+
+    def add(self, url, content_hash, model_name, summary_info):
+        """
+        Stores the summary of a page, replacing an earlier one for the same canonical URL.
+
+        Args:
+            url (str): The page URL.
+            content_hash (int): The SimHash of the cleaned page text.
+            model_name (str): The model that wrote the summary.
+            summary_info (dict): The summary info to reuse.
+        """
+        with self._lock:
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO summaries VALUES (?, ?, ?, {', '.join('?' * BANDS)}, ?, ?)",
+                (canonicalize_url(url), model_name, _signed(content_hash), *_bands(content_hash),
+                 json.dumps(summary_info), time.time()),
+            )
+            self._conn.commit()
+
+    def find(self, content_hash, model_name):
+        """
+        Finds the stored summary of the closest near-duplicate page.
+
+        Args:
+            content_hash (int): The SimHash of the cleaned page text.
+            model_name (str): Only summaries from this model are reused.
+
+        Returns:
+            dict: The stored summary info plus "canonical_url" and "distance", or None.
+        """
+        bands = _bands(content_hash)
+        oldest = time.time() - self.ttl_seconds if self.ttl_seconds is not None else 0
+        with self._lock:
+            rows = self._conn.execute(
+                f"""
+                SELECT canonical_url, simhash, summary_info FROM summaries
+                WHERE model_name = ? AND created_at >= ? AND ({" OR ".join(f"band{i} = ?" for i in range(BANDS))})
+                """,
+                (model_name, oldest, *bands),
+            ).fetchall()
+        best = None
+        for canonical_url, stored_hash, summary_info in rows:
+            distance = hamming_distance(content_hash, stored_hash % (1 << 64))
+            if distance <= self.max_distance and (best is None or distance < best["distance"]):
+                best = {**json.loads(summary_info), "canonical_url": canonical_url, "distance": distance}
+        return best
+
+
+@lru_cache(maxsize=None)
+def get_summary_index():
+    """
+    Returns the process-wide summary index, configured from the settings.
+
+    Returns:
+        SummaryIndex: The shared index.
+    """
+    settings = get_settings()
+    return SummaryIndex(settings.summary_index_path, settings.dedup_max_distance, settings.llm_cache_ttl_seconds)
@@ -0,0 +1,402 @@
+# modules/feed_ingest.py
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import parsedate_to_datetime
+
+from modules.batch_runner import BatchRunner
+from modules.content_extractor import fetch_page
+from modules.dedup import hamming_distance
+from modules.instrumentation import stage
+from modules.scrape_summary import ScrapeSummaryGenerator
+from modules.settings import get_settings
+
+# The sitemap protocol caps a sitemap file at 50 MB
+FEED_MAX_BYTES = 50_000_000
+
+# Sitemap indexes are followed this many levels deep
+MAX_SITEMAP_DEPTH = 2
+
+
+def _local_name(tag):
+    # "{http://www.sitemaps.org/schemas/sitemap/0.9}loc" -> "loc"
+    return tag.rsplit("}", 1)[-1]
+
+
+def _child_text(element, *names):
+    for child in element:
+        if _local_name(child.tag) in names and child.text and child.text.strip():
+            return child.text.strip()
+    return None
+
+
+def _normalize_date(value):
+    # RSS dates are RFC 822; sitemap and Atom dates are already ISO 8601
+    if not value:
+        return None
+    try:
+        return parsedate_to_datetime(value).isoformat()
+    except (TypeError, ValueError):
+        return value
+
+
+def parse_feed(body):
+    """
+    Parses a sitemap, sitemap index, RSS or Atom document.
+
+    Args:
+        body (bytes): The document.
+
+    Returns:
+        tuple: (articles, sitemaps) where articles is a list of (url, lastmod) pairs and
+        sitemaps the URLs of child sitemaps listed by a sitemap index. lastmod is the entry's
+        lastmod, updated or publication date, or None if the feed gives none.
+
+    Raises:
+        ValueError: If the document is not one of the supported formats.
+    """
+    import xml.etree.ElementTree as ElementTree
+
+    try:
+        root = ElementTree.fromstring(body)
+    except ElementTree.ParseError as e:
+        raise ValueError(f"Not an XML feed: {e}") from None
+    kind = _local_name(root.tag)
+    articles, sitemaps = [], []
+
+    if kind in ("urlset", "sitemapindex"):
+        for entry in root:
+            url = _child_text(entry, "loc")
+            if not url:
+                continue
+            if kind == "sitemapindex":
+                sitemaps.append(url)
+            else:
+                articles.append((url, _child_text(entry, "lastmod")))
+    elif kind in ("rss", "RDF"):
+        for item in root.iter():
+            if _local_name(item.tag) == "item":
+                url = _child_text(item, "link", "guid")
+                if url:
+                    articles.append((url, _normalize_date(_child_text(item, "updated", "pubDate", "date"))))
+    elif kind == "feed":
+        for entry in root:
+            if _local_name(entry.tag) != "entry":
+                continue
+            links = [link for link in entry if _local_name(link.tag) == "link" and link.get("href")]
+            alternate = [link for link in links if link.get("rel", "alternate") == "alternate"]
+            if alternate or links:
+                url = (alternate or links)[0].get("href")
+                articles.append((url, _child_text(entry, "updated", "published")))
+    else:
+        raise ValueError(f"Unsupported feed format <{kind}>")
+    return articles, sitemaps
+
+
+class FeedState:
+    """
+    What feed ingestion has already seen, in a local SQLite file.
+
+    Feeds and articles keep the ETag and Last-Modified of their last download for
+    conditional requests, and sitemap indexes the child sitemaps they listed. Articles also
+    keep the feed's lastmod and the SimHash of their cleaned text, and stay "pending" until
+    they have been through the pipeline.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or get_settings().feed_state_path
+        self._lock = threading.Lock()
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS feeds (
+                url TEXT PRIMARY KEY,
+                etag TEXT,
+                last_modified TEXT,
+                checked_at REAL NOT NULL,
+                sitemaps TEXT
+            )
+            """
+        )
+        # State files created before child sitemaps were kept
+        if "sitemaps" not in {row[1] for row in self._conn.execute("PRAGMA table_info(feeds)")}:
+            self._conn.execute("ALTER TABLE feeds ADD COLUMN sitemaps TEXT")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS articles (
+                url TEXT PRIMARY KEY,
+                feed_url TEXT NOT NULL,
+                lastmod TEXT,
+                status TEXT NOT NULL,
+                etag TEXT,
+                last_modified TEXT,
+                content_hash INTEGER,
+                checked_at REAL,
+                processed_at REAL
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS articles_feed_status ON articles (feed_url, status)")
+        self._conn.commit()
+
+    def feed(self, url):
+        with self._lock:
+            row = self._conn.execute("SELECT etag, last_modified FROM feeds WHERE url = ?", (url,)).fetchone()
+        return {"etag": row[0], "last_modified": row[1]} if row else {"etag": None, "last_modified": None}
+
+    def child_sitemaps(self, url):
+        # The child sitemaps a sitemap index listed when it was last downloaded
+        with self._lock:
+            row = self._conn.execute("SELECT sitemaps FROM feeds WHERE url = ?", (url,)).fetchone()
+        return json.loads(row[0]) if row and row[0] else []
+
+    def save_feed(self, url, etag, last_modified, sitemaps=()):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO feeds (url, etag, last_modified, checked_at, sitemaps) VALUES (?, ?, ?, ?, ?)",
+                (url, etag, last_modified, time.time(), json.dumps(list(sitemaps))),
+            )
+            self._conn.commit()
+
+    def add_entries(self, feed_url, entries, status="pending", limit=None):
+        """
+        Records a feed's entries. New entries and entries whose lastmod changed become pending;
+        the others keep their state. An entry without a lastmod (RSS items without dates, or
+        a URL also listed by a dated sitemap) never overwrites a known lastmod.
+
+        Args:
+            feed_url (str): The feed the entries are recorded under.
+            entries (list): (url, lastmod) pairs, in the order they should be taken.
+            status (str): State of the new and changed entries. Default is "pending".
+            limit (int): New or changed entries recorded at most; the rest are left for a later
+                call. None records all of them.
+
+        Returns:
+            tuple: (number of entries that became pending, number of new or changed entries left over)
+        """
+        changed = deferred = 0
+        with self._lock:
+            for url, lastmod in entries:
+                row = self._conn.execute("SELECT lastmod FROM articles WHERE url = ?", (url,)).fetchone()
+                if row is None or (lastmod is not None and lastmod != row[0]):
+                    if limit is not None and changed >= limit:
+                        deferred += 1
+                        continue
+                if row is None:
+                    self._conn.execute(
+                        "INSERT INTO articles (url, feed_url, lastmod, status) VALUES (?, ?, ?, ?)",
+                        (url, feed_url, lastmod, status),
+                    )
+                elif lastmod is not None and lastmod != row[0]:
+                    self._conn.execute(
+                        "UPDATE articles SET lastmod = ?, status = ? WHERE url = ?", (lastmod, status, url)
+                    )
+                else:
+                    continue
+                changed += 1
+            self._conn.commit()
+        return changed, deferred
+
+    def pending(self, feed_urls):
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT url FROM articles WHERE status = 'pending' AND feed_url IN ({', '.join('?' * len(feed_urls))}) "
+                "ORDER BY lastmod DESC",
+                list(feed_urls),
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def article(self, url):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT etag, last_modified, content_hash FROM articles WHERE url = ?", (url,)
+            ).fetchone()
+        if row is None:
+            return {"etag": None, "last_modified": None, "content_hash": None}
+        return {"etag": row[0], "last_modified": row[1], "content_hash": row[2] % (1 << 64) if row[2] is not None else None}
+
+    def mark_done(self, url, etag=None, last_modified=None, content_hash=None, processed=False):
+        """
+        Clears an article's pending state, updating the validators and fingerprint that are given.
+        """
+        if content_hash is not None and content_hash >= 1 << 63:
+            # SQLite integers are signed 64-bit
+            content_hash -= 1 << 64
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                """
+                UPDATE articles SET status = 'done', etag = COALESCE(?, etag), last_modified = COALESCE(?, last_modified),
+                content_hash = COALESCE(?, content_hash), checked_at = ?, processed_at = CASE WHEN ? THEN ? ELSE processed_at END
+                WHERE url = ?
+                """,
+                (etag, last_modified, content_hash, now, processed, now, url),
+            )
+            self._conn.commit()
+
+
+class FeedIngester:
+    """
+    Keeps posts flowing for the articles of a set of sitemaps and RSS/Atom feeds.
+
+    Each run re-reads every feed with a conditional GET (a 304 when nothing was published)
+    and marks new entries, and entries whose lastmod changed, as pending. Each pending
+    article is re-fetched conditionally and cleaned; only if it is new or its cleaned text
+    moved more than `change_distance` SimHash bits since it was last processed does it go
+    on to the summarize and post stages of a BatchRunner. Articles that fail stay pending
+    and are retried on the next run.
+
+    Args:
+        state (FeedState): What was seen on earlier runs. Defaults to FEED_STATE_PATH.
+        change_distance (int): SimHash bits of text change that count as a material change.
+            Defaults to DEDUP_MAX_DISTANCE, below which the summary index would reuse the
+            old summary anyway.
+        max_articles_per_feed (int): New or changed entries taken from each feed per run (a sitemap
+            index and its child sitemaps together), newest first and undated ones in feed order; the rest are taken on later runs. Default is 20.
+        feed_concurrency (int): Feeds fetched at once. Default is 8.
+        **batch_options: Passed to BatchRunner (concurrency, queue size, post mode).
+    """
+
+    def __init__(self, state=None, change_distance=None, max_articles_per_feed=20, feed_concurrency=8, **batch_options):
+        settings = get_settings()
+        self.state = state or FeedState()
+        self.change_distance = settings.dedup_max_distance if change_distance is None else change_distance
+        self.max_articles_per_feed = max_articles_per_feed
+        self.feed_concurrency = feed_concurrency
+        self.batch_options = batch_options
+        self._checked = {}
+        self._lock = threading.Lock()
+
+    def refresh_feed(self, feed_url, status="pending", root_url=None, depth=0, limit=None):
+        """
+        Fetches a feed conditionally and records its entries (following sitemap indexes).
+        Articles of child sitemaps are recorded under the root feed, and `max_articles_per_feed`
+        applies to the root feed as a whole: each child sitemap gets what its parent and
+        earlier siblings left of it (`limit`).
+
+        Returns:
+            int: The number of entries that became pending (or were recorded with `status`).
+        """
+        if root_url is None and status == "pending":
+            limit = self.max_articles_per_feed
+        known = self.state.feed(feed_url)
+        with stage("feed", url=feed_url) as span:
+            page = fetch_page(feed_url, content_types=None, max_bytes=FEED_MAX_BYTES, timeout=get_settings().fetch_timeout,
+                              **known)
+            span.attributes["status"] = page["status"]
+        changed = deferred = 0
+        if page["status"] == 304:
+            # An index often stays the same while its child sitemaps change, so those are still
+            # checked (a 304 each when they did not change either)
+            sitemaps = self.state.child_sitemaps(feed_url)
+        else:
+            articles, sitemaps = parse_feed(page["body"])
+            # Entries without a date sort last, in feed order
+            articles.sort(key=lambda entry: entry[1] or "", reverse=True)
+            # Marking entries as seen takes them all (no limit); only processing is capped per run
+            changed, deferred = self.state.add_entries(root_url or feed_url, articles, status, limit)
+        if depth < MAX_SITEMAP_DEPTH:
+            for sitemap_url in sitemaps:
+                remaining = None if limit is None else max(limit - changed, 0)
+                changed += self.refresh_feed(sitemap_url, status, root_url or feed_url, depth + 1, remaining)
+        if page["status"] != 304:
+            # With entries left over the validators are not kept, so the next run downloads the
+            # feed in full (not a 304) and takes the next ones
+            etag, last_modified = (None, None) if deferred else (page["etag"], page["last_modified"])
+            self.state.save_feed(feed_url, etag, last_modified, sitemaps)
+        return changed
+
+    def scrape_if_changed(self, url):
+        """
+        The BatchRunner scrape step: fetches and cleans an article unless it is unchanged.
+
+        Returns:
+            tuple: (ScrapeSummaryGenerator, docs) like `pipeline.scrape`, or None to skip the article.
+        """
+        # A stale entry from an earlier attempt must not mark this one done
+        with self._lock:
+            self._checked.pop(url, None)
+        try:
+            return self._scrape_if_changed(url)
+        except Exception:
+            # The article stays pending and is fetched again on the next run
+            with self._lock:
+                self._checked.pop(url, None)
+            raise
+
+    def _scrape_if_changed(self, url):
+        settings = get_settings()
+        known = self.state.article(url)
+        with stage("scrape", url=url, conditional=True) as span:
+            page = fetch_page(url, etag=known["etag"], last_modified=known["last_modified"],
+                              max_bytes=settings.fetch_max_bytes, timeout=settings.fetch_timeout)
+            span.attributes.update(status=page["status"], bytes=len(page["body"]), truncated=page["truncated"])
+        if page["status"] == 304:
+            self.state.mark_done(url)
+            return None
+
+        generator = ScrapeSummaryGenerator()
+        with stage("clean"):
+            docs = generator.clean_documents(url, page["body"], page["charset"])
+        content_hash = generator.content_hash
+        if (
+            known["content_hash"] is not None and content_hash is not None
+            and hamming_distance(known["content_hash"], content_hash) <= self.change_distance
+        ):
+            # Only the template, a date or a counter changed
+            self.state.mark_done(url, page["etag"], page["last_modified"])
+            return None
+        with self._lock:
+            self._checked[url] = (page["etag"], page["last_modified"], content_hash)
+        return generator, docs
+
+    def _on_record(self, record):
+        with self._lock:
+            checked = self._checked.pop(record["url"], None)
+        if record["status"] == "ok" and checked is not None:
+            self.state.mark_done(record["url"], *checked, processed=True)
+
+    def run(self, feed_urls, output_path, mark_seen=False):
+        """
+        Refreshes the feeds and runs the new or changed articles through the pipeline.
+
+        Args:
+            feed_urls (list): Sitemap, sitemap index, RSS or Atom URLs.
+            output_path (str): JSONL file the results of processed articles are appended to.
+            mark_seen (bool): Only record the current entries as seen, without processing them;
+                for a first run over feeds with a long history.
+
+        Returns:
+            dict: Counts of "feeds", "failed_feeds", "pending" articles, and of the "ok", "error"
+            and "skipped" (unchanged) articles.
+        """
+        feed_urls = list(feed_urls)
+        failed_feeds = 0
+        with ThreadPoolExecutor(max_workers=self.feed_concurrency) as executor:
+            futures = [executor.submit(self.refresh_feed, feed_url, "done" if mark_seen else "pending") for feed_url in feed_urls]
+            for feed_url, future in zip(feed_urls, futures):
+                try:
+                    future.result()
+                except Exception as e:
+                    failed_feeds += 1
+                    print(f"Feed {feed_url} failed: {e}")
+
+        pending = self.state.pending(feed_urls)
+        counts = {"ok": 0, "error": 0, "skipped": 0}
+        if pending:
+            runner = BatchRunner(scrape=self.scrape_if_changed, on_record=self._on_record, **self.batch_options)
+            try:
+                counts = asyncio.run(runner.run(pending, output_path))
+            finally:
+                # Articles without a record (the run failed) stay pending for the next run
+                with self._lock:
+                    self._checked.clear()
+        return {"feeds": len(feed_urls), "failed_feeds": failed_feeds, "pending": len(pending), **counts}
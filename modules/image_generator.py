@@ -1,11 +1,56 @@
 # modules/image_generator.py
-from openai import OpenAI
+import contextvars
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import lru_cache
+
+from modules.instrumentation import IMAGE_PRICES, stage
+from modules.llm_clients import get_openai_client
+from modules.resilience import call_with_resilience
+
+class RateLimiter:
+    """
+    Token bucket shared across threads: up to `per_minute` calls start at once, and the bucket
+    refills at `per_minute` calls per minute. Waiting callers are served in arrival order.
+    """
+
+    def __init__(self, per_minute: float):
+        self.rate = per_minute / 60.0
+        self.capacity = max(1.0, per_minute)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            # A negative balance reserves the next tokens for the callers already waiting
+            self._tokens -= 1
+            delay = -self._tokens / self.rate if self._tokens < 0 else 0.0
+        if delay > 0:
+            time.sleep(delay)
+
+
+@lru_cache(maxsize=None)
+def get_rate_limiter(per_minute: float) -> RateLimiter:
+    """
+    Returns the process-wide RateLimiter for a rate, so every ImageGenerator (the app's, the
+    job service's workers', speculative ones) draws from the same account limit.
+    """
+    return RateLimiter(per_minute)
+
 
 class ImageGenerator:
-    def __init__(self):
-        self.client = OpenAI()
+    def __init__(self, images_per_minute: float = 5, timeout: float = 90, max_workers: int = 4):
+        self.client = get_openai_client()
+        self.rate_limiter = get_rate_limiter(images_per_minute)
+        self.timeout = timeout
+        self.max_workers = max_workers
 
-    def create_image(self, prompt: str, size: str = "1024x1024", quality: str = "standard") -> str:
+    def create_image(self, prompt: str, size: str = "1024x1024", quality: str = "standard", timeout: float = None) -> str:
         """
         Generates an image using DALL-E 3 based on the provided prompt.
 
@@ -13,20 +58,70 @@ class ImageGenerator:
             prompt (str): The text prompt to generate the image.
             size (str): The size of the generated image. Default is "1024x1024".
             quality (str): The quality of the generated image. Default is "standard".
+            timeout (float): Request timeout in seconds. Defaults to the generator's timeout.
 
         Returns:
             str: The URL of the generated image.
         """
-        response = self.client.images.generate(
-            model="dall-e-3",
-            prompt=prompt,
-            size=size,
-            quality=quality,
-            n=1,  # DALL-E 3 requires n=1
-        )
+        timeout = timeout or self.timeout
+
+        def generate():
+            # Every attempt, retries included, counts against the rate limit
+            self.rate_limiter.wait()
+            return self.client.images.generate(
+                model="dall-e-3",
+                prompt=prompt,
+                size=size,
+                quality=quality,
+                n=1,  # DALL-E 3 requires n=1
+                timeout=timeout,
+            )
+
+        with stage("image.generate", size=size, quality=quality) as span:
+            # Images are billed per request, so they are retried but never hedged
+            response = call_with_resilience(generate, "openai.images", deadline=timeout * 2, hedge=False)
+            span.add_cost(IMAGE_PRICES.get((quality, size), 0.0))
         return response.data[0].url
 
-    def generate_social_media_images(self, topic: str, summary: str = "", num_images: int = 3) -> list:
+    def iter_images(self, prompt: str, num_images: int = 3, size: str = "1024x1024", quality: str = "standard"):
+        """
+        Generates several variants of the same prompt concurrently.
+
+        DALL-E 3 only accepts n=1, so each variant is its own request. Requests are issued from
+        a thread pool, throttled by the generator's rate limit. A variant whose request fails
+        yields its exception in place of a URL and the others carry on; the call only raises
+        if every variant failed.
+
+        Args:
+            prompt (str): The text prompt to generate the images.
+            num_images (int): The number of variants to generate. Default is 3.
+            size (str): The size of the generated images. Default is "1024x1024".
+            quality (str): The quality of the generated images. Default is "standard".
+
+        Yields:
+            str: Image URLs (or the exception of a failed variant) in the order the requests complete.
+        """
+        if num_images < 1:
+            return
+        failures = []
+        with ThreadPoolExecutor(max_workers=min(num_images, self.max_workers)) as executor:
+            # Each request runs in a copy of the caller's context so its stage joins the caller's trace
+            futures = [
+                executor.submit(contextvars.copy_context().run, self.create_image, prompt, size, quality)
+                for _ in range(num_images)
+            ]
+            for future in as_completed(futures):
+                try:
+                    image_url = future.result()
+                except Exception as e:
+                    failures.append(e)
+                    yield e
+                else:
+                    yield image_url
+        if len(failures) == num_images:
+            raise failures[0]
+
+    def generate_social_media_images(self, topic: str, summary: str = "", num_images: int = 3, size: str = "1024x1024") -> list:
         """
         Combines the prompt generation and image creation to produce multiple image URLs.
 
@@ -34,6 +129,7 @@ class ImageGenerator:
             topic (str): The main topic for the image.
             summary (str): A brief summary for additional context (optional).
             num_images (int): The number of images to generate. Default is 3.
+            size (str): The size of the generated images. Default is "1024x1024".
 
         Returns:
             list: A list of URLs of the generated images.
@@ -41,10 +137,5 @@ class ImageGenerator:
         # Step 1: Generate the prompt for DALL-E 3
         prompt = f"Generate an image for {topic}. {summary}"
 
-        # Step 2: Generate the images sequentially
-        image_urls = []
-        for _ in range(num_images):
-            image_url = self.create_image(prompt)
-            image_urls.append(image_url)
-
-        return image_urls
+        # Step 2: Generate the images concurrently, keeping the variants that succeeded
+        return [image_url for image_url in self.iter_images(prompt, num_images=num_images, size=size) if isinstance(image_url, str)]
@@ -0,0 +1,105 @@
+# modules/image_store.py
+import hashlib
+import os
+import tempfile
+from io import BytesIO
+
+from modules.instrumentation import stage
+from modules.settings import get_settings
+from modules.utils import is_png
+
+
+class ImageStore:
+    """
+    Local, content-addressed store for generated images.
+
+    DALL-E URLs expire after about an hour, so each image is fetched once, right after
+    generation, and its bytes are kept on disk under a hash of prompt, size and variant.
+    The UI then serves previews and downloads from the local file instead of re-fetching
+    and re-encoding the remote image on every rerun.
+    """
+
+    def __init__(self, directory=None, timeout=60, chunk_size=64 * 1024):
+        self.directory = directory or get_settings().image_store_dir
+        self.timeout = timeout
+        self.chunk_size = chunk_size
+        os.makedirs(self.directory, exist_ok=True)
+
+    @staticmethod
+    def make_key(prompt, size, variant=0):
+        """
+        Builds the storage key for an image.
+
+        Args:
+            prompt (str): The prompt the image was generated from.
+            size (str): The image size, e.g. "1024x1024".
+            variant (int): Index of the variant for the same prompt and size. Default is 0.
+
+        Returns:
+            str: The hex digest used as the file name.
+        """
+        return hashlib.sha256(f"{size}\x00{variant}\x00{prompt}".encode("utf-8")).hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.directory, f"{key}.png")
+
+    def has(self, key):
+        return os.path.exists(self.path(key))
+
+    def put(self, key, image_url):
+        """
+        Streams an image to disk and stores it under `key`, replacing any previous image.
+
+        PNG responses are written as-is; other formats are converted to PNG once.
+
+        Args:
+            key (str): The key from `make_key`.
+            image_url (str): The URL of the generated image.
+
+        Returns:
+            str: Path of the stored file.
+        """
+        import requests
+
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".part")
+        try:
+            with stage("image.download") as span, os.fdopen(fd, "wb") as f, \
+                    requests.get(image_url, stream=True, timeout=self.timeout) as response:
+                response.raise_for_status()
+                for chunk in response.iter_content(chunk_size=self.chunk_size):
+                    f.write(chunk)
+                span.attributes["bytes"] = f.tell()
+
+            with open(tmp_path, "rb") as f:
+                header = f.read(8)
+            if not is_png(header):
+                from PIL import Image
+
+                with Image.open(tmp_path) as img:
+                    byte_arr = BytesIO()
+                    img.save(byte_arr, format="PNG")
+                with open(tmp_path, "wb") as f:
+                    f.write(byte_arr.getvalue())
+
+            os.replace(tmp_path, self.path(key))
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return self.path(key)
+
+    def get(self, key):
+        """
+        Reads a stored image.
+
+        Args:
+            key (str): The key from `make_key`.
+
+        Returns:
+            bytes: The PNG bytes, or None if nothing is stored under the key.
+        """
+        try:
+            with open(self.path(key), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
@@ -0,0 +1,374 @@
+# modules/instrumentation.py
+import contextvars
+import json
+import threading
+import time
+import uuid
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from functools import lru_cache
+
+from modules.settings import get_settings
+
+# USD per 1M tokens (input, output). Estimates only; update when pricing changes.
+MODEL_PRICES = {
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4o": (2.50, 10.00),
+    "claude-3-5-haiku": (0.80, 4.00),
+    "claude-3-5-sonnet": (3.00, 15.00),
+    "llama-3.1-8b-instant": (0.05, 0.08),
+    "llama-3.1-70b-versatile": (0.59, 0.79),
+}
+
+# Prompt tokens served from the provider's prompt cache are billed at this share of the input price
+CACHED_INPUT_PRICE_RATIO = 0.5
+
+# USD per image by (quality, size)
+IMAGE_PRICES = {
+    ("standard", "1024x1024"): 0.040,
+    ("standard", "1792x1024"): 0.080,
+    ("standard", "1024x1792"): 0.080,
+    ("hd", "1024x1024"): 0.080,
+    ("hd", "1792x1024"): 0.120,
+    ("hd", "1024x1792"): 0.120,
+}
+
+DURATION_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+
+_current_trace = contextvars.ContextVar("smg_trace", default=None)
+_current_span = contextvars.ContextVar("smg_span", default=None)
+
+
+def estimate_llm_cost(model_name, prompt_tokens, completion_tokens, cached_tokens=0):
+    """
+    Estimates the cost of a chat completion.
+
+    Args:
+        model_name (str): The model name; matched by longest known prefix.
+        prompt_tokens (int): Input tokens, including cached ones.
+        completion_tokens (int): Output tokens.
+        cached_tokens (int): Input tokens served from the provider's prompt cache.
+
+    Returns:
+        float: Estimated USD, or 0.0 for unknown models.
+    """
+    for prefix in sorted(MODEL_PRICES, key=len, reverse=True):
+        if (model_name or "").startswith(prefix):
+            input_price, output_price = MODEL_PRICES[prefix]
+            billed_input = prompt_tokens - cached_tokens + cached_tokens * CACHED_INPUT_PRICE_RATIO
+            return (billed_input * input_price + completion_tokens * output_price) / 1_000_000
+    return 0.0
+
+
+class Span:
+    """
+    Timing, retry, token and cost record for one pipeline stage.
+    """
+
+    def __init__(self, name, trace_id=None, **attributes):
+        self.name = name
+        self.trace_id = trace_id
+        self.attributes = attributes
+        self.started_at = time.time()
+        self._start = time.perf_counter()
+        self.duration = None
+        self.retries = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.cached_tokens = 0
+        self.cost = 0.0
+        self.error = None
+        self._lock = threading.Lock()
+
+    def add_usage(self, model_name, prompt_tokens, completion_tokens, cached_tokens=0):
+        with self._lock:
+            self.prompt_tokens += prompt_tokens
+            self.completion_tokens += completion_tokens
+            self.cached_tokens += cached_tokens
+            self.cost += estimate_llm_cost(model_name, prompt_tokens, completion_tokens, cached_tokens)
+
+    def add_cost(self, usd):
+        with self._lock:
+            self.cost += usd
+
+    def add_retry(self):
+        with self._lock:
+            self.retries += 1
+
+    def callbacks(self):
+        """
+        Returns LangChain callback handlers that add LLM token usage to this span.
+        """
+        return [_usage_handler_class()(self)]
+
+    def finish(self):
+        self.duration = time.perf_counter() - self._start
+
+    def to_dict(self):
+        return {
+            "trace_id": self.trace_id,
+            "stage": self.name,
+            "started_at": self.started_at,
+            "duration_seconds": round(self.duration, 6) if self.duration is not None else None,
+            "retries": self.retries,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "cached_tokens": self.cached_tokens,
+            "cost_usd": round(self.cost, 6),
+            "error": self.error,
+            **self.attributes,
+        }
+
+
+@lru_cache(maxsize=None)
+def _usage_handler_class():
+    # Built lazily so importing this module does not import LangChain
+    from langchain_core.callbacks import BaseCallbackHandler
+
+    class UsageCallbackHandler(BaseCallbackHandler):
+        def __init__(self, span):
+            self.span = span
+
+        def on_llm_end(self, response, **kwargs):
+            llm_output = response.llm_output or {}
+            usage = llm_output.get("token_usage") or {}
+            model_name = llm_output.get("model_name", "")
+            prompt_tokens = usage.get("prompt_tokens", 0)
+            completion_tokens = usage.get("completion_tokens", 0)
+            # OpenAI reports the prompt tokens served from its prompt cache here
+            cached_tokens = (usage.get("prompt_tokens_details") or {}).get("cached_tokens") or 0
+            if not usage:
+                # Streaming responses report usage on the message instead
+                for generations in response.generations:
+                    for generation in generations:
+                        metadata = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+                        prompt_tokens += metadata.get("input_tokens", 0)
+                        completion_tokens += metadata.get("output_tokens", 0)
+                        cached_tokens += (metadata.get("input_token_details") or {}).get("cache_read") or 0
+                        model_name = model_name or (getattr(generation, "generation_info", None) or {}).get("model_name", "")
+            self.span.add_usage(model_name, prompt_tokens, completion_tokens, cached_tokens)
+
+    return UsageCallbackHandler
+
+
+class Trace:
+    """
+    The spans recorded for one unit of work (one URL, one button click).
+    """
+
+    def __init__(self, trace_id=None):
+        self.trace_id = trace_id or uuid.uuid4().hex
+        self.spans = []
+        self._lock = threading.Lock()
+
+    def add(self, span):
+        with self._lock:
+            self.spans.append(span)
+
+    def to_dicts(self):
+        with self._lock:
+            return [span.to_dict() for span in self.spans]
+
+
+class Recorder:
+    """
+    Aggregates finished spans into Prometheus metrics and appends them to a JSONL trace file.
+    """
+
+    def __init__(self, trace_path=None, keep_spans=1000):
+        self.trace_path = trace_path
+        self.recent_spans = deque(maxlen=keep_spans)
+        self._lock = threading.Lock()
+        self._durations = defaultdict(lambda: [0, 0.0, [0] * len(DURATION_BUCKETS)])
+        self._errors = defaultdict(int)
+        self._retries = defaultdict(int)
+        self._tokens = defaultdict(int)
+        self._cost = defaultdict(float)
+
+    def record(self, span):
+        with self._lock:
+            self.recent_spans.append(span)
+            count_sum_buckets = self._durations[span.name]
+            count_sum_buckets[0] += 1
+            count_sum_buckets[1] += span.duration
+            for i, bound in enumerate(DURATION_BUCKETS):
+                if span.duration <= bound:
+                    count_sum_buckets[2][i] += 1
+            if span.error:
+                self._errors[span.name] += 1
+            self._retries[span.name] += span.retries
+            self._tokens[(span.name, "prompt")] += span.prompt_tokens
+            self._tokens[(span.name, "completion")] += span.completion_tokens
+            self._tokens[(span.name, "cached")] += span.cached_tokens
+            self._cost[span.name] += span.cost
+            if self.trace_path:
+                with open(self.trace_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(span.to_dict()) + "\n")
+
+    def render_prometheus(self):
+        """
+        Renders all metrics in the Prometheus text exposition format.
+
+        Returns:
+            str: The metrics page.
+        """
+        lines = []
+        with self._lock:
+            lines += ["# HELP smg_stage_duration_seconds Wall time per pipeline stage.", "# TYPE smg_stage_duration_seconds histogram"]
+            for stage, (count, total, buckets) in sorted(self._durations.items()):
+                for bound, bucket_count in zip(DURATION_BUCKETS, buckets):
+                    lines.append(f'smg_stage_duration_seconds_bucket{{stage="{stage}",le="{bound}"}} {bucket_count}')
+                lines.append(f'smg_stage_duration_seconds_bucket{{stage="{stage}",le="+Inf"}} {count}')
+                lines.append(f'smg_stage_duration_seconds_sum{{stage="{stage}"}} {total}')
+                lines.append(f'smg_stage_duration_seconds_count{{stage="{stage}"}} {count}')
+            lines += ["# HELP smg_stage_errors_total Failed stage executions.", "# TYPE smg_stage_errors_total counter"]
+            lines += [f'smg_stage_errors_total{{stage="{stage}"}} {value}' for stage, value in sorted(self._errors.items())]
+            lines += ["# HELP smg_stage_retries_total Retried model calls per stage.", "# TYPE smg_stage_retries_total counter"]
+            lines += [f'smg_stage_retries_total{{stage="{stage}"}} {value}' for stage, value in sorted(self._retries.items())]
+            lines += [
+                "# HELP smg_tokens_total LLM tokens per stage; cached prompt tokens are also counted as prompt.",
+                "# TYPE smg_tokens_total counter",
+            ]
+            lines += [
+                f'smg_tokens_total{{stage="{stage}",kind="{kind}"}} {value}' for (stage, kind), value in sorted(self._tokens.items())
+            ]
+            lines += ["# HELP smg_cost_usd_total Estimated spend per stage.", "# TYPE smg_cost_usd_total counter"]
+            lines += [f'smg_cost_usd_total{{stage="{stage}"}} {value}' for stage, value in sorted(self._cost.items())]
+        return "\n".join(lines) + "\n"
+
+
+@lru_cache(maxsize=None)
+def get_recorder():
+    """
+    Returns the process-wide recorder. Spans are appended to TRACE_PATH when it is set.
+
+    Returns:
+        Recorder: The shared recorder.
+    """
+    return Recorder(trace_path=get_settings().trace_path)
+
+
+@contextmanager
+def trace(trace_id=None):
+    """
+    Groups the spans recorded inside the block (including in threads started with a copy of
+    the current context) under one trace id.
+
+    Yields:
+        Trace: Collects the finished spans.
+    """
+    current = Trace(trace_id)
+    token = _current_trace.set(current)
+    try:
+        yield current
+    finally:
+        _current_trace.reset(token)
+
+
+def run_in_trace(current, func, *args, **kwargs):
+    """
+    Calls `func` with `current` as the active trace; for work handed to executors, which do
+    not carry the caller's context.
+
+    Args:
+        current (Trace): The trace the spans are added to.
+        func (callable): The function to call.
+
+    Returns:
+        The return value of `func`.
+    """
+    token = _current_trace.set(current)
+    try:
+        return func(*args, **kwargs)
+    finally:
+        _current_trace.reset(token)
+
+
+@contextmanager
+def stage(name, **attributes):
+    """
+    Times a pipeline stage and records it when the block exits.
+
+    Args:
+        name (str): The stage name, e.g. "summarize" or "post.twitter".
+        **attributes: Extra fields for the JSONL trace.
+
+    Yields:
+        Span: The span, for adding token usage, cost or attributes.
+    """
+    current_trace = _current_trace.get()
+    span = Span(name, trace_id=current_trace.trace_id if current_trace else None, **attributes)
+    token = _current_span.set(span)
+    try:
+        yield span
+    except BaseException as e:
+        span.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        span.finish()
+        _current_span.reset(token)
+        if current_trace is not None:
+            current_trace.add(span)
+        get_recorder().record(span)
+
+
+def current_span():
+    return _current_span.get()
+
+
+def record_retry():
+    """
+    Counts a retry against the stage currently running, if any.
+    """
+    span = _current_span.get()
+    if span is not None:
+        span.add_retry()
+
+
+def llm_config(**config):
+    """
+    Builds a LangChain runnable config whose callbacks add token usage to the current span.
+
+    Args:
+        **config: Other config entries, e.g. max_concurrency.
+
+    Returns:
+        dict: The config.
+    """
+    span = _current_span.get()
+    if span is not None:
+        config["callbacks"] = span.callbacks()
+    return config
+
+
+def start_metrics_server(port, host="0.0.0.0"):
+    """
+    Serves the Prometheus metrics page at /metrics from a daemon thread.
+
+    Args:
+        port (int): Port to listen on.
+        host (str): Interface to bind. Default is all interfaces.
+
+    Returns:
+        ThreadingHTTPServer: The running server.
+    """
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = get_recorder().render_prometheus().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
@@ -0,0 +1,113 @@
+# modules/job_client.py
+import time
+
+FINISHED_STATUSES = ("done", "error")
+
+
+class JobClient:
+    """
+    Client for the job service API (see modules/job_service.py).
+
+    Args:
+        base_url (str): The service URL, e.g. "http://localhost:8000".
+        timeout (float): Per-request timeout in seconds. Default is 30.
+    """
+
+    def __init__(self, base_url, timeout=30):
+        import requests
+
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.session = requests.Session()
+
+    def _post_job(self, body):
+        response = self.session.post(f"{self.base_url}/jobs", json=body, timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()["id"]
+
+    def submit_posts(self, url, use_cache=True, post_mode="parallel", summary_token_budget=None, platforms=None):
+        """
+        Queues summary and post generation for a URL.
+
+        Args:
+            platforms (list): Platform names. None uses the service's POST_PLATFORMS.
+
+        Returns:
+            str: The job id.
+        """
+        return self._post_job({
+            "kind": "posts",
+            "url": url,
+            "use_cache": use_cache,
+            "post_mode": post_mode,
+            "summary_token_budget": summary_token_budget,
+            "platforms": platforms,
+        })
+
+    def submit_images(self, prompt, size, variants=1):
+        """
+        Queues generation of image variants for a prompt.
+
+        Returns:
+            str: The job id.
+        """
+        return self._post_job({"kind": "images", "prompt": prompt, "size": size, "variants": variants})
+
+    def get(self, job_id):
+        """
+        Returns the job, or None if the service does not know it.
+        """
+        response = self.session.get(f"{self.base_url}/jobs/{job_id}", timeout=self.timeout)
+        if response.status_code == 404:
+            return None
+        response.raise_for_status()
+        return response.json()
+
+    def follow(self, job_id, poll_interval=0.5, timeout=None):
+        """
+        Polls a job until it finishes.
+
+        Args:
+            job_id (str): The job id.
+            poll_interval (float): Seconds between polls. Default is 0.5.
+            timeout (float): Give up after this many seconds (optional).
+
+        Yields:
+            dict: The job each time its stage, status or partial result changes; the last one
+            has status "done" or "error".
+        """
+        deadline = time.monotonic() + timeout if timeout else None
+        last_update = None
+        while True:
+            job = self.get(job_id)
+            if job is None:
+                raise KeyError(f"Unknown job {job_id}")
+            if job["updated_at"] != last_update:
+                last_update = job["updated_at"]
+                yield job
+            if job["status"] in FINISHED_STATUSES:
+                return
+            if deadline and time.monotonic() > deadline:
+                raise TimeoutError(f"Job {job_id} did not finish within {timeout} s")
+            time.sleep(poll_interval)
+
+    def wait(self, job_id, poll_interval=0.5, timeout=None):
+        """
+        Blocks until a job finishes and returns it.
+        """
+        for job in self.follow(job_id, poll_interval, timeout):
+            pass
+        return job
+
+    def image(self, image_key):
+        """
+        Downloads a stored image.
+
+        Returns:
+            bytes: The PNG bytes, or None if the service has no image under the key.
+        """
+        response = self.session.get(f"{self.base_url}/images/{image_key}", timeout=self.timeout)
+        if response.status_code == 404:
+            return None
+        response.raise_for_status()
+        return response.content
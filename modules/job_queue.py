@@ -0,0 +1,217 @@
+# modules/job_queue.py
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+
+from modules.settings import get_settings
+
+JOB_KINDS = ("posts", "images")
+JOB_STATUSES = ("queued", "running", "done", "error")
+
+
+class JobQueue:
+    """
+    Persistent job queue in a local SQLite file.
+
+    Jobs survive restarts of both the UI and the workers. Workers claim jobs in submission
+    order with a single UPDATE, so several worker threads (or processes sharing the file) never
+    run the same job at once. A claimed job is leased to the claiming queue's owner for
+    `lease_seconds`, and the owner's workers keep renewing the lease while the job makes progress
+    (see `renew_leases`). A job whose lease ran out, because its process died or the job hung, is
+    put back in the queue by `requeue_expired`, or marked "error" once it has been claimed
+    `max_attempts` times. Updates from a worker that lost its job are ignored.
+
+    Args:
+        path (str): The SQLite file. Defaults to JOB_QUEUE_PATH.
+        lease_seconds (float): How long a claim lasts without renewal. Defaults to JOB_LEASE_SECONDS.
+        max_attempts (int): Claims before a job that keeps losing its worker is given up.
+            Defaults to JOB_MAX_ATTEMPTS.
+        stall_seconds (float): Leases of jobs without progress for this long are no longer renewed.
+            Defaults to JOB_STALL_SECONDS.
+    """
+
+    def __init__(self, path=None, lease_seconds=None, max_attempts=None, stall_seconds=None):
+        settings = get_settings()
+        self.path = path or settings.job_queue_path
+        self.lease_seconds = settings.job_lease_seconds if lease_seconds is None else lease_seconds
+        self.max_attempts = settings.job_max_attempts if max_attempts is None else max_attempts
+        self.stall_seconds = settings.job_stall_seconds if stall_seconds is None else stall_seconds
+        # Identifies this queue's claims among the processes sharing the file
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._lock = threading.Lock()
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                kind TEXT NOT NULL,
+                params TEXT NOT NULL,
+                status TEXT NOT NULL,
+                stage TEXT,
+                result TEXT,
+                error TEXT,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                owner TEXT,
+                lease_until REAL,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )
+            """
+        )
+        # Queue files created before leases existed
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+        for column, column_type in (("owner", "TEXT"), ("lease_until", "REAL")):
+            if column not in columns:
+                self._conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} {column_type}")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_status_created_at ON jobs (status, created_at)")
+        self._conn.commit()
+
+    def submit(self, kind, params):
+        """
+        Adds a job to the queue.
+
+        Args:
+            kind (str): "posts" (summary and posts for a URL) or "images" (image variants for a prompt).
+            params (dict): The job parameters, stored as JSON.
+
+        Returns:
+            str: The job id.
+        """
+        if kind not in JOB_KINDS:
+            raise ValueError(f"Unknown job kind {kind!r}, expected one of {JOB_KINDS}")
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs (id, kind, params, status, created_at, updated_at) VALUES (?, ?, ?, 'queued', ?, ?)",
+                (job_id, kind, json.dumps(params), now, now),
+            )
+            self._conn.commit()
+        return job_id
+
+    def claim(self):
+        """
+        Marks the oldest queued job as running, leased to this queue's owner, and returns it.
+
+        Returns:
+            dict: The job, or None if the queue is empty.
+        """
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                """
+                UPDATE jobs SET status = 'running', attempts = attempts + 1, owner = ?, lease_until = ?, updated_at = ?
+                WHERE id = (SELECT id FROM jobs WHERE status = 'queued' ORDER BY created_at LIMIT 1)
+                RETURNING id
+                """,
+                (self.owner, now + self.lease_seconds, now),
+            ).fetchone()
+            self._conn.commit()
+        return self.get(row[0]) if row else None
+
+    def update(self, job_id, stage=None, result=None):
+        """
+        Records progress of a running job. `result` replaces the partial result so far.
+        """
+        with self._lock:
+            self._conn.execute(
+                """
+                UPDATE jobs SET stage = COALESCE(?, stage), result = COALESCE(?, result), updated_at = ?
+                WHERE id = ? AND owner = ?
+                """,
+                (stage, json.dumps(result) if result is not None else None, time.time(), job_id, self.owner),
+            )
+            self._conn.commit()
+
+    def complete(self, job_id, result):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = 'done', stage = NULL, result = ?, updated_at = ? WHERE id = ? AND owner = ?",
+                (json.dumps(result), time.time(), job_id, self.owner),
+            )
+            self._conn.commit()
+
+    def fail(self, job_id, error):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = 'error', error = ?, updated_at = ? WHERE id = ? AND owner = ?",
+                (error, time.time(), job_id, self.owner),
+            )
+            self._conn.commit()
+
+    def renew_leases(self):
+        """
+        Extends the leases of the running jobs this queue's owner claimed, except jobs that have
+        not made progress (a stage or result update) for `stall_seconds`, which are left to expire.
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET lease_until = ? WHERE status = 'running' AND owner = ? AND updated_at > ?",
+                (now + self.lease_seconds, self.owner, now - self.stall_seconds),
+            )
+            self._conn.commit()
+
+    def requeue_expired(self):
+        """
+        Puts running jobs whose lease ran out back in the queue, whichever process claimed them.
+        Jobs already claimed `max_attempts` times are marked "error" instead.
+
+        Returns:
+            tuple: (number of jobs requeued, number of jobs given up)
+        """
+        now = time.time()
+        with self._lock:
+            failed = self._conn.execute(
+                """
+                UPDATE jobs SET status = 'error', error = ?, owner = NULL, lease_until = NULL, updated_at = ?
+                WHERE status = 'running' AND (lease_until IS NULL OR lease_until < ?) AND attempts >= ?
+                """,
+                (f"Worker lost the job {self.max_attempts} times", now, now, self.max_attempts),
+            ).rowcount
+            requeued = self._conn.execute(
+                """
+                UPDATE jobs SET status = 'queued', stage = NULL, owner = NULL, lease_until = NULL, updated_at = ?
+                WHERE status = 'running' AND (lease_until IS NULL OR lease_until < ?)
+                """,
+                (now, now),
+            ).rowcount
+            self._conn.commit()
+        return requeued, failed
+
+    def get(self, job_id):
+        """
+        Looks up a job.
+
+        Args:
+            job_id (str): The job id.
+
+        Returns:
+            dict: id, kind, params, status, stage, result, error, attempts, created_at and
+            updated_at, or None if there is no such job.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id, kind, params, status, stage, result, error, attempts, created_at, updated_at FROM jobs WHERE id = ?",
+                (job_id,),
+            ).fetchone()
+        if row is None:
+            return None
+        keys = ("id", "kind", "params", "status", "stage", "result", "error", "attempts", "created_at", "updated_at")
+        job = dict(zip(keys, row))
+        job["params"] = json.loads(job["params"])
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+    def counts(self):
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return {status: dict(rows).get(status, 0) for status in JOB_STATUSES}
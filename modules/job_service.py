@@ -0,0 +1,325 @@
+# modules/job_service.py
+import json
+import re
+import threading
+import time
+import traceback
+
+from modules import pipeline
+from modules.image_store import ImageStore
+from modules.instrumentation import get_recorder, trace
+from modules.job_queue import JOB_KINDS, JobQueue
+from modules.platforms import parse_platforms
+from modules.post_generator import POST_MODES, SocialMediaPostGenerator
+
+FINISHED_STATUSES = ("done", "error")
+
+
+class WorkerPool:
+    """
+    Threads that take jobs from a JobQueue and run them.
+
+    "posts" jobs scrape, summarize and generate posts for a URL; "images" jobs generate and
+    store image variants for a prompt. Progress (the current stage and, once available, the
+    summary) is written back to the queue so clients can show it while the job runs.
+
+    A maintenance thread renews the leases of the jobs this pool is running and requeues jobs
+    whose lease expired, so several pools can share a queue file and a job left behind by a
+    process that died is picked up by any of them once its lease runs out.
+
+    Args:
+        queue (JobQueue): The queue to work on.
+        concurrency (int): Number of worker threads. Default is 2.
+        poll_interval (float): Seconds between queue checks while idle. Default is 1.
+    """
+
+    def __init__(self, queue, concurrency=2, poll_interval=1.0, image_store=None):
+        self.queue = queue
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.image_store = image_store or ImageStore()
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._threads = []
+        self._post_generators = {}
+        self._image_generator = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        self._requeue_expired()
+        for index in range(self.concurrency):
+            thread = threading.Thread(target=self._work, name=f"job-worker-{index}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        thread = threading.Thread(target=self._maintain, name="job-leases", daemon=True)
+        thread.start()
+        self._threads.append(thread)
+        return self
+
+    def _requeue_expired(self):
+        requeued, failed = self.queue.requeue_expired()
+        if requeued or failed:
+            print(f"Requeued {requeued} and gave up {failed} job(s) whose worker stopped renewing its lease")
+
+    def _maintain(self):
+        # Renews well before the lease runs out, so a slow model call does not lose its job
+        while not self._stopping.wait(self.queue.lease_seconds / 3):
+            self.queue.renew_leases()
+            self._requeue_expired()
+
+    def notify(self):
+        # Called after a submit in the same process so an idle worker picks the job up immediately
+        self._wakeup.set()
+
+    def stop(self, timeout=None):
+        self._stopping.set()
+        self._wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def _work(self):
+        failures = 0
+        while not self._stopping.is_set():
+            try:
+                job = self.queue.claim()
+            except Exception:
+                # A locked or unavailable queue file must not end the worker; it backs off and retries
+                traceback.print_exc()
+                failures += 1
+                self._stopping.wait(min(self.poll_interval * 2 ** failures, 60))
+                continue
+            failures = 0
+            if job is None:
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+                continue
+            try:
+                with trace(job["id"]) as job_trace:
+                    if job["kind"] == "posts":
+                        result = self._run_posts(job)
+                    else:
+                        result = self._run_images(job)
+                result["timings"] = job_trace.to_dicts()
+                self.queue.complete(job["id"], result)
+            except Exception as e:
+                traceback.print_exc()
+                self.queue.fail(job["id"], f"{type(e).__name__}: {e}")
+
+    def _post_generator(self, use_cache, mode):
+        # One generator per configuration, shared by all workers like the app's cache_resource
+        with self._lock:
+            key = (use_cache, mode)
+            if key not in self._post_generators:
+                self._post_generators[key] = SocialMediaPostGenerator(use_cache=use_cache, mode=mode)
+            return self._post_generators[key]
+
+    def _run_posts(self, job):
+        params = job["params"]
+        job_id = job["id"]
+
+        self.queue.update(job_id, stage="scrape")
+        generator, docs = pipeline.scrape(
+            params["url"],
+            use_cache=params.get("use_cache", True),
+            summary_token_budget=params.get("summary_token_budget"),
+        )
+
+        self.queue.update(job_id, stage="summarize")
+        summary_info = pipeline.summarize(generator, docs)
+
+        self.queue.update(job_id, stage="posts", result=summary_info)
+        post_generator = self._post_generator(params.get("use_cache", True), params.get("post_mode", "parallel"))
+        posts, post_errors = pipeline.generate_posts(summary_info, post_generator, params.get("platforms"))
+        pipeline.record_run(summary_info, posts, post_errors)
+        return {
+            **summary_info,
+            "posts": posts,
+            "post_errors": post_errors,
+            "token_usage": pipeline.token_usage(summary_info, posts),
+        }
+
+    def _run_images(self, job):
+        from modules.image_generator import ImageGenerator
+
+        params = job["params"]
+        with self._lock:
+            if self._image_generator is None:
+                self._image_generator = ImageGenerator()
+        image_keys, errors = [], []
+        self.queue.update(job["id"], stage="images")
+        for image_url in self._image_generator.iter_images(
+            params["prompt"], num_images=int(params.get("variants", 1)), size=params["size"]
+        ):
+            if isinstance(image_url, Exception):
+                errors.append(f"{type(image_url).__name__}: {image_url}")
+                continue
+            image_key = ImageStore.make_key(params["prompt"], params["size"], len(image_keys))
+            self.image_store.put(image_key, image_url)
+            image_keys.append(image_key)
+            self.queue.update(job["id"], result={"image_keys": image_keys, "errors": errors})
+        return {"image_keys": image_keys, "errors": errors}
+
+
+def validate_job(kind, params):
+    """
+    Checks the parameters of a submitted job.
+
+    Returns:
+        str: An error message, or None if the job is valid.
+    """
+    if kind not in JOB_KINDS:
+        return f"kind must be one of {JOB_KINDS}"
+    if kind == "posts":
+        if not isinstance(params.get("url"), str) or not params["url"].startswith(("http://", "https://")):
+            return "posts jobs need an http(s) url"
+        if params.get("post_mode", "parallel") not in POST_MODES:
+            return f"post_mode must be one of {POST_MODES}"
+        if not isinstance(params.get("use_cache", True), bool):
+            return "use_cache must be true or false"
+        # 0 summarizes the whole page, like the app's sidebar setting; None uses SUMMARY_TOKEN_BUDGET
+        budget = params.get("summary_token_budget")
+        if budget is not None and (not isinstance(budget, int) or isinstance(budget, bool) or budget < 0):
+            return "summary_token_budget must be a positive integer, 0 or null"
+        if params.get("platforms") is not None:
+            try:
+                parse_platforms(params["platforms"])
+            except ValueError as e:
+                return str(e)
+    if kind == "images":
+        if not params.get("prompt") or not params.get("size"):
+            return "images jobs need a prompt and a size"
+        try:
+            variants = int(params.get("variants", 1))
+        except (TypeError, ValueError):
+            return "variants must be an integer"
+        if not 1 <= variants <= 4:
+            return "variants must be between 1 and 4"
+    return None
+
+
+def make_handler(queue, pool, image_store):
+    from http.server import BaseHTTPRequestHandler
+
+    class JobAPIHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def _send_json(self, status, body):
+            data = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_POST(self):
+            if self.path != "/jobs":
+                self._send_json(404, {"error": "not found"})
+                return
+            try:
+                params = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            except ValueError:
+                self._send_json(400, {"error": "body must be JSON"})
+                return
+            kind = params.pop("kind", "posts")
+            error = validate_job(kind, params)
+            if error:
+                self._send_json(400, {"error": error})
+                return
+            job_id = queue.submit(kind, params)
+            pool.notify()
+            self._send_json(202, {"id": job_id, "status": "queued"})
+
+        def do_GET(self):
+            path = self.path.split("?")[0]
+            if path == "/health":
+                self._send_json(200, {"jobs": queue.counts()})
+            elif path == "/metrics":
+                body = get_recorder().render_prometheus().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            elif match := re.fullmatch(r"/jobs/(\w+)", path):
+                job = queue.get(match.group(1))
+                self._send_json(200, job) if job else self._send_json(404, {"error": "no such job"})
+            elif match := re.fullmatch(r"/jobs/(\w+)/events", path):
+                self._stream_events(match.group(1))
+            elif match := re.fullmatch(r"/images/([0-9a-f]{64})", path):
+                data = image_store.get(match.group(1))
+                if data is None:
+                    self._send_json(404, {"error": "no such image"})
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", "image/png")
+                self.send_header("Content-Length", str(len(data)))
+                self.send_header("Cache-Control", "max-age=31536000, immutable")
+                self.end_headers()
+                self.wfile.write(data)
+            else:
+                self._send_json(404, {"error": "not found"})
+
+        def _stream_events(self, job_id):
+            # Server-sent events: the job is sent on every change until it finishes
+            job = queue.get(job_id)
+            if job is None:
+                self._send_json(404, {"error": "no such job"})
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Cache-Control", "no-cache")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            last_update = None
+            try:
+                while True:
+                    job = queue.get(job_id)
+                    if job["updated_at"] != last_update:
+                        last_update = job["updated_at"]
+                        self.wfile.write(f"data: {json.dumps(job)}\n\n".encode("utf-8"))
+                        self.wfile.flush()
+                    if job["status"] in FINISHED_STATUSES:
+                        break
+                    time.sleep(0.25)
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+            self.close_connection = True
+
+    return JobAPIHandler
+
+
+def serve(host="127.0.0.1", port=8000, concurrency=2, queue_path=None):
+    """
+    Starts the worker pool and serves the job API until interrupted.
+
+    Endpoints:
+        POST /jobs               Submit {"url": ...} (or {"kind": "images", "prompt", "size", "variants"}).
+        GET  /jobs/<id>          Job status, stage and (partial) result.
+        GET  /jobs/<id>/events   The same as server-sent events, until the job finishes.
+        GET  /images/<key>       A stored image.
+        GET  /health, /metrics   Queue counts and Prometheus metrics.
+
+    Args:
+        host (str): Interface to bind. Default is localhost.
+        port (int): Port to listen on. Default is 8000.
+        concurrency (int): Worker threads. Default is 2.
+        queue_path (str): SQLite file of the queue. Defaults to JOB_QUEUE_PATH.
+    """
+    from http.server import ThreadingHTTPServer
+
+    queue = JobQueue(queue_path)
+    image_store = ImageStore()
+    pool = WorkerPool(queue, concurrency=concurrency, image_store=image_store).start()
+    server = ThreadingHTTPServer((host, port), make_handler(queue, pool, image_store))
+    server.daemon_threads = True
+    print(f"Job service listening on http://{host}:{server.server_address[1]} with {concurrency} worker(s)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        pool.stop(timeout=5)
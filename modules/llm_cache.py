@@ -0,0 +1,155 @@
+# modules/llm_cache.py
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+from langchain_core.caches import BaseCache
+from langchain_core.load import dumps, loads
+
+from modules.settings import get_settings
+
+
+class SQLiteLLMCache(BaseCache):
+    """
+    On-disk cache for chat model responses with TTL and size-based LRU eviction.
+
+    Entries are keyed on a SHA-256 of the rendered prompt and the LangChain llm_string
+    (which carries the model name, temperature and other call parameters). Format
+    instructions from output parsers are part of the rendered prompt, so a schema
+    change produces a new key.
+    """
+
+    def __init__(self, path, ttl_seconds=7 * 24 * 3600, max_entries=10000):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS llm_cache (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS llm_cache_accessed_at ON llm_cache (accessed_at)")
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(prompt, llm_string):
+        return hashlib.sha256(f"{llm_string}\x00{prompt}".encode("utf-8")).hexdigest()
+
+    def lookup(self, prompt, llm_string):
+        key = self.make_key(prompt, llm_string)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT value, created_at FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            value, created_at = row
+            if self.ttl_seconds is not None and now - created_at > self.ttl_seconds:
+                self._conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                self._conn.commit()
+                return None
+            self._conn.execute("UPDATE llm_cache SET accessed_at = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+        return loads(value)
+
+    def update(self, prompt, llm_string, return_val):
+        key = self.make_key(prompt, llm_string)
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, value, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, dumps(list(return_val)), now, now),
+            )
+            self._evict()
+            self._conn.commit()
+
+    def clear(self, **kwargs):
+        with self._lock:
+            self._conn.execute("DELETE FROM llm_cache")
+            self._conn.commit()
+
+    def _evict(self):
+        if self.ttl_seconds is not None:
+            self._conn.execute("DELETE FROM llm_cache WHERE created_at < ?", (time.time() - self.ttl_seconds,))
+        if self.max_entries is not None:
+            (count,) = self._conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()
+            if count > self.max_entries:
+                self._conn.execute(
+                    "DELETE FROM llm_cache WHERE key IN (SELECT key FROM llm_cache ORDER BY accessed_at LIMIT ?)",
+                    (count - self.max_entries,),
+                )
+
+
+def stream_with_cache(model, input, make_stream, **kwargs):
+    """
+    Streams a chat model's response through its response cache, which LangChain only
+    consults for invoke: a cached response is yielded as a single chunk without calling the
+    model, and a response streamed to the end is stored for later calls, streamed or not.
+
+    Args:
+        model (BaseChatModel): The chat model; streams pass through unchanged if it has no cache.
+        input: The model input (a prompt value, messages or a string).
+        make_stream (callable): Starts the upstream stream; takes no arguments.
+        **kwargs: The call's model parameters (e.g. stop), which are part of the cache key.
+
+    Yields:
+        AIMessageChunk: The response chunks.
+    """
+    from langchain_core.messages import AIMessageChunk, message_chunk_to_message
+    from langchain_core.outputs import ChatGeneration
+
+    cache = model.cache if isinstance(model.cache, BaseCache) else None
+    if cache is None:
+        yield from make_stream()
+        return
+    # Keyed the way BaseChatModel keys invoke, so both share entries
+    prompt = dumps(model._convert_input(input).to_messages())
+    llm_string = model._get_llm_string(**kwargs)
+    cached = cache.lookup(prompt, llm_string)
+    if cached:
+        # Cache hits cost nothing, so no usage is reported
+        yield AIMessageChunk(content=cached[0].message.content, response_metadata={"cache_hit": True})
+        return
+    final = None
+    for chunk in make_stream():
+        final = chunk if final is None else final + chunk
+        yield chunk
+    if final is not None:
+        cache.update(prompt, llm_string, [ChatGeneration(message=message_chunk_to_message(final))])
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_llm_cache():
+    """
+    Returns the process-wide response cache, configured from LLM_CACHE_PATH,
+    LLM_CACHE_TTL_SECONDS and LLM_CACHE_MAX_ENTRIES.
+
+    Returns:
+        SQLiteLLMCache: The shared cache instance.
+    """
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            settings = get_settings()
+            _default_cache = SQLiteLLMCache(
+                settings.llm_cache_path,
+                ttl_seconds=settings.llm_cache_ttl_seconds,
+                max_entries=settings.llm_cache_max_entries,
+            )
+        return _default_cache
+
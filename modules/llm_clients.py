@@ -0,0 +1,56 @@
+# modules/llm_clients.py
+from functools import lru_cache
+
+from modules.settings import get_settings
+
+
+@lru_cache(maxsize=None)
+def get_chat_model(model_name="gpt-4o", temperature=0, use_cache=True, base_url=None, api_key=None):
+    """
+    Returns the process-wide chat model for the given settings.
+
+    Every generator with the same settings shares one ChatOpenAI instance, and with it one
+    HTTP connection pool, instead of opening new TLS connections per request.
+
+    Args:
+        model_name (str): The OpenAI model name. Default is "gpt-4o".
+        temperature (float): The sampling temperature. Default is 0.
+        use_cache (bool): Whether responses go through the on-disk response cache.
+        base_url (str): Another OpenAI-compatible endpoint (Groq, Anthropic). None uses OPENAI_BASE_URL.
+        api_key (str): The API key for `base_url`. None uses OPENAI_API_KEY.
+
+    Returns:
+        ChatOpenAI: The shared chat model.
+    """
+    from langchain_openai import ChatOpenAI
+    from modules.llm_cache import get_llm_cache
+
+    settings = get_settings()
+    settings.apply_environment()
+    # stream_usage reports token usage for streamed calls too, for the stage metrics.
+    # Retries are left to modules.resilience, which wraps the model in the chains.
+    endpoint = {"base_url": base_url, "api_key": api_key} if base_url else {}
+    return ChatOpenAI(
+        model=model_name,
+        temperature=temperature,
+        cache=get_llm_cache() if use_cache else False,
+        stream_usage=True,
+        timeout=settings.llm_timeout_seconds,
+        max_retries=0,
+        **endpoint,
+    )
+
+
+@lru_cache(maxsize=None)
+def get_openai_client():
+    """
+    Returns the process-wide OpenAI SDK client (used for image generation).
+
+    Returns:
+        OpenAI: The shared client.
+    """
+    from openai import OpenAI
+
+    get_settings().apply_environment()
+    # Retries are left to modules.resilience
+    return OpenAI(max_retries=0)
@@ -0,0 +1,321 @@
+# modules/model_router.py
+import threading
+import time
+from collections import deque
+from functools import lru_cache
+
+from modules.instrumentation import current_span
+from modules.llm_clients import get_chat_model
+from modules.resilience import CircuitOpenError, call_with_resilience, get_circuit_breaker, resilient, stream_with_resilience
+from modules.settings import get_settings
+
+# Quality tiers, lowest first. A task is served by any backend at or above its tier.
+QUALITY_TIERS = ("fast", "standard", "best")
+
+# Model names starting with this prefix are routed, e.g. "auto:fast"
+ROUTE_PREFIX = "auto:"
+
+# Every provider speaks the OpenAI chat completions API at its base URL
+PROVIDERS = ("openai", "groq", "anthropic")
+
+# Used when MODEL_BACKENDS is not set; backends whose provider has no API key are left out
+DEFAULT_BACKENDS = (
+    ("openai", "gpt-4o", "best"),
+    ("openai", "gpt-4o-mini", "standard"),
+    ("anthropic", "claude-3-5-sonnet-latest", "best"),
+    ("anthropic", "claude-3-5-haiku-latest", "standard"),
+    ("groq", "llama-3.1-70b-versatile", "standard"),
+    ("groq", "llama-3.1-8b-instant", "fast"),
+)
+
+# A backend whose recent calls failed more often than this is only tried after the healthy ones
+MAX_ERROR_RATE = 0.5
+
+# Only calls this recent count toward the error rate, so a demoted backend is trusted again once
+# its failures age out, even if it has not been called since
+ERROR_WINDOW_SECONDS = 300.0
+
+
+class NoBackendError(RuntimeError):
+    """
+    Raised when no configured backend meets a task's quality tier.
+    """
+
+
+class BackendStats:
+    """
+    Rolling latency, error rate and output token throughput of one backend.
+
+    Args:
+        window (int): Most recent calls kept. Default is 50.
+        error_window_seconds (float): Age after which a call no longer counts toward the
+            error rate. Default is ERROR_WINDOW_SECONDS.
+    """
+
+    def __init__(self, window=50, error_window_seconds=ERROR_WINDOW_SECONDS):
+        self.error_window_seconds = error_window_seconds
+        self._calls = deque(maxlen=window)  # (monotonic time, ok, seconds, completion tokens)
+        self._lock = threading.Lock()
+
+    def add(self, ok, seconds, completion_tokens=0):
+        with self._lock:
+            self._calls.append((time.monotonic(), ok, seconds, completion_tokens))
+
+    @property
+    def calls(self):
+        return len(self._calls)
+
+    @property
+    def error_rate(self):
+        since = time.monotonic() - self.error_window_seconds
+        with self._lock:
+            recent = [ok for at, ok, _, _ in self._calls if at >= since]
+        return sum(not ok for ok in recent) / len(recent) if recent else 0.0
+
+    @property
+    def median_latency(self):
+        with self._lock:
+            latencies = sorted(seconds for _, ok, seconds, _ in self._calls if ok)
+        return latencies[len(latencies) // 2] if latencies else None
+
+    @property
+    def tokens_per_second(self):
+        with self._lock:
+            seconds = sum(seconds for _, ok, seconds, _ in self._calls if ok)
+            tokens = sum(tokens for _, ok, _, tokens in self._calls if ok)
+        return tokens / seconds if seconds else None
+
+    def to_dict(self):
+        return {
+            "calls": self.calls,
+            "error_rate": round(self.error_rate, 3),
+            "median_latency_seconds": self.median_latency,
+            "tokens_per_second": self.tokens_per_second,
+        }
+
+
+class Backend:
+    """
+    One model at one provider.
+
+    Args:
+        provider (str): "openai", "groq" or "anthropic".
+        model (str): The provider's model name.
+        tier (str): The quality tier the model is trusted with.
+        base_url (str): The OpenAI-compatible endpoint. None uses the OpenAI SDK default.
+        api_key (str): The provider's API key. None uses OPENAI_API_KEY.
+    """
+
+    def __init__(self, provider, model, tier, base_url=None, api_key=None):
+        if tier not in QUALITY_TIERS:
+            raise ValueError(f"Unknown tier {tier!r}, expected one of {QUALITY_TIERS}")
+        self.provider = provider
+        self.model = model
+        self.tier = tier
+        self.base_url = base_url
+        self.api_key = api_key
+        self.stats = BackendStats()
+
+    @property
+    def name(self):
+        return f"{self.provider}/{self.model}"
+
+    def meets(self, tier):
+        return QUALITY_TIERS.index(self.tier) >= QUALITY_TIERS.index(tier)
+
+    def chat_model(self, temperature, use_cache):
+        return get_chat_model(self.model, temperature, use_cache, base_url=self.base_url, api_key=self.api_key)
+
+
+class ModelRouter:
+    """
+    Sends each chat call to the fastest healthy backend that meets the task's quality tier
+    and fails over to the next one when it errors. Only the last candidate retries.
+
+    Backends are ranked by the median latency of their recent successful calls; a backend
+    without measurements yet is tried first so every backend gets measured. Backends whose
+    circuit breaker is open are skipped and backends with an error rate above 50% over the
+    last five minutes are only tried after the healthy ones. Once their failures are older
+    than that they compete again, even without having been called in between.
+
+    Args:
+        backends (list): The Backend objects to route between.
+    """
+
+    def __init__(self, backends):
+        self.backends = list(backends)
+
+    def candidates(self, tier):
+        """
+        Returns the backends that meet `tier`, best first.
+
+        Raises:
+            NoBackendError: If no backend meets the tier.
+        """
+        eligible = [backend for backend in self.backends if backend.meets(tier)]
+        if not eligible:
+            raise NoBackendError(f"No model backend configured for the {tier!r} tier")
+
+        def rank(backend):
+            latency = backend.stats.median_latency
+            unhealthy = get_circuit_breaker(backend.name).state == "open" or backend.stats.error_rate > MAX_ERROR_RATE
+            return (unhealthy, latency is not None, latency or 0.0)
+
+        return sorted(eligible, key=rank)
+
+    def stats(self):
+        return {backend.name: {"tier": backend.tier, **backend.stats.to_dict()} for backend in self.backends}
+
+    def _record(self, backend, ok, start, message=None):
+        usage = getattr(message, "usage_metadata", None) or {}
+        backend.stats.add(ok, time.monotonic() - start, usage.get("output_tokens", 0))
+
+    def invoke(self, tier, input, config, temperature, use_cache, **kwargs):
+        candidates = self.candidates(tier)
+        for index, backend in enumerate(candidates):
+            model = backend.chat_model(temperature, use_cache)
+            last = index == len(candidates) - 1
+            start = time.monotonic()
+            try:
+                result = call_with_resilience(
+                    lambda: model.invoke(input, config, **kwargs), backend.name, max_attempts=None if last else 1
+                )
+            except Exception as e:
+                if not isinstance(e, CircuitOpenError):
+                    self._record(backend, False, start)
+                if last:
+                    raise
+                continue
+            self._record(backend, True, start, result)
+            _annotate_span(backend)
+            return result
+
+    def stream(self, tier, input, config, temperature, use_cache, **kwargs):
+        from modules.llm_cache import stream_with_cache
+
+        candidates = self.candidates(tier)
+        for index, backend in enumerate(candidates):
+            model = backend.chat_model(temperature, use_cache)
+            last = index == len(candidates) - 1
+            start = time.monotonic()
+            started = False
+            final = None
+            try:
+                chunks = stream_with_cache(model, input, lambda: stream_with_resilience(
+                    lambda: model.stream(input, config, **kwargs), backend.name, max_attempts=None if last else 1
+                ), **kwargs)
+                for chunk in chunks:
+                    started = True
+                    final = chunk if final is None else final + chunk
+                    yield chunk
+            except Exception as e:
+                if not isinstance(e, CircuitOpenError):
+                    self._record(backend, False, start)
+                # Output already yielded cannot be taken back
+                if started or last:
+                    raise
+                continue
+            # A response served from the cache says nothing about the backend's latency
+            if not (final is not None and final.response_metadata.get("cache_hit")):
+                self._record(backend, True, start, final)
+            _annotate_span(backend)
+            return
+
+
+def _annotate_span(backend):
+    span = current_span()
+    if span is not None:
+        span.attributes["backend"] = backend.name
+
+
+def parse_backends(spec):
+    """
+    Parses MODEL_BACKENDS, a comma-separated list of provider/model=tier entries,
+    e.g. "groq/llama-3.1-8b-instant=fast,openai/gpt-4o=best".
+
+    Returns:
+        list: (provider, model, tier) tuples.
+    """
+    backends = []
+    for entry in filter(None, (part.strip() for part in spec.split(","))):
+        name, _, tier = entry.partition("=")
+        provider, _, model = name.partition("/")
+        if provider not in PROVIDERS or not model:
+            raise ValueError(f"Invalid MODEL_BACKENDS entry {entry!r}, expected provider/model=tier")
+        backends.append((provider, model, tier or "standard"))
+    return backends
+
+
+@lru_cache(maxsize=None)
+def get_model_router():
+    """
+    Returns the process-wide router over the backends in MODEL_BACKENDS (or the defaults)
+    whose provider has an API key.
+
+    Returns:
+        ModelRouter: The shared router.
+    """
+    settings = get_settings()
+    endpoints = {
+        # OpenAI models use the same client settings as unrouted calls
+        "openai": (None, settings.openai_api_key),
+        "groq": (settings.groq_base_url, settings.groq_api_key),
+        "anthropic": (settings.anthropic_base_url, settings.anthropic_api_key),
+    }
+    specs = parse_backends(settings.model_backends) if settings.model_backends else DEFAULT_BACKENDS
+    return ModelRouter(
+        Backend(provider, model, tier, *endpoints[provider]) for provider, model, tier in specs if endpoints[provider][1]
+    )
+
+
+def is_routed(model_name):
+    return model_name.startswith(ROUTE_PREFIX)
+
+
+@lru_cache(maxsize=None)
+def _routed_runnable_class():
+    # Built lazily so importing this module does not import LangChain
+    from langchain_core.runnables import Runnable
+
+    class RoutedChatModel(Runnable):
+        """
+        A chat model stand-in whose every call is routed by a ModelRouter.
+        """
+
+        def __init__(self, router, tier, temperature, use_cache):
+            self.router = router
+            self.tier = tier
+            self.temperature = temperature
+            self.use_cache = use_cache
+
+        def invoke(self, input, config=None, **kwargs):
+            return self.router.invoke(self.tier, input, config, self.temperature, self.use_cache, **kwargs)
+
+        def stream(self, input, config=None, **kwargs):
+            yield from self.router.stream(self.tier, input, config, self.temperature, self.use_cache, **kwargs)
+
+    return RoutedChatModel
+
+
+def get_llm(model_name="gpt-4o", temperature=0, use_cache=True):
+    """
+    Returns the chat runnable the chains are built on.
+
+    A plain model name is an OpenAI model behind the resilience layer. "auto:<tier>"
+    (e.g. "auto:fast") routes every call to the fastest healthy backend of that tier or
+    better, across every provider with an API key.
+
+    Args:
+        model_name (str): An OpenAI model name or "auto:<tier>".
+        temperature (float): The sampling temperature.
+        use_cache (bool): Whether responses go through the on-disk response cache.
+
+    Returns:
+        Runnable: The chat runnable.
+    """
+    if not is_routed(model_name):
+        return resilient(get_chat_model(model_name, temperature, use_cache))
+    tier = model_name[len(ROUTE_PREFIX):]
+    if tier not in QUALITY_TIERS:
+        raise ValueError(f"Unknown tier {tier!r} in {model_name!r}, expected one of {QUALITY_TIERS}")
+    return _routed_runnable_class()(get_model_router(), tier, temperature, use_cache)
@@ -0,0 +1,111 @@
+# modules/pipeline.py
+from modules.post_generator import SocialMediaPostGenerator
+from modules.run_history import get_run_history
+from modules.scrape_summary import ScrapeSummaryGenerator
+from modules.token_counter import count_post_tokens
+
+
+def scrape(url, **generator_options):
+    """
+    Loads and cleans the page behind a URL.
+
+    Args:
+        url (str): The URL of the post.
+        **generator_options: Passed to ScrapeSummaryGenerator (e.g. use_cache).
+
+    Returns:
+        tuple: The ScrapeSummaryGenerator holding the page state and the cleaned documents.
+    """
+    generator = ScrapeSummaryGenerator(**generator_options)
+    docs = generator.load_and_clean_documents(url)
+    return generator, docs
+
+
+def summarize(generator, docs):
+    """
+    Splits and summarizes previously scraped documents.
+
+    Args:
+        generator (ScrapeSummaryGenerator): The generator returned by `scrape`.
+        docs (list): The cleaned documents returned by `scrape`.
+
+    Returns:
+        dict: The summary info (summary, final_token_size, source_url, topic).
+    """
+    split_docs = generator.split_documents(docs)
+    generator.summarize(split_docs)
+    return generator.get_summary_info()
+
+
+def generate_posts(summary_info, post_generator=None, platforms=None):
+    """
+    Generates the social media posts for a summary.
+
+    Args:
+        summary_info (dict): The summary info returned by `summarize`.
+        post_generator (SocialMediaPostGenerator): Generator to use (optional).
+        platforms (list): Platform names (optional). Defaults to the generator's platforms.
+
+    Returns:
+        tuple: The posts keyed by platform, and error messages keyed by the platforms that failed.
+    """
+    post_generator = post_generator or SocialMediaPostGenerator()
+    result = post_generator.generate_social_media_posts(
+        summary_info["summary"],
+        summary_info["topic"],
+        summary_info["source_url"],
+        platforms,
+    )
+    return result["branches"], result["errors"]
+
+
+def record_run(summary_info, posts, post_errors=None):
+    """
+    Stores a finished run in the run history, so the app can show it again without regenerating.
+
+    Args:
+        summary_info (dict): The summary info returned by `summarize`.
+        posts (dict): The posts returned by `generate_posts`.
+        post_errors (dict): The errors returned by `generate_posts` (optional).
+
+    Returns:
+        int: The run id.
+    """
+    return get_run_history().add(summary_info, posts, post_errors)
+
+
+def token_usage(summary_info, posts):
+    """
+    Collects per-stage token counts for budgeting.
+
+    Args:
+        summary_info (dict): The summary info returned by `summarize`.
+        posts (dict): The posts returned by `generate_posts`.
+
+    Returns:
+        dict: Tokens of the page input, the summary and each post by platform.
+    """
+    return {
+        "input": summary_info.get("input_token_size"),
+        "summary": summary_info.get("final_token_size"),
+        "posts": count_post_tokens(posts),
+    }
+
+
+def run_pipeline(url, post_generator=None):
+    """
+    Runs scrape, summarize and post generation for a single URL and records the run in the history.
+
+    Args:
+        url (str): The URL of the post.
+        post_generator (SocialMediaPostGenerator): Generator to use (optional).
+
+    Returns:
+        dict: The summary info plus "posts" keyed by platform, "post_errors" for platforms that
+        failed and "token_usage".
+    """
+    generator, docs = scrape(url)
+    summary_info = summarize(generator, docs)
+    posts, post_errors = generate_posts(summary_info, post_generator)
+    record_run(summary_info, posts, post_errors)
+    return {**summary_info, "posts": posts, "post_errors": post_errors, "token_usage": token_usage(summary_info, posts)}
@@ -0,0 +1,225 @@
+# modules/platforms.py
+import threading
+
+from modules.settings import get_settings
+
+
+class Platform:
+    """
+    Everything the post generator, the validator and the app need to know about one platform.
+
+    Args:
+        name (str): Registry key and the key of the platform's posts in results, e.g. "twitter".
+        display_name (str): Shown in prompts and the app, e.g. "Twitter".
+        post_key (str): Text field of the platform's post objects, e.g. "tweet".
+        schema_name (str): Name of the post schema in the format instructions, e.g. "Tweet".
+        pitch (str): How the posts are described in the prompt, e.g. "highly engaging and informative".
+        rules (list): Bullet points every post must follow. They are part of the static prompt prefix, so they
+            refer to "the topic" and "the article URL" rather than to per-article values.
+        max_characters (int): Length limit of one post.
+        image_size (str): DALL-E size of the platform's images.
+        repair_rules (list): Bullet points of the prompt that regenerates invalid posts. Defaults to `rules`.
+        url_length (int): Characters each URL counts as toward the limit. None counts URLs as written.
+        requires_url (bool): Whether every post must include the article URL. Default is True.
+        noun (str): What one post is called in the platform's own prompt. Default is "post".
+        qualified_noun (str): What one post is called when several platforms share a prompt.
+            Defaults to "<display_name> post".
+        max_concurrency (int): Calls for this platform in flight at once across the process.
+            Defaults to PLATFORM_CONCURRENCY.
+    """
+
+    def __init__(self, name, display_name, post_key, schema_name, pitch, rules, max_characters, image_size,
+                 repair_rules=None, url_length=None, requires_url=True, noun="post", qualified_noun=None,
+                 max_concurrency=None):
+        self.name = name
+        self.display_name = display_name
+        self.post_key = post_key
+        self.schema_name = schema_name
+        self.pitch = pitch
+        self.rules = list(rules)
+        self.repair_rules = list(repair_rules or rules)
+        self.max_characters = max_characters
+        self.image_size = image_size
+        self.url_length = url_length
+        self.requires_url = requires_url
+        self.noun = noun
+        self.qualified_noun = qualified_noun or f"{display_name} post"
+        self.max_concurrency = max_concurrency
+        self._slots = None
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return f"Platform({self.name!r})"
+
+    @property
+    def slots(self):
+        """
+        The semaphore that caps this platform's concurrent calls, created on first use.
+        """
+        with self._lock:
+            if self._slots is None:
+                self._slots = threading.BoundedSemaphore(self.max_concurrency or get_settings().platform_concurrency)
+            return self._slots
+
+
+# Every platform posts can be generated for, by name. Add more with register_platform.
+PLATFORMS = {}
+
+
+def register_platform(platform):
+    """
+    Adds a platform to the registry, replacing one of the same name. Register before the first
+    posts for it are generated; compiled prompts and chains are cached per platform.
+
+    Args:
+        platform (Platform): The platform.
+
+    Returns:
+        Platform: The registered platform.
+    """
+    PLATFORMS[platform.name] = platform
+    return platform
+
+
+def get_platform(name):
+    """
+    Returns the registered platform called `name`.
+
+    Raises:
+        ValueError: If no platform of that name is registered.
+    """
+    try:
+        return PLATFORMS[name]
+    except KeyError:
+        raise ValueError(f"Unknown platform {name!r}, expected one of {tuple(PLATFORMS)}") from None
+
+
+def parse_platforms(platforms):
+    """
+    Resolves a platform selection.
+
+    Args:
+        platforms: Platform names, as a list or a comma-separated string (e.g. "twitter,linkedin").
+
+    Returns:
+        tuple: The names, in the given order without duplicates.
+
+    Raises:
+        ValueError: If a name is not registered or the selection is empty.
+    """
+    if isinstance(platforms, str):
+        platforms = platforms.split(",")
+    names = tuple(dict.fromkeys(name.strip() for name in platforms if name.strip()))
+    if not names:
+        raise ValueError("No platforms selected")
+    for name in names:
+        get_platform(name)
+    return names
+
+
+register_platform(Platform(
+    "twitter", "Twitter", "tweet", "Tweet",
+    pitch="highly engaging, concise, and impactful",
+    rules=[
+        "Is within Twitter's 280-character limit, including the URL.",
+        "Includes relevant hashtags related to the topic.",
+        "Has a brief call to action, encouraging followers to engage or learn more.",
+        "Includes the article URL at the end of each tweet.",
+        "Uses a tone that is both professional and approachable.",
+        "Focus on the text, keeping each message engaging and concise.",
+    ],
+    repair_rules=[
+        "Is at most 280 characters, counting the URL as 23 characters.",
+        "Includes relevant hashtags related to the topic.",
+        "Has a brief call to action, encouraging followers to engage or learn more.",
+        "Includes the article URL at the end of each tweet.",
+        "Uses a tone that is both professional and approachable.",
+    ],
+    max_characters=280,
+    # Twitter wraps every link in a t.co URL of this length
+    url_length=23,
+    image_size="1024x1024",
+    noun="tweet",
+    qualified_noun="tweet",
+))
+
+register_platform(Platform(
+    "facebook", "Facebook", "fb_post", "FB_Post",
+    pitch="highly engaging and informative",
+    rules=[
+        "Is engaging and encourages interaction, such as likes, comments, and shares.",
+        "Can be more detailed and longer than a tweet, with a narrative or story-like structure.",
+        "Includes a clear call to action, encouraging followers to engage or learn more.",
+        "Includes the article URL at the end of the post.",
+        "Uses a tone that is professional, yet conversational and approachable.",
+        "Optionally includes relevant hashtags related to the topic.",
+    ],
+    repair_rules=[
+        "Is engaging and encourages interaction, such as likes, comments, and shares.",
+        "Includes a clear call to action, encouraging followers to engage or learn more.",
+        "Includes the article URL at the end of the post.",
+        "Uses a tone that is professional, yet conversational and approachable.",
+    ],
+    max_characters=63206,
+    image_size="1792x1024",
+))
+
+register_platform(Platform(
+    "linkedin", "LinkedIn", "linkedin_post", "LinkedIn_Post",
+    pitch="insightful and professional",
+    rules=[
+        "Opens with a hook in its first two lines, before LinkedIn's \"see more\" cut-off.",
+        "Shares a practical insight or takeaway for a professional audience.",
+        "Is at most 3000 characters, in short paragraphs.",
+        "Ends with a question or call to action that invites comments.",
+        "Includes the article URL at the end of the post.",
+        "Includes three to five relevant hashtags related to the topic.",
+    ],
+    max_characters=3000,
+    image_size="1792x1024",
+))
+
+register_platform(Platform(
+    "instagram", "Instagram", "instagram_post", "Instagram_Post",
+    pitch="highly engaging and visual",
+    rules=[
+        "Is a caption written to accompany an image, with a strong first line.",
+        "Is at most 2200 characters.",
+        "Uses a friendly, conversational tone; emojis are welcome.",
+        "Ends with a call to action pointing followers to the link in bio, since links in captions are not clickable.",
+        "Includes up to ten relevant hashtags related to the topic at the end.",
+    ],
+    max_characters=2200,
+    # Instagram captions cannot link, so posts point to the link in bio instead
+    requires_url=False,
+    image_size="1024x1024",
+))
+
+register_platform(Platform(
+    "threads", "Threads", "threads_post", "Threads_Post",
+    pitch="conversational and concise",
+    rules=[
+        "Is within Threads' 500-character limit, including the URL.",
+        "Reads like the start of a conversation rather than an announcement.",
+        "Includes at most one topic tag.",
+        "Includes the article URL at the end of each post.",
+        "Uses a tone that is casual yet knowledgeable.",
+    ],
+    max_characters=500,
+    image_size="1024x1792",
+))
+
+register_platform(Platform(
+    "mastodon", "Mastodon", "mastodon_post", "Mastodon_Post",
+    pitch="engaging and community-minded",
+    rules=[
+        "Is at most 500 characters, counting the URL as 23 characters.",
+        "Uses CamelCase hashtags related to the topic, so screen readers can read them.",
+        "Includes the article URL at the end of each post.",
+        "Uses a tone that is friendly and avoids marketing hype.",
+    ],
+    max_characters=500,
+    # Mastodon counts every link as 23 characters, whatever its length
+    url_length=23,
+    image_size="1792x1024",
+))
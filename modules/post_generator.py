@@ -1,127 +1,460 @@
-from langchain_core.output_parsers import JsonOutputParser
-from langchain_core.pydantic_v1 import BaseModel, Field
-from langchain.schema.runnable import RunnableParallel, RunnableLambda
-from langchain_openai import ChatOpenAI
-from langchain_core.prompts import PromptTemplate
+from functools import lru_cache
+from typing import List
+
+from modules.model_router import get_llm
+from modules.instrumentation import llm_config, stage
+from modules.platforms import get_platform, parse_platforms
+from modules.post_validator import normalize_posts, validate_posts
+from modules.settings import get_settings
+
+# LangChain, the pydantic schemas, parsers and prompt templates are built on first use
+# (see _build_prompts), so importing this module stays cheap. Each platform's prompt is
+# assembled from its entry in the registry (modules.platforms).
+#
+# Every prompt is a system message with the static instructions and format instructions,
+# followed by a user message with the summary, topic and URL. The system message is then an
+# identical prefix on every call for the platform, which providers serve from their prompt
+# cache once it is long enough (1024 tokens for OpenAI).
+
+POST_MODES = ("parallel", "combined")
+
+# Posts asked for per platform
+POSTS_PER_PLATFORM = 3
+
+# The per-article part of every post prompt
+ARTICLE_TEMPLATE = """Topic: {topic}
+URL: {url}
+
+{summary_str}"""
+
+
+def _bullets(rules):
+    return "\n".join(f"- {rule}" for rule in rules)
+
+
+def _join(items):
+    # "a", "a and b", "a, b and c"
+    return items[0] if len(items) == 1 else f"{', '.join(items[:-1])} and {items[-1]}"
+
+
+def post_template(platform):
+    """
+    Returns the prompt template for one platform's posts.
+
+    Args:
+        platform (Platform): The platform.
+
+    Returns:
+        tuple: The system template, with a format_instructions input, and the user template,
+        with summary_str, topic and url inputs.
+    """
+    system = f"""Based on the content the user sends about a topic, craft three {platform.pitch} {platform.display_name} posts.
+Ensure each {platform.noun}:
+{_bullets(platform.rules)}
+
+{{format_instructions}}"""
+    return system, f"""{ARTICLE_TEMPLATE}
+
+{platform.display_name.upper()} POSTS (in JSON format):"""
+
+
+def repair_template(platform):
+    """
+    Returns the templates asking for replacements of only the posts that failed validation.
+    The user template also takes problems and count inputs.
+    """
+    system = f"""Some of the {platform.display_name} posts written earlier about the content the user sends broke the rules.
+Write the replacement {platform.display_name} posts the user asks for. Ensure each {platform.noun}:
+{_bullets(platform.repair_rules)}
+
+{{format_instructions}}"""
+    return system, f"""{ARTICLE_TEMPLATE}
+
+Problems with the earlier posts:
+{{problems}}
+
+Write {{count}} replacement {platform.display_name} posts.
+
+{platform.display_name.upper()} POSTS (in JSON format):"""
+
+
+def combined_template(platforms):
+    """
+    Returns the templates asking for every platform's posts in one response (combined mode).
+    """
+    rules = "\n\n".join(f"Ensure each {platform.qualified_noun}:\n{_bullets(platform.rules)}" for platform in platforms)
+    system = f"""Based on the content the user sends about a topic, craft {_join([f"three {platform.display_name} posts" for platform in platforms])}.
+
+{rules}
+
+{{format_instructions}}"""
+    return system, f"""{ARTICLE_TEMPLATE}
+
+SOCIAL MEDIA POSTS (in JSON format):"""
+
+
+def _chat_prompt(templates, format_instructions):
+    from langchain_core.prompts import ChatPromptTemplate
+
+    system, human = templates
+    return ChatPromptTemplate.from_messages([("system", system), ("human", human)]).partial(
+        format_instructions=format_instructions
+    )
+
+
+@lru_cache(maxsize=None)
+def _build_prompts(platform):
+    from langchain_core.output_parsers import JsonOutputParser
+    from langchain_core.pydantic_v1 import Field, create_model
+
+    # The data structure of one post, e.g. Tweet with a "tweet" field
+    article = "an" if platform.display_name[0] in "AEIOU" else "a"
+    schema = create_model(
+        platform.schema_name,
+        **{platform.post_key: (str, Field(description=f"Text content of {article} {platform.display_name} post"))},
+    )
+    parser = JsonOutputParser(pydantic_object=schema)
+    format_instructions = parser.get_format_instructions()
+    return {
+        "schema": schema,
+        "parser": parser,
+        "prompt": _chat_prompt(post_template(platform), format_instructions),
+        "repair_prompt": _chat_prompt(repair_template(platform), format_instructions),
+    }
+
+
+@lru_cache(maxsize=None)
+def _build_combined_prompt(platforms):
+    from langchain_core.output_parsers import JsonOutputParser
+    from langchain_core.pydantic_v1 import Field, create_model
+
+    # The data structure for every platform in a single response, keyed by platform name
+    schema = create_model("SocialMediaPosts", **{
+        platform.name: (List[_build_prompts(platform)["schema"]], Field(description=f"Three {platform.display_name} posts"))
+        for platform in platforms
+    })
+    parser = JsonOutputParser(pydantic_object=schema)
+    return {
+        "schema": schema,
+        "parser": parser,
+        "prompt": _chat_prompt(combined_template(platforms), parser.get_format_instructions()),
+    }
+
+
+def post_prompt(platform):
+    """
+    Returns the ChatPromptTemplate for one platform's posts.
+
+    Args:
+        platform (str): A registered platform name.
+    """
+    return _build_prompts(get_platform(platform))["prompt"]
+
+
+def combined_prompt(platforms):
+    """
+    Returns the ChatPromptTemplate asking for every platform in `platforms` in one response.
+
+    Args:
+        platforms: Platform names, as a list or a comma-separated string.
+    """
+    return _build_combined_prompt(tuple(get_platform(name) for name in parse_platforms(platforms)))["prompt"]
+
+
+@lru_cache(maxsize=None)
+def _build_chains(model_name, temperature, use_cache, platform):
+    # Compiled once per model configuration and platform and shared by every generator instance
+    llm = get_llm(model_name, temperature, use_cache)
+    built = _build_prompts(platform)
+    return built["prompt"] | llm | built["parser"], built["repair_prompt"] | llm | built["parser"]
+
+
+@lru_cache(maxsize=None)
+def _build_combined_chain(model_name, temperature, use_cache, platforms):
+    built = _build_combined_prompt(platforms)
+    return built["prompt"] | get_llm(model_name, temperature, use_cache) | built["parser"]
+
+
+def _capture_errors(func, *args, **kwargs):
+    try:
+        return func(*args, **kwargs)
+    except Exception as e:
+        return e
+
 
 class SocialMediaPostGenerator:
-    def __init__(self, model_name="gpt-4o", temperature=0.7):
-        self.llm = ChatOpenAI(model=model_name, temperature=temperature)
-
-    def generate_twitter_posts_chain(self, summary, topic, url):
-        # Define the data structure for Twitter posts
-        class Tweet(BaseModel):
-            tweet: str = Field(description="Text content of a Twitter post")
-
-        parser = JsonOutputParser(pydantic_object=Tweet)
-
-        template = """
-        {summary_str}
-        
-        Based on the above content about {topic}, craft three highly engaging, concise, and impactful Twitter posts.
-        Ensure each tweet:
-        - Is within Twitter's 280-character limit, including the URL.
-        - Includes relevant hashtags related to {topic}.
-        - Has a brief call to action, encouraging followers to engage or learn more.
-        - Includes the following URL at the end of each tweet: {url}.
-        - Uses a tone that is both professional and approachable.
-        - Focus on the text, keeping each message engaging and concise.
-        
-        {format_instructions}
-
-        TWITTER POSTS (in JSON format):
+    def __init__(self, model_name=None, temperature=0.7, use_cache=True, mode="parallel", repair_attempts=None,
+                 platforms=None):
         """
-        
-        prompt_template = PromptTemplate(
-            template=template,
-            input_variables=["summary_str", "url"],
-            partial_variables={"format_instructions": parser.get_format_instructions()},
+        Args:
+            model_name (str): An OpenAI model name, or "auto:<tier>" to route between providers
+                (see modules.model_router). Defaults to POST_MODEL.
+            temperature (float): The sampling temperature. Default is 0.7.
+            use_cache (bool): False bypasses the response cache to get fresh variants.
+            mode (str): "parallel" runs one call per platform concurrently. "combined" asks for
+                all platforms in one call, so the summary is only sent (and billed) once.
+            repair_attempts (int): Rounds of regenerating posts that fail validation.
+                Defaults to POST_REPAIR_ATTEMPTS.
+            platforms: Platform names (see modules.platforms) posts are generated for when a call
+                does not name its own, as a list or a comma-separated string. Defaults to POST_PLATFORMS.
+        """
+        if mode not in POST_MODES:
+            raise ValueError(f"Unknown post generation mode {mode!r}, expected one of {POST_MODES}")
+        self.mode = mode
+        self.model_name = model_name or get_settings().post_model
+        self.temperature = temperature
+        self.use_cache = use_cache
+        self.repair_attempts = get_settings().post_repair_attempts if repair_attempts is None else repair_attempts
+        self.platforms = parse_platforms(platforms or get_settings().post_platforms)
+        self._parallel_chains = {}
+
+    # The shared model and chains are looked up on first use rather than at construction
+    @property
+    def llm(self):
+        return get_llm(self.model_name, self.temperature, self.use_cache)
+
+    def _resolve(self, platforms):
+        return parse_platforms(platforms) if platforms else self.platforms
+
+    def chain(self, platform):
+        return _build_chains(self.model_name, self.temperature, self.use_cache, get_platform(platform))[0]
+
+    def repair_chain(self, platform):
+        return _build_chains(self.model_name, self.temperature, self.use_cache, get_platform(platform))[1]
+
+    def combined_chain(self, platforms=None):
+        return _build_combined_chain(
+            self.model_name, self.temperature, self.use_cache, tuple(map(get_platform, self._resolve(platforms)))
         )
 
-        # Combine the prompt and LLM into a sequence
-        twitter_chain = prompt_template | self.llm | parser
+    def parallel_chain(self, platforms=None):
+        """
+        Returns the fan-out over `platforms`: one branch per platform, all running at once.
+        Built once per platform selection.
+        """
+        from langchain_core.runnables import RunnableLambda, RunnableParallel
+
+        platforms = self._resolve(platforms)
+        if platforms not in self._parallel_chains:
+            # A failing branch returns its exception so the other platforms' posts are kept
+            self._parallel_chains[platforms] = RunnableParallel(branches={
+                platform: RunnableLambda(
+                    lambda x, platform=platform: _capture_errors(self.generate_platform_posts, platform, **x)
+                )
+                for platform in platforms
+            })
+        return self._parallel_chains[platforms]
+
+    def streaming_chain(self, platforms=None):
+        """
+        Returns the streaming fan-out over `platforms`. A branch whose call fails yields its
+        exception as its last chunk instead of ending the other platforms' streams.
+        """
+        from langchain_core.runnables import RunnableGenerator, RunnableParallel
+
+        def capture(chain):
+            def transform(inputs, config):
+                try:
+                    for input_data in inputs:
+                        yield from chain.stream(input_data, config)
+                except Exception as e:
+                    yield e
 
+            return RunnableGenerator(transform)
+
+        return RunnableParallel({platform: capture(self.chain(platform)) for platform in self._resolve(platforms)})
+
+    def generate_platform_posts(self, platform, summary, topic, url):
+        """
+        Generates one platform's posts. At most the platform's `max_concurrency` calls run at once
+        across the process; further calls wait for a slot.
+
+        Returns:
+            The parsed model output.
+        """
         # Create input for the chain
         input_data = {"summary_str": summary, "topic": topic, "url": url}
 
         # Invoke the chain
-        return twitter_chain.invoke(input_data)
-
-    def generate_facebook_posts_chain(self, summary, topic, url):
-        # Define the data structure for Facebook posts
-        class FB_Post(BaseModel):
-            fb_post: str = Field(description="Text content of a Facebook post")
-
-        parser = JsonOutputParser(pydantic_object=FB_Post)
-
-        template = """
-        {summary_str}
-
-        Based on the above content about {topic}, craft three highly engaging and informative Facebook posts.
-        Ensure each post:
-        - Is engaging and encourages interaction, such as likes, comments, and shares.
-        - Can be more detailed and longer than a tweet, with a narrative or story-like structure.
-        - Includes a clear call to action, encouraging followers to engage or learn more.
-        - Includes the following URL at the end of the post: {url}.
-        - Uses a tone that is professional, yet conversational and approachable.
-        - Optionally includes relevant hashtags related to {topic}.
-        
-        {format_instructions}
-
-        FACEBOOK POSTS (in JSON format):
-        """
-        
-        prompt_template = PromptTemplate(
-            template=template,
-            input_variables=["summary_str", "url"],
-            partial_variables={"format_instructions": parser.get_format_instructions()},
-        )
-
-        # Combine the prompt and LLM into a sequence
-        facebook_chain = prompt_template | self.llm | parser
+        with get_platform(platform).slots:
+            with stage(f"post.{platform}", model=self.model_name):
+                return self.chain(platform).invoke(input_data, config=llm_config())
 
+    def generate_combined_posts_chain(self, summary, topic, url, platforms=None):
         # Create input for the chain
         input_data = {"summary_str": summary, "topic": topic, "url": url}
 
         # Invoke the chain
-        # return facebook_chain.invoke(input_data)
-
-        try:
-            # Invoke the chain
-            return facebook_chain.invoke(input_data)
-        except Exception as e:
-            # Log the error and return a structured error message
-            print(f"Error generating Facebook posts: {e}")
-            return {"fb_post": f"Error generating Facebook posts: {e}"}
-
-    def generate_social_media_posts(self, summary, topic, url):
-        twitter_chain = RunnableLambda(lambda x: self.generate_twitter_posts_chain(summary, topic, url))
-        facebook_chain = RunnableLambda(lambda x: self.generate_facebook_posts_chain(summary, topic, url))
-        
-        parallel_chain = RunnableParallel(branches={"twitter": twitter_chain, "facebook": facebook_chain})
-        
-        result = parallel_chain.invoke({"summary_str": summary, "url": url})
-        return result
+        with stage("post.combined", model=self.model_name):
+            result = self.combined_chain(platforms).invoke(input_data, config=llm_config())
+        platforms = self._resolve(platforms)
+        if isinstance(result, dict):
+            return {platform: normalize_posts(platform, result.get(platform, [])) for platform in platforms}
+        # A bare list instead of the object: each platform keeps the posts carrying its own text field
+        items = [item for item in result if isinstance(item, dict)] if isinstance(result, list) else []
+        return {platform: normalize_posts(platform, items) for platform in platforms}
+
+    def generate_social_media_posts(self, summary, topic, url, platforms=None):
+        """
+        Generates the posts for every requested platform.
+
+        In parallel mode every platform's call starts at once, so adding platforms barely adds
+        wall time. A platform whose call fails gets no posts and its error is reported under
+        "errors"; the call only raises if every platform failed.
+
+        Args:
+            summary (str): The article summary.
+            topic (str): The article topic.
+            url (str): The URL to include in the posts.
+            platforms: Platform names, as a list or a comma-separated string. Defaults to the
+                generator's platforms.
+
+        Returns:
+            dict: {"branches": posts by platform, "errors": error message by failed platform}
+        """
+        platforms = self._resolve(platforms)
+        if self.mode == "combined":
+            branches = self.generate_combined_posts_chain(summary, topic, url, platforms)
+            return {"branches": self.validate_and_repair(branches, summary, topic, url), "errors": {}}
+
+        # Without max_concurrency LangChain caps the fan-out at the default thread pool size
+        outcomes = self.parallel_chain(platforms).invoke(
+            {"summary": summary, "topic": topic, "url": url}, config={"max_concurrency": len(platforms)}
+        )["branches"]
+        failures = {platform: outcome for platform, outcome in outcomes.items() if isinstance(outcome, Exception)}
+        if len(failures) == len(outcomes):
+            raise next(iter(failures.values()))
+        branches = {platform: posts for platform, posts in outcomes.items() if platform not in failures}
+        return {
+            "branches": {**self.validate_and_repair(branches, summary, topic, url), **{platform: [] for platform in failures}},
+            "errors": {platform: f"{type(error).__name__}: {error}" for platform, error in failures.items()},
+        }
+
+    def validate_and_repair(self, branches, summary, topic, url):
+        """
+        Validates each platform's posts locally and regenerates only the invalid or missing ones.
+
+        Posts must fit their platform's length limit (tweets count each URL as 23 characters)
+        and include the URL. Each round asks the model for replacements of just the failing
+        posts, listing what was wrong with them, for at most `repair_attempts` rounds. Posts
+        still invalid afterwards, or when a round fails, are kept with a "problems" list.
+        Platforms are repaired in parallel.
+
+        Args:
+            branches (dict): Parsed posts by platform.
+            summary (str): The article summary.
+            topic (str): The article topic.
+            url (str): The URL every post must include.
+
+        Returns:
+            dict: Post dicts by platform.
+        """
+        from langchain_core.runnables import RunnableLambda, RunnableParallel
+
+        if not branches:
+            return {}
+        # Platforms are repaired at once like they were generated, each within its platform's slots
+        repairs = RunnableParallel({
+            platform: RunnableLambda(lambda x, platform=platform, posts=posts: self._repair_platform(platform, posts, **x))
+            for platform, posts in branches.items()
+        })
+        return repairs.invoke({"summary": summary, "topic": topic, "url": url}, config={"max_concurrency": len(branches)})
+
+    def _repair_platform(self, platform, posts, summary, topic, url):
+        posts, invalid, missing = validate_posts(platform, posts, url, POSTS_PER_PLATFORM)
+        for attempt in range(1, self.repair_attempts + 1):
+            if not invalid and not missing:
+                break
+            problems = [f"- Post {index + 1} {'; '.join(reasons)}." for index, reasons in invalid.items()]
+            if missing:
+                problems.append(f"- Only {POSTS_PER_PLATFORM - missing} of the {POSTS_PER_PLATFORM} posts were written.")
+            count = len(invalid) + missing
+            try:
+                with get_platform(platform).slots:
+                    with stage(f"post.repair.{platform}", model=self.model_name, attempt=attempt, posts=count):
+                        replacements = self.repair_chain(platform).invoke(
+                            {"summary_str": summary, "topic": topic, "url": url, "problems": "\n".join(problems), "count": count},
+                            config=llm_config(),
+                        )
+            except Exception:
+                # A failed round (parse error, timeout, open circuit) keeps the posts written so far;
+                # the invalid ones are returned with their problems below
+                break
+            # Replacements fill the invalid slots first, then the missing ones
+            slots = list(invalid) + [None] * missing
+            for slot, replacement in zip(slots, normalize_posts(platform, replacements)):
+                if slot is None:
+                    posts.append(replacement)
+                else:
+                    posts[slot] = replacement
+            posts, invalid, missing = validate_posts(platform, posts, url, POSTS_PER_PLATFORM)
+
+        for index, reasons in invalid.items():
+            posts[index]["problems"] = reasons
+        return posts
+
+    def stream_social_media_posts(self, summary, topic, url, platforms=None):
+        """
+        Streams the posts of every requested platform while their chains run in parallel.
+
+        The JSON parser emits partial output, so each update carries every post parsed so far
+        for that platform, with the last one possibly incomplete. Cached responses arrive as a
+        single update. In parallel mode a platform whose call fails yields its exception as its
+        last update (like `generate_social_media_posts` reports it under "errors") and the
+        other platforms carry on; the call only raises if every platform failed.
+
+        Args:
+            summary (str): The article summary.
+            topic (str): The article topic.
+            url (str): The URL to include in the posts.
+            platforms: Platform names, as a list or a comma-separated string. Defaults to the
+                generator's platforms.
+
+        Yields:
+            tuple: (platform, posts) where platform is a platform name and posts is the
+            partially parsed JSON output for that platform, or the exception its call raised.
+        """
+        platforms = self._resolve(platforms)
+        input_data = {"summary_str": summary, "topic": topic, "url": url}
+
+        if self.mode == "combined":
+            # The combined parser yields the whole object parsed so far on every chunk
+            with stage("post.combined", model=self.model_name, streaming=True):
+                for partial in self.combined_chain(platforms).stream(input_data, config=llm_config()):
+                    for platform in platforms:
+                        if platform in partial:
+                            yield platform, partial[platform]
+            return
+
+        # All platforms share one stream, so they are recorded as a single stage
+        failures = {}
+        with stage("post.parallel", model=self.model_name, streaming=True):
+            for chunk in self.streaming_chain(platforms).stream(
+                input_data, config=llm_config(max_concurrency=len(platforms))
+            ):
+                for platform, posts in chunk.items():
+                    if isinstance(posts, Exception):
+                        failures[platform] = posts
+                    yield platform, posts
+        if len(failures) == len(platforms):
+            raise next(iter(failures.values()))
 
 
 # Example usage
 if __name__ == "__main__":
+    from modules.platforms import PLATFORMS
+
     generator = SocialMediaPostGenerator()
     summary = "This is a sample summary of an article discussing AI's impact on modern technology."
     topic = "AI and Technology"
     url = "https://example.com/blog-post"
 
-    # Generate both Twitter and Facebook posts in parallel
-    social_media_posts = generator.generate_social_media_posts(summary, topic, url)
+    # Generate the posts of every platform in parallel
+    social_media_posts = generator.generate_social_media_posts(summary, topic, url, platforms=PLATFORMS)
 
     # Output the results
-    twitter_posts = social_media_posts["branches"]["twitter"]
-    facebook_posts = social_media_posts["branches"]["facebook"]
-
-    print("Twitter Posts:")
-    for post in twitter_posts:
-        print(post["tweet"])
-
-    print("\nFacebook Posts:")
-    for post in facebook_posts:
-        print(post["fb_post"])
+    for platform, posts in social_media_posts["branches"].items():
+        print(f"{PLATFORMS[platform].display_name} Posts:")
+        for post in posts:
+            print(post[PLATFORMS[platform].post_key])
+        print()
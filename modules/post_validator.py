@@ -0,0 +1,98 @@
+# modules/post_validator.py
+import re
+
+from modules.platforms import get_platform
+
+URL_PATTERN = re.compile(r"https?://\S+")
+
+
+def post_length(platform, text):
+    """
+    Counts a post the way its platform does for the limit. Twitter and Mastodon count every
+    URL as 23 characters, whatever its length.
+
+    Args:
+        platform (str): A registered platform name.
+        text (str): The post.
+
+    Returns:
+        int: The weighted length.
+    """
+    url_length = get_platform(platform).url_length
+    return len(URL_PATTERN.sub("x" * url_length, text)) if url_length else len(text)
+
+
+def normalize_posts(platform, posts):
+    """
+    Coerces parser output into a list of post dicts.
+
+    Models sometimes return a single object instead of a list, a wrapper object
+    ({"tweets": [...]}) or bare strings.
+
+    Args:
+        platform (str): A registered platform name.
+        posts: The parsed model output.
+
+    Returns:
+        list: Post dicts keyed by the platform's text field. Items without text are dropped.
+    """
+    key = get_platform(platform).post_key
+    if isinstance(posts, dict):
+        lists = [value for value in posts.values() if isinstance(value, list)]
+        posts = lists[0] if key not in posts and len(lists) == 1 else [posts]
+    if not isinstance(posts, list):
+        posts = [posts] if posts else []
+
+    normalized = []
+    for post in posts:
+        if isinstance(post, str):
+            post = {key: post}
+        if isinstance(post, dict) and isinstance(post.get(key), str) and post[key].strip():
+            normalized.append({key: post[key].strip()})
+    return normalized
+
+
+def post_problems(platform, text, url):
+    """
+    Checks one post against its platform's constraints.
+
+    Args:
+        platform (str): A registered platform name.
+        text (str): The post text.
+        url (str): The URL every post must include.
+
+    Returns:
+        list: Human-readable problems; empty if the post is valid.
+    """
+    spec = get_platform(platform)
+    problems = []
+    if spec.requires_url and url and url not in text:
+        problems.append(f"does not include the URL {url}")
+    length = post_length(platform, text)
+    if length > spec.max_characters:
+        counted = f" (counting each URL as {spec.url_length})" if spec.url_length else ""
+        problems.append(f"is {length} characters{counted}, over the {spec.max_characters} limit")
+    return problems
+
+
+def validate_posts(platform, posts, url, expected_count=3):
+    """
+    Validates a platform's posts.
+
+    Args:
+        platform (str): A registered platform name.
+        posts: The parsed model output for the platform.
+        url (str): The URL every post must include.
+        expected_count (int): How many posts were asked for. Default is 3.
+
+    Returns:
+        tuple: (normalized posts, {index: problems} for the invalid ones, number of posts missing)
+    """
+    normalized = normalize_posts(platform, posts)
+    key = get_platform(platform).post_key
+    invalid = {}
+    for index, post in enumerate(normalized):
+        problems = post_problems(platform, post[key], url)
+        if problems:
+            invalid[index] = problems
+    return normalized, invalid, max(0, expected_count - len(normalized))
@@ -0,0 +1,375 @@
+# modules/resilience.py
+import contextvars
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from functools import lru_cache
+
+from modules.instrumentation import current_span, record_retry
+from modules.settings import get_settings
+
+RETRYABLE_STATUS_CODES = (408, 409, 429, 500, 502, 503, 504)
+
+
+class CircuitOpenError(Exception):
+    """
+    Raised without calling upstream while its circuit breaker is open.
+    """
+
+
+class DeadlineExceeded(TimeoutError):
+    """
+    Raised when a call and its retries do not finish within the call's deadline.
+    """
+
+
+def is_retryable(error):
+    """
+    Checks whether an error is transient: rate limits, 5xx responses, timeouts and dropped connections.
+
+    Args:
+        error (Exception): The error raised by the SDK.
+
+    Returns:
+        bool: True if the call should be retried.
+    """
+    status_code = getattr(error, "status_code", None) or getattr(getattr(error, "response", None), "status_code", None)
+    if status_code is not None:
+        return status_code in RETRYABLE_STATUS_CODES
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return True
+    # openai.APITimeoutError and APIConnectionError carry no status code
+    return type(error).__name__ in ("APITimeoutError", "APIConnectionError", "Timeout", "ConnectTimeout", "ReadTimeout")
+
+
+def backoff_delay(attempt, error=None, base=0.5, cap=20.0):
+    """
+    Returns the wait before retry number `attempt` (0-based): a Retry-After header if the
+    server sent one, otherwise exponential backoff with full jitter.
+    """
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    retry_after = headers.get("retry-after") if hasattr(headers, "get") else None
+    if retry_after:
+        try:
+            return min(float(retry_after), cap)
+        except ValueError:
+            pass
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+class CircuitBreaker:
+    """
+    Fails fast while an upstream is degraded.
+
+    After `failure_threshold` consecutive transient failures the circuit opens and calls
+    raise CircuitOpenError immediately. After `reset_seconds` one trial call is let through
+    (half-open); its success closes the circuit, its failure opens it again.
+    """
+
+    def __init__(self, name, failure_threshold=5, reset_seconds=30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        return "half_open" if time.monotonic() - self.opened_at >= self.reset_seconds else "open"
+
+    def allow(self):
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return
+            if state == "half_open" and not self._trial_running:
+                self._trial_running = True
+                return
+        raise CircuitOpenError(f"{self.name} circuit is open after {self.failures} consecutive failures")
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_running = False
+            if self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+
+    def release(self):
+        """
+        Ends a call that says nothing about upstream health (it never reached the upstream),
+        letting the next half-open trial through.
+        """
+        with self._lock:
+            self._trial_running = False
+
+
+class LatencyTracker:
+    """
+    Keeps recent successful call latencies to derive the hedging delay.
+    """
+
+    def __init__(self, size=200):
+        self._latencies = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def add(self, seconds):
+        with self._lock:
+            self._latencies.append(seconds)
+
+    def percentile(self, q, min_samples=20):
+        with self._lock:
+            if len(self._latencies) < min_samples:
+                return None
+            ordered = sorted(self._latencies)
+        return ordered[min(len(ordered) - 1, int(q / 100 * len(ordered)))]
+
+
+_breakers = {}
+_trackers = {}
+_registry_lock = threading.Lock()
+
+
+def get_circuit_breaker(name):
+    settings = get_settings()
+    with _registry_lock:
+        if name not in _breakers:
+            _breakers[name] = CircuitBreaker(name, settings.circuit_failure_threshold, settings.circuit_reset_seconds)
+        return _breakers[name]
+
+
+def get_latency_tracker(name):
+    with _registry_lock:
+        if name not in _trackers:
+            _trackers[name] = LatencyTracker()
+        return _trackers[name]
+
+
+@lru_cache(maxsize=None)
+def _attempt_executor():
+    # Every attempt runs here so the caller can stop waiting at its deadline; threads are only
+    # started as needed, so the size just has to exceed the calls in flight
+    return ThreadPoolExecutor(max_workers=256, thread_name_prefix="attempt")
+
+
+def _call_hedged(func, timeout, hedge_delay=None):
+    # Starts func, and a duplicate if the first has not answered after hedge_delay (None never
+    # hedges); the first success wins. Calls still running at the timeout, and a hedged loser,
+    # cannot be cancelled and finish in the background.
+    executor = _attempt_executor()
+    futures = [executor.submit(contextvars.copy_context().run, func)]
+    deadline = time.monotonic() + timeout
+    done, _ = wait(futures, timeout=timeout if hedge_delay is None else min(hedge_delay, timeout))
+    if not done and hedge_delay is not None:
+        span = current_span()
+        if span is not None:
+            span.attributes["hedged"] = True
+        futures.append(executor.submit(contextvars.copy_context().run, func))
+    pending = set(futures)
+    error = None
+    while pending:
+        done, pending = wait(pending, timeout=max(0.0, deadline - time.monotonic()), return_when=FIRST_COMPLETED)
+        if not done:
+            raise DeadlineExceeded(f"No response within {timeout:.1f} s")
+        for future in done:
+            if future.exception() is None:
+                return future.result()
+            error = future.exception()
+    raise error
+
+
+def call_with_resilience(func, name, deadline=None, max_attempts=None, hedge=None):
+    """
+    Calls `func` with retries, an overall deadline, optional hedging and a circuit breaker.
+
+    Transient failures (429, 5xx, timeouts) are retried with jittered exponential backoff
+    (or the server's Retry-After) until `max_attempts` or the deadline is reached. Other
+    errors are raised at once. With hedging on, a duplicate request is started when the
+    first has not answered within the p95 of recent latencies for `name`.
+
+    Args:
+        func (callable): Makes one upstream call; takes no arguments.
+        name (str): The upstream, e.g. "openai.chat". Breakers and latency stats are per name.
+        deadline (float): Seconds for all attempts together. Defaults to LLM_DEADLINE_SECONDS.
+        max_attempts (int): Attempts including the first. Defaults to LLM_MAX_ATTEMPTS.
+        hedge (bool): Send hedged duplicates. Defaults to HEDGE_REQUESTS.
+
+    Returns:
+        The result of `func`.
+
+    Raises:
+        CircuitOpenError: If the upstream's circuit is open.
+        DeadlineExceeded: If the deadline passes before a successful attempt.
+    """
+    settings = get_settings()
+    deadline = settings.llm_deadline_seconds if deadline is None else deadline
+    max_attempts = settings.llm_max_attempts if max_attempts is None else max_attempts
+    hedge = settings.hedge_requests if hedge is None else hedge
+    breaker = get_circuit_breaker(name)
+    tracker = get_latency_tracker(name)
+    end = time.monotonic() + deadline
+
+    for attempt in range(max_attempts):
+        breaker.allow()
+        # Every exit records an outcome or releases the breaker, so a half-open trial never stays taken
+        recorded = False
+        try:
+            remaining = end - time.monotonic()
+            if remaining <= 0:
+                raise DeadlineExceeded(f"{name} call did not succeed within {deadline:.1f} s")
+            hedge_delay = tracker.percentile(95) if hedge else None
+            start = time.monotonic()
+            try:
+                # The attempt is bounded by what is left of the deadline, hedged or not
+                result = _call_hedged(func, remaining, hedge_delay)
+            except Exception as e:
+                recorded = True
+                if not is_retryable(e):
+                    # A bad request says nothing about upstream health
+                    breaker.record_success()
+                    raise
+                breaker.record_failure()
+                delay = backoff_delay(attempt, e)
+                if attempt + 1 >= max_attempts or time.monotonic() + delay >= end:
+                    raise
+                record_retry()
+                time.sleep(delay)
+                continue
+            recorded = True
+            breaker.record_success()
+            tracker.add(time.monotonic() - start)
+            return result
+        finally:
+            if not recorded:
+                breaker.release()
+
+
+# Returned by next() on a stream that ends without a chunk
+_END_OF_STREAM = object()
+
+
+def stream_with_resilience(make_stream, name, deadline=None, max_attempts=None):
+    """
+    Streams from `make_stream()`, retrying like `call_with_resilience` until the first chunk
+    arrives. Once output has been yielded a failure is raised, since it cannot be taken back.
+
+    Args:
+        make_stream (callable): Starts one upstream stream; takes no arguments.
+        name (str): The upstream, e.g. "openai.chat".
+        deadline (float): Seconds until the first chunk, for all attempts together. The rest of
+            the stream is not bounded. Defaults to LLM_DEADLINE_SECONDS.
+        max_attempts (int): Attempts including the first. Defaults to LLM_MAX_ATTEMPTS.
+
+    Yields:
+        The chunks of the first stream that produced output.
+
+    Raises:
+        CircuitOpenError: If the upstream's circuit is open.
+        DeadlineExceeded: If no chunk arrives before the deadline.
+    """
+    settings = get_settings()
+    deadline = settings.llm_deadline_seconds if deadline is None else deadline
+    max_attempts = settings.llm_max_attempts if max_attempts is None else max_attempts
+    breaker = get_circuit_breaker(name)
+    end = time.monotonic() + deadline
+    for attempt in range(max_attempts):
+        breaker.allow()
+        started = False
+        recorded = False
+        try:
+            remaining = end - time.monotonic()
+            if remaining <= 0:
+                raise DeadlineExceeded(f"{name} stream did not start within {deadline:.1f} s")
+            try:
+                chunks = iter(make_stream())
+                # Only the wait for the first chunk runs on the attempt executor; a stream that
+                # misses the deadline is abandoned there
+                first = _call_hedged(lambda: next(chunks, _END_OF_STREAM), remaining)
+                if first is not _END_OF_STREAM:
+                    started = True
+                    yield first
+                    for chunk in chunks:
+                        yield chunk
+            except Exception as e:
+                recorded = True
+                if not is_retryable(e):
+                    breaker.record_success()
+                    raise
+                breaker.record_failure()
+                if started or attempt + 1 >= max_attempts or time.monotonic() >= end:
+                    raise
+                record_retry()
+                time.sleep(backoff_delay(attempt, e))
+                continue
+            recorded = True
+            breaker.record_success()
+            return
+        finally:
+            # The consumer closed the stream early (GeneratorExit): the upstream was answering
+            if not recorded and started:
+                breaker.record_success()
+            elif not recorded:
+                breaker.release()
+
+
+@lru_cache(maxsize=None)
+def _resilient_runnable_class():
+    # Built lazily so importing this module does not import LangChain
+    from langchain_core.runnables import Runnable
+
+    class ResilientRunnable(Runnable):
+        """
+        Wraps a chat model so every invoke (and every item of a batch) goes through
+        `call_with_resilience`, and streams through `stream_with_resilience` and the
+        model's response cache.
+        """
+
+        def __init__(self, bound, name):
+            self.bound = bound
+            self.name = name
+
+        @property
+        def InputType(self):
+            return self.bound.InputType
+
+        @property
+        def OutputType(self):
+            return self.bound.OutputType
+
+        def invoke(self, input, config=None, **kwargs):
+            return call_with_resilience(lambda: self.bound.invoke(input, config, **kwargs), self.name)
+
+        def stream(self, input, config=None, **kwargs):
+            from modules.llm_cache import stream_with_cache
+
+            yield from stream_with_cache(
+                self.bound, input,
+                lambda: stream_with_resilience(lambda: self.bound.stream(input, config, **kwargs), self.name), **kwargs
+            )
+
+    return ResilientRunnable
+
+
+def resilient(runnable, name="openai.chat"):
+    """
+    Wraps a LangChain runnable (usually a chat model) in the resilience layer.
+
+    Args:
+        runnable (Runnable): The runnable to wrap.
+        name (str): The upstream name for the circuit breaker and latency stats.
+
+    Returns:
+        Runnable: The wrapped runnable.
+    """
+    return _resilient_runnable_class()(runnable, name)
@@ -0,0 +1,184 @@
+# modules/run_history.py
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from functools import lru_cache
+
+from modules.dedup import canonicalize_url
+from modules.platforms import PLATFORMS
+from modules.settings import get_settings
+
+RUN_FIELDS = ("id", "canonical_url", "source_url", "topic", "summary", "posts", "post_errors", "image_keys", "created_at")
+
+
+def _posts_text(posts):
+    # The post texts, for the full-text index
+    return "\n".join(
+        str(post.get(PLATFORMS[platform].post_key if platform in PLATFORMS else "", "")) if isinstance(post, dict) else str(post)
+        for platform, platform_posts in (posts or {}).items()
+        for post in platform_posts
+    )
+
+
+class RunHistory:
+    """
+    Every generated summary, its posts and their images, in a local SQLite file.
+
+    Runs are indexed by canonical URL (so tracking parameters and AMP variants find the same
+    article), topic and time, and summaries, topics and post texts are full-text indexed
+    (FTS5) for search.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or get_settings().run_history_path
+        self._lock = threading.Lock()
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS runs (
+                id INTEGER PRIMARY KEY,
+                canonical_url TEXT NOT NULL,
+                source_url TEXT NOT NULL,
+                topic TEXT,
+                summary TEXT NOT NULL,
+                posts TEXT NOT NULL,
+                post_errors TEXT NOT NULL,
+                image_keys TEXT NOT NULL,
+                created_at REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS runs_canonical_url ON runs (canonical_url, created_at)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS runs_topic ON runs (topic)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS runs_created_at ON runs (created_at)")
+        self._conn.execute("CREATE VIRTUAL TABLE IF NOT EXISTS runs_fts USING fts5(topic, summary, posts)")
+        self._conn.commit()
+
+    def add(self, summary_info, posts, post_errors=None):
+        """
+        Stores a finished run.
+
+        Args:
+            summary_info (dict): The summary info (summary, topic, source_url).
+            posts (dict): The posts by platform.
+            post_errors (dict): Error messages by the platforms that failed (optional).
+
+        Returns:
+            int: The run id.
+        """
+        with self._lock:
+            cursor = self._conn.execute(
+                """
+                INSERT INTO runs (canonical_url, source_url, topic, summary, posts, post_errors, image_keys, created_at)
+                VALUES (?, ?, ?, ?, ?, ?, '{}', ?)
+                """,
+                (
+                    canonicalize_url(summary_info["source_url"]), summary_info["source_url"], summary_info.get("topic"),
+                    summary_info["summary"], json.dumps(posts), json.dumps(post_errors or {}), time.time(),
+                ),
+            )
+            self._conn.execute(
+                "INSERT INTO runs_fts (rowid, topic, summary, posts) VALUES (?, ?, ?, ?)",
+                (cursor.lastrowid, summary_info.get("topic") or "", summary_info["summary"], _posts_text(posts)),
+            )
+            self._conn.commit()
+        return cursor.lastrowid
+
+    def set_images(self, url, platform, image_keys):
+        """
+        Attaches image keys for a platform to the latest run of the article behind `url`.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id, image_keys FROM runs WHERE canonical_url = ? ORDER BY created_at DESC LIMIT 1",
+                (canonicalize_url(url),),
+            ).fetchone()
+            if row is None:
+                return
+            stored = json.loads(row[1])
+            stored[platform] = image_keys
+            self._conn.execute("UPDATE runs SET image_keys = ? WHERE id = ?", (json.dumps(stored), row[0]))
+            self._conn.commit()
+
+    def _rows_to_runs(self, rows):
+        runs = []
+        for row in rows:
+            run = dict(zip(RUN_FIELDS, row))
+            for field in ("posts", "post_errors", "image_keys"):
+                run[field] = json.loads(run[field])
+            runs.append(run)
+        return runs
+
+    def latest(self, url):
+        """
+        Returns the latest run for the article behind `url`, or None.
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {', '.join(RUN_FIELDS)} FROM runs WHERE canonical_url = ? ORDER BY created_at DESC LIMIT 1",
+                (canonicalize_url(url),),
+            ).fetchall()
+        runs = self._rows_to_runs(rows)
+        return runs[0] if runs else None
+
+    def get(self, run_id):
+        with self._lock:
+            rows = self._conn.execute(f"SELECT {', '.join(RUN_FIELDS)} FROM runs WHERE id = ?", (run_id,)).fetchall()
+        runs = self._rows_to_runs(rows)
+        return runs[0] if runs else None
+
+    def recent(self, limit=20):
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {', '.join(RUN_FIELDS)} FROM runs ORDER BY created_at DESC LIMIT ?", (limit,)
+            ).fetchall()
+        return self._rows_to_runs(rows)
+
+    def search(self, query, limit=20):
+        """
+        Finds runs by URL or by words in their topic, summary or posts.
+
+        Args:
+            query (str): A URL (matched by canonical URL) or free text. Every word must match;
+                the last word also matches as a prefix.
+            limit (int): Maximum runs returned. Default is 20.
+
+        Returns:
+            list: Runs, best match first.
+        """
+        if re.match(r"https?://", query.strip()):
+            run = self.latest(query)
+            return [run] if run else []
+        words = re.findall(r"\w+", query)
+        if not words:
+            return self.recent(limit)
+        # Quoted so FTS5 operators in the input are taken literally
+        match = " ".join(f'"{word}"' for word in words[:-1]) + f' "{words[-1]}"*'
+        with self._lock:
+            rows = self._conn.execute(
+                f"""
+                SELECT {', '.join(f'runs.{field}' for field in RUN_FIELDS)} FROM runs_fts
+                JOIN runs ON runs.id = runs_fts.rowid
+                WHERE runs_fts MATCH ? ORDER BY bm25(runs_fts) LIMIT ?
+                """,
+                (match, limit),
+            ).fetchall()
+        return self._rows_to_runs(rows)
+
+
+@lru_cache(maxsize=None)
+def get_run_history():
+    """
+    Returns the process-wide run history at RUN_HISTORY_PATH.
+
+    Returns:
+        RunHistory: The shared history.
+    """
+    return RunHistory()
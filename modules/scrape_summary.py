@@ -1,79 +1,322 @@
-from langchain_openai import ChatOpenAI
-from langchain_community.document_loaders import WebBaseLoader
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain.prompts import PromptTemplate
-from langchain.chains.combine_documents import create_stuff_documents_chain
-import os
-from decouple import config
-from modules.post_generator import SocialMediaPostGenerator
-from modules.utils import clean_text, calculate_token_size
-
-# Enable tracing
-os.environ["LANGCHAIN_TRACING_V2"] = "false"
-os.environ["LANGCHAIN_API_KEY"] = config("LANGCHAIN_API_KEY")
-os.environ["LANGCHAIN_PROJECT"] = config("LANGCHAIN_PROJECT")
-os.environ["OPENAI_API_KEY"] = config("OPENAI_API_KEY")
-os.environ["GROQ_API_KEY"] = config("GROQ_API_KEY")
-os.environ["ANTHROPIC_API_KEY"] = config("ANTHROPIC_API_KEY")
+from functools import lru_cache
+from modules.utils import calculate_token_size
+from modules.content_extractor import extract_main_content, fetch_html
+from modules.chunk_ranker import prune_to_budget
+from modules.dedup import get_summary_index, simhash
+from modules.settings import get_settings
+from modules.token_counter import count_batch, count_tokens, merge_overlapping_chunks
+from modules.model_router import get_llm
+from modules.instrumentation import llm_config, stage
+
+# LangChain is imported on first use, and API keys are exported by modules.settings when the
+# first model client is built, so importing this module stays cheap.
+
+# Each prompt is a static system message followed by the page content, so the instructions are an
+# identical prefix on every call that the provider can serve from its prompt cache.
+SUMMARY_TEMPLATE = (
+    "Please summarize the content the user sends, ensuring that the summary is concise.",
+    """Content: {context}
+
+Summarize the content above in no more than {token_limit} tokens.
+
+Summary:""",
+)
+
+MAP_TEMPLATE = (
+    "The content the user sends is one section of a longer document. Summarize it, keeping the key facts, names, "
+    "figures and conclusions.",
+    """Content: {context}
+
+Summarize the section above in no more than {token_limit} tokens.
+
+Section Summary:""",
+)
+
+REDUCE_TEMPLATE = (
+    "The user sends summaries of consecutive sections of a longer document. Combine them into a single coherent, "
+    "concise summary of the whole document.",
+    """Section Summaries: {context}
+
+Combine the section summaries above into a summary that does not exceed {token_limit} tokens.
+
+Summary:""",
+)
+
+
+@lru_cache(maxsize=None)
+def _build_prompts():
+    from langchain_core.prompts import ChatPromptTemplate
+
+    return tuple(
+        ChatPromptTemplate.from_messages([("system", system), ("human", human)])
+        for system, human in (SUMMARY_TEMPLATE, MAP_TEMPLATE, REDUCE_TEMPLATE)
+    )
+
+
+def __getattr__(name):
+    # SUMMARY_PROMPT, MAP_PROMPT and REDUCE_PROMPT are built on first access
+    prompt_names = ("SUMMARY_PROMPT", "MAP_PROMPT", "REDUCE_PROMPT")
+    if name in prompt_names:
+        return _build_prompts()[prompt_names.index(name)]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+@lru_cache(maxsize=None)
+def _build_chains(model_name, temperature, use_cache):
+    # Compiled once per model configuration and shared by every generator instance
+    from langchain.chains.combine_documents import create_stuff_documents_chain
+
+    llm = get_llm(model_name, temperature, use_cache)
+    return tuple(create_stuff_documents_chain(llm=llm, prompt=prompt) for prompt in _build_prompts())
+
+
+@lru_cache(maxsize=None)
+def _get_text_splitter(chunk_size, chunk_overlap):
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+    # start_index lets token accounting count the chunk overlap only once
+    return RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap, add_start_index=True)
+
 
 class ScrapeSummaryGenerator:
-    def __init__(self, model_name="gpt-4o", temperature=0, token_limit_threshold=25000):
-        self.llm = ChatOpenAI(model=model_name, temperature=temperature)
+    def __init__(self, model_name=None, temperature=0, token_limit_threshold=25000, use_cache=True,
+                 map_group_tokens=8000, map_summary_tokens=500, reduce_fanout=4, max_concurrency=8,
+                 summary_token_budget=None):
+        # use_cache=False bypasses the on-disk response cache. model_name defaults to SUMMARY_MODEL, which
+        # may be "auto:<tier>" to route between providers (modules.model_router).
+        self.model_name = model_name or get_settings().summary_model
+        self.temperature = temperature
+        self.use_cache = use_cache
         self.token_limit_threshold = token_limit_threshold
+        # Map-reduce settings for pages over token_limit_threshold
+        self.map_group_tokens = map_group_tokens
+        self.map_summary_tokens = map_summary_tokens
+        self.reduce_fanout = reduce_fanout
+        self.max_concurrency = max_concurrency
+        # Chunks beyond this many tokens are pruned by relevance before summarizing; 0 disables pruning
+        self.summary_token_budget = get_settings().summary_token_budget if summary_token_budget is None else summary_token_budget
         self.summary = None
         self.source_url = None
         self.topic = None
         self.final_token_size = None
+        self.input_token_size = None
+        # SimHash of the cleaned page, and the page whose summary was reused for it
+        self.content_hash = None
+        self.reused_from = None
+
+    # The shared model and chains are looked up on first use rather than at construction
+    @property
+    def llm(self):
+        return get_llm(self.model_name, self.temperature, self.use_cache)
+
+    @property
+    def summary_chain(self):
+        return _build_chains(self.model_name, self.temperature, self.use_cache)[0]
+
+    @property
+    def map_chain(self):
+        return _build_chains(self.model_name, self.temperature, self.use_cache)[1]
+
+    @property
+    def reduce_chain(self):
+        return _build_chains(self.model_name, self.temperature, self.use_cache)[2]
 
     def load_and_clean_documents(self, url):
-        loader = WebBaseLoader(url)
-        docs = loader.load()
-
-        for doc in docs:
-            cleaned_content = clean_text(doc.page_content)
-            doc.page_content = cleaned_content
-            self.source_url = doc.metadata.get("source")
-            self.topic = doc.metadata.get("title")
-        
+        """
+        Fetches a page and keeps only its main article text.
+
+        The download is streamed and capped at FETCH_MAX_BYTES, non-HTML responses are
+        rejected before the body is read, and navigation, banners, footers and related-post
+        lists are stripped before anything is tokenized.
+
+        Args:
+            url (str): The URL of the post.
+
+        Returns:
+            list: A single Document with the article text and "source" and "title" metadata.
+        """
+        settings = get_settings()
+        with stage("scrape", url=url) as span:
+            html, charset, truncated = fetch_html(url, max_bytes=settings.fetch_max_bytes, timeout=settings.fetch_timeout)
+            span.attributes.update(bytes=len(html), truncated=truncated)
+
+        with stage("clean"):
+            docs = self.clean_documents(url, html, charset)
+
         return docs
 
+    def clean_documents(self, url, html, charset=None):
+        # Extracts the article body and records the page source and title
+        from langchain_core.documents import Document
+
+        title, text = extract_main_content(html, charset)
+        self.source_url = url
+        self.topic = title
+        self.content_hash = simhash(text)
+        return [Document(page_content=text, metadata={"source": url, "title": title})]
+
     def split_documents(self, docs, chunk_size=2000, chunk_overlap=200):
-        text_splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
-        return text_splitter.split_documents(docs)
+        with stage("split"):
+            return _get_text_splitter(chunk_size, chunk_overlap).split_documents(docs)
 
     def summarize(self, docs):
-        token_size = calculate_token_size(docs, self.llm)
-        print("Total Tokens:", token_size)
+        if self._reuse_summary():
+            return
+        summary_chain, inputs = self._prepare_summary(docs)
+        with stage("summarize", model=self.model_name):
+            self.summary = summary_chain.invoke(inputs, config=llm_config())
+        self.final_token_size = count_tokens(self.summary, self.model_name)
+        self._index_summary()
+
+    def stream_summary(self, docs):
+        """
+        Same as `summarize`, but yields the summary text as the model produces it.
+
+        For pages over `token_limit_threshold` the map and intermediate reduce levels run
+        first and only the final reduce is streamed. Streamed calls use the response cache like
+        `summarize`; a cached summary arrives as a single chunk.
+
+        Args:
+            docs (list): The split documents to summarize.
+
+        Yields:
+            str: Chunks of summary text. `self.summary` holds the full text once exhausted.
+        """
+        if self._reuse_summary():
+            yield self.summary
+            return
+        summary_chain, inputs = self._prepare_summary(docs)
+        chunks = []
+        with stage("summarize", model=self.model_name, streaming=True):
+            for chunk in summary_chain.stream(inputs, config=llm_config()):
+                chunks.append(chunk)
+                yield chunk
+        self.summary = "".join(chunks)
+        self.final_token_size = count_tokens(self.summary, self.model_name)
+        self._index_summary()
 
-        if token_size <= self.token_limit_threshold:
-            custom_prompt_template = PromptTemplate(
-                input_variables=["context"],
-                template="""
-                Please summarize the following content, ensuring that the summary is concise and does not exceed {token_limit} tokens.
+    def _reuse_summary(self):
+        # Takes the summary of an earlier near-duplicate page (same article under another URL,
+        # tracking parameters, AMP variant or syndicated copy). Skipped when the cache is bypassed.
+        if not self.use_cache or self.content_hash is None:
+            return False
+        with stage("dedup") as span:
+            match = get_summary_index().find(self.content_hash, self.model_name)
+            span.attributes["hit"] = match is not None
+        if match is None:
+            return False
+        self.summary = match["summary"]
+        self.final_token_size = match["final_token_size"]
+        self.input_token_size = match["input_token_size"]
+        self.reused_from = match["canonical_url"]
+        return True
 
-                Content: {context}
+    def _index_summary(self):
+        # Like `_reuse_summary`, skipped when the cache is bypassed
+        if self.use_cache and self.content_hash is not None and self.source_url:
+            get_summary_index().add(self.source_url, self.content_hash, self.model_name, {
+                "summary": self.summary,
+                "final_token_size": self.final_token_size,
+                "input_token_size": self.input_token_size,
+            })
 
-                Summary:
-                """,
+    def _prepare_summary(self, docs):
+        # Returns the chain and input of the call that produces the final summary
+        pruned = False
+        if self.summary_token_budget:
+            with stage("prune") as span:
+                kept = prune_to_budget(docs, self.summary_token_budget, self.topic or "", self.model_name)
+                span.attributes.update(chunks=len(docs), kept_chunks=len(kept))
+            pruned = len(kept) < len(docs)
+            docs = kept
+
+        with stage("token_count") as span:
+            self.input_token_size = calculate_token_size(docs, self.model_name)
+            span.attributes["input_tokens"] = self.input_token_size
+
+        if self.input_token_size <= self.token_limit_threshold:
+            if pruned:
+                # The budget counts the overlap between kept chunks once, so the call gets the
+                # same merged text rather than the overlapping chunks
+                from langchain_core.documents import Document
+
+                docs = [
+                    Document(page_content=text, metadata={"source": self.source_url, "title": self.topic})
+                    for text in merge_overlapping_chunks(docs)
+                ]
+            return self.summary_chain, {"context": docs, "token_limit": 5000}
+        # The map and intermediate reduce levels are recorded under their own stage
+        with stage("summarize.map_reduce", model=self.model_name):
+            return self._map_and_partially_reduce(docs)
+
+    def map_reduce_summarize(self, docs, token_limit=5000):
+        """
+        Summarizes documents too large for a single call.
+
+        Consecutive chunks are packed into groups of at most `map_group_tokens` and summarized
+        in parallel (map). The partial summaries are then combined `reduce_fanout` at a time,
+        level by level, until a single summary is left (tree reduce). Each level runs with at
+        most `max_concurrency` concurrent calls, so wall-clock time grows with the depth of the
+        tree rather than the number of chunks.
+
+        Args:
+            docs (list): The split documents to summarize.
+            token_limit (int): Maximum tokens for the final summary. Default is 5000.
+
+        Returns:
+            str: The final summary.
+        """
+        with stage("summarize.map_reduce", model=self.model_name):
+            reduce_chain, inputs = self._map_and_partially_reduce(docs, token_limit)
+            return reduce_chain.invoke(inputs, config=llm_config())
+
+    def _map_and_partially_reduce(self, docs, token_limit=5000):
+        # Runs every level of the map-reduce except the last one and returns the final reduce call
+        from langchain_core.documents import Document
+
+        config = llm_config(max_concurrency=self.max_concurrency)
+
+        groups = self._group_by_tokens(docs, self.map_group_tokens)
+        partials = self.map_chain.batch(
+            [{"context": group, "token_limit": self.map_summary_tokens} for group in groups], config=config
+        )
+
+        while len(partials) > self.reduce_fanout:
+            groups = [
+                [Document(page_content=partial) for partial in partials[i:i + self.reduce_fanout]]
+                for i in range(0, len(partials), self.reduce_fanout)
+            ]
+            partials = self.reduce_chain.batch(
+                [{"context": group, "token_limit": self.map_summary_tokens} for group in groups], config=config
             )
 
-            summary_chain = create_stuff_documents_chain(llm=self.llm, prompt=custom_prompt_template)
-            self.summary = summary_chain.invoke({"context": docs, "token_limit": 5000})
-            self.final_token_size = self.llm.get_num_tokens(self.summary)
-        else:
-            self.summary = f"CONTENT TOKEN SIZE TOO LARGE ... NO MORE THAN {self.token_limit_threshold} ALLOWED, FOUND {token_size}"
+        return self.reduce_chain, {"context": [Document(page_content=partial) for partial in partials], "token_limit": token_limit}
+
+    def _group_by_tokens(self, docs, max_tokens):
+        groups, current, current_tokens = [], [], 0
+        for doc, tokens in zip(docs, count_batch([doc.page_content for doc in docs], self.model_name)):
+            if current and current_tokens + tokens > max_tokens:
+                groups.append(current)
+                current, current_tokens = [], 0
+            current.append(doc)
+            current_tokens += tokens
+        if current:
+            groups.append(current)
+        return groups
 
     def get_summary_info(self):
         return {
             "summary": self.summary,
             "final_token_size": self.final_token_size,
+            "input_token_size": self.input_token_size,
             "source_url": self.source_url,
             "topic": self.topic,
+            "reused_from": self.reused_from,
         }
 
 # Example usage
 if __name__ == "__main__":
-    generator = SocialMediaPostGenerator()
+    generator = ScrapeSummaryGenerator()
     docs = generator.load_and_clean_documents("https://cyberizegroup.com/unlock-the-power-of-google-ads-how-to-get-started-with-google-ad-services/")
     split_docs = generator.split_documents(docs)
     generator.summarize(split_docs)
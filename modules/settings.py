@@ -0,0 +1,228 @@
+# modules/settings.py
+import os
+import threading
+from functools import cached_property, lru_cache
+
+from decouple import config
+
+
+class Settings:
+    """
+    Application configuration, read from the environment or a .env file on first access.
+
+    Nothing is read at import time, and keys for providers that are not used (Groq,
+    Anthropic, LangSmith) are optional.
+    """
+
+    def __init__(self):
+        self._environment_applied = False
+        self._lock = threading.Lock()
+
+    @cached_property
+    def openai_api_key(self):
+        return config("OPENAI_API_KEY", default=None)
+
+    @cached_property
+    def openai_base_url(self):
+        return config("OPENAI_BASE_URL", default=None)
+
+    @cached_property
+    def groq_api_key(self):
+        return config("GROQ_API_KEY", default=None)
+
+    @cached_property
+    def anthropic_api_key(self):
+        return config("ANTHROPIC_API_KEY", default=None)
+
+    @cached_property
+    def groq_base_url(self):
+        return config("GROQ_BASE_URL", default="https://api.groq.com/openai/v1")
+
+    @cached_property
+    def anthropic_base_url(self):
+        # Anthropic's OpenAI-compatible endpoint
+        return config("ANTHROPIC_BASE_URL", default="https://api.anthropic.com/v1/")
+
+    @cached_property
+    def model_backends(self):
+        # provider/model=tier entries the router may use; unset uses modules.model_router.DEFAULT_BACKENDS
+        return config("MODEL_BACKENDS", default=None)
+
+    @cached_property
+    def summary_model(self):
+        # An OpenAI model name or "auto:<tier>" to route between providers
+        return config("SUMMARY_MODEL", default="gpt-4o")
+
+    @cached_property
+    def post_model(self):
+        return config("POST_MODEL", default="gpt-4o")
+
+    @cached_property
+    def langchain_api_key(self):
+        return config("LANGCHAIN_API_KEY", default=None)
+
+    @cached_property
+    def langchain_project(self):
+        return config("LANGCHAIN_PROJECT", default=None)
+
+    @cached_property
+    def llm_cache_path(self):
+        return config("LLM_CACHE_PATH", default=".cache/llm_cache.sqlite")
+
+    @cached_property
+    def llm_cache_ttl_seconds(self):
+        return config("LLM_CACHE_TTL_SECONDS", default=7 * 24 * 3600, cast=int)
+
+    @cached_property
+    def llm_cache_max_entries(self):
+        return config("LLM_CACHE_MAX_ENTRIES", default=10000, cast=int)
+
+    @cached_property
+    def image_store_dir(self):
+        return config("IMAGE_STORE_DIR", default=".cache/images")
+
+    @cached_property
+    def fetch_max_bytes(self):
+        # Pages are truncated at this size, so one huge page cannot exhaust worker memory
+        return config("FETCH_MAX_BYTES", default=5_000_000, cast=int)
+
+    @cached_property
+    def fetch_timeout(self):
+        return config("FETCH_TIMEOUT", default=30, cast=float)
+
+    @cached_property
+    def summary_token_budget(self):
+        # Summary input is pruned to the most relevant chunks within this many tokens; 0 keeps every chunk
+        return config("SUMMARY_TOKEN_BUDGET", default=0, cast=int)
+
+    @cached_property
+    def summary_index_path(self):
+        return config("SUMMARY_INDEX_PATH", default=".cache/summaries.sqlite")
+
+    @cached_property
+    def dedup_max_distance(self):
+        # Pages whose content SimHash differs in at most this many bits (max 7) share a summary
+        from modules.dedup import DEFAULT_MAX_DISTANCE
+
+        return config("DEDUP_MAX_DISTANCE", default=DEFAULT_MAX_DISTANCE, cast=int)
+
+    @cached_property
+    def run_history_path(self):
+        return config("RUN_HISTORY_PATH", default=".cache/runs.sqlite")
+
+    @cached_property
+    def feed_state_path(self):
+        return config("FEED_STATE_PATH", default=".cache/feeds.sqlite")
+
+    @cached_property
+    def job_queue_path(self):
+        return config("JOB_QUEUE_PATH", default=".cache/jobs.sqlite")
+
+    @cached_property
+    def job_lease_seconds(self):
+        # A running job whose worker has not renewed its lease for this long is requeued
+        return config("JOB_LEASE_SECONDS", default=60, cast=float)
+
+    @cached_property
+    def job_max_attempts(self):
+        # Claims before a job that keeps losing its worker (crash, hang) is marked as failed
+        return config("JOB_MAX_ATTEMPTS", default=3, cast=int)
+
+    @cached_property
+    def job_stall_seconds(self):
+        # A running job without a stage or result update for this long counts as hung and its lease runs out
+        return config("JOB_STALL_SECONDS", default=900, cast=float)
+
+    @cached_property
+    def job_wait_seconds(self):
+        # How long app.py waits for a job service job before giving up
+        return config("JOB_WAIT_SECONDS", default=300, cast=float)
+
+    @cached_property
+    def job_service_url(self):
+        # When set, app.py submits work to the job service instead of running the pipeline itself
+        return config("JOB_SERVICE_URL", default=None)
+
+    @cached_property
+    def llm_timeout_seconds(self):
+        # Timeout of a single request to the model API
+        return config("LLM_TIMEOUT_SECONDS", default=60, cast=float)
+
+    @cached_property
+    def llm_deadline_seconds(self):
+        # Deadline for one model call including its retries
+        return config("LLM_DEADLINE_SECONDS", default=150, cast=float)
+
+    @cached_property
+    def llm_max_attempts(self):
+        return config("LLM_MAX_ATTEMPTS", default=4, cast=int)
+
+    @cached_property
+    def hedge_requests(self):
+        # Send a duplicate request when the first is slower than the recent p95; costs extra tokens
+        return config("HEDGE_REQUESTS", default=False, cast=bool)
+
+    @cached_property
+    def circuit_failure_threshold(self):
+        return config("CIRCUIT_FAILURE_THRESHOLD", default=5, cast=int)
+
+    @cached_property
+    def circuit_reset_seconds(self):
+        return config("CIRCUIT_RESET_SECONDS", default=30, cast=float)
+
+    @cached_property
+    def post_platforms(self):
+        # Platforms posts are generated for by default, comma-separated (see modules.platforms)
+        return config("POST_PLATFORMS", default="twitter,facebook")
+
+    @cached_property
+    def platform_concurrency(self):
+        # Calls for one platform in flight at once across the process
+        return config("PLATFORM_CONCURRENCY", default=8, cast=int)
+
+    @cached_property
+    def post_repair_attempts(self):
+        # Rounds of regenerating only the posts that fail local validation
+        return config("POST_REPAIR_ATTEMPTS", default=2, cast=int)
+
+    @cached_property
+    def trace_path(self):
+        # JSONL file that receives one line per pipeline stage; unset disables the trace
+        return config("TRACE_PATH", default=None)
+
+    @cached_property
+    def metrics_port(self):
+        return config("METRICS_PORT", default=None, cast=lambda value: int(value) if value else None)
+
+    def apply_environment(self):
+        """
+        Exports the API keys that are set to os.environ for the SDKs that read them there.
+        Runs once; later calls are no-ops.
+        """
+        with self._lock:
+            if self._environment_applied:
+                return
+            # Tracing stays disabled
+            os.environ["LANGCHAIN_TRACING_V2"] = "false"
+            for name, value in (
+                ("LANGCHAIN_API_KEY", self.langchain_api_key),
+                ("LANGCHAIN_PROJECT", self.langchain_project),
+                ("OPENAI_API_KEY", self.openai_api_key),
+                ("OPENAI_BASE_URL", self.openai_base_url),
+                ("GROQ_API_KEY", self.groq_api_key),
+                ("ANTHROPIC_API_KEY", self.anthropic_api_key),
+            ):
+                if value:
+                    os.environ[name] = value
+            self._environment_applied = True
+
+
+@lru_cache(maxsize=None)
+def get_settings():
+    """
+    Returns the process-wide settings object.
+
+    Returns:
+        Settings: The shared settings.
+    """
+    return Settings()
@@ -0,0 +1,124 @@
+# modules/token_counter.py
+from functools import lru_cache
+
+DEFAULT_ENCODING = "o200k_base"
+
+
+@lru_cache(maxsize=None)
+def get_encoding(model_name="gpt-4o"):
+    """
+    Returns the tiktoken encoder for a model, loaded once per process.
+
+    Args:
+        model_name (str): The model name. Unknown models fall back to o200k_base.
+
+    Returns:
+        tiktoken.Encoding: The encoder.
+    """
+    import tiktoken
+
+    try:
+        return tiktoken.encoding_for_model(model_name)
+    except KeyError:
+        return tiktoken.get_encoding(DEFAULT_ENCODING)
+
+
+def count_tokens(text, model_name="gpt-4o"):
+    """
+    Counts the tokens in a single text.
+
+    Args:
+        text (str): The text to count.
+        model_name (str): The model whose tokenizer to use. Default is "gpt-4o".
+
+    Returns:
+        int: Number of tokens.
+    """
+    return len(get_encoding(model_name).encode(text or "", disallowed_special=()))
+
+
+def count_batch(texts, model_name="gpt-4o"):
+    """
+    Counts the tokens of many texts in one batched, multi-threaded encode.
+
+    Args:
+        texts (list): The texts to count.
+        model_name (str): The model whose tokenizer to use. Default is "gpt-4o".
+
+    Returns:
+        list: Number of tokens per text.
+    """
+    return [len(tokens) for tokens in get_encoding(model_name).encode_batch(list(texts), disallowed_special=())]
+
+
+def merge_overlapping_chunks(documents):
+    """
+    Rebuilds the non-overlapping text behind a list of split documents.
+
+    Chunks produced with `add_start_index=True` carry their offset in the source text, so
+    the part of each chunk that repeats the previous chunk's tail is dropped. Documents
+    without a start index are kept whole.
+
+    Args:
+        documents (list): Documents, possibly overlapping chunks of the same source.
+
+    Returns:
+        list: One text per source document (or per document without a start index).
+    """
+    texts = []
+    # source -> (index into texts, end offset covered so far, start offset of the last chunk)
+    open_sources = {}
+    for doc in documents:
+        start = doc.metadata.get("start_index")
+        if start is None:
+            texts.append(doc.page_content)
+            continue
+        source = doc.metadata.get("source")
+        if source not in open_sources or start < open_sources[source][2]:
+            # First chunk of this source, or the offsets restarted: a new source text
+            open_sources[source] = (len(texts), 0, start)
+            texts.append("")
+        index, end, _ = open_sources[source]
+        content = doc.page_content
+        if start < end:
+            content = content[end - start:]
+        texts[index] += content
+        open_sources[source] = (index, max(end, start + len(doc.page_content)), start)
+    return texts
+
+
+def count_document_tokens(documents, model_name="gpt-4o"):
+    """
+    Counts the tokens of the text behind a list of documents, counting chunk overlap once.
+
+    Args:
+        documents (list): The documents or split chunks.
+        model_name (str): The model whose tokenizer to use. Default is "gpt-4o".
+
+    Returns:
+        int: Total number of tokens.
+    """
+    return sum(count_batch(merge_overlapping_chunks(documents), model_name))
+
+
+def count_post_tokens(posts_by_platform, model_name="gpt-4o"):
+    """
+    Counts the tokens of each generated post, for budgeting.
+
+    Args:
+        posts_by_platform (dict): Platform name to list of post dicts (e.g. {"tweet": "..."}).
+        model_name (str): The model whose tokenizer to use. Default is "gpt-4o".
+
+    Returns:
+        dict: Platform name to list of token counts, one per post.
+    """
+    counts = {}
+    for platform, posts in posts_by_platform.items():
+        if isinstance(posts, dict):
+            posts = [posts]
+        texts = [
+            " ".join(str(value) for key, value in post.items() if key != "problems") if isinstance(post, dict) else str(post)
+            for post in posts
+        ]
+        counts[platform] = count_batch(texts, model_name)
+    return counts
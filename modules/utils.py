@@ -1,11 +1,30 @@
 import re
-import requests
 from io import BytesIO
-from PIL import Image
+from modules.token_counter import count_document_tokens
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+def is_png(data):
+    """
+    Checks whether bytes start with the PNG file signature.
+
+    Args:
+        data (bytes): The image bytes (at least the first 8).
+
+    Returns:
+        bool: True if the data is a PNG.
+    """
+    return data[:8] == PNG_SIGNATURE
 
 # Function to download image from a URL and return it as bytes
 def download_image(image_url):
+    import requests
+    from PIL import Image
+
     response = requests.get(image_url)
+    # DALL-E already serves PNG; only transcode other formats
+    if is_png(response.content):
+        return response.content
     img = Image.open(BytesIO(response.content))
     byte_arr = BytesIO()
     img.save(byte_arr, format="PNG")
@@ -32,12 +51,16 @@ def clean_text(text):
 def calculate_token_size(documents, model):
     """
     Function to calculate the total token size of a document.
+
+    Overlapping chunks from `split_documents` are counted once, with a single
+    batched encode using the model's cached tiktoken encoder.
     
     Args:
         documents (list): List of documents to calculate token size.
-        model: The language model to use for token calculation.
+        model: The language model (or model name) whose tokenizer to use.
     
     Returns:
         int: Total number of tokens in the document.
     """
-    return sum(model.get_num_tokens(doc.page_content) for doc in documents)
+    model_name = model if isinstance(model, str) else getattr(model, "model_name", "gpt-4o")
+    return count_document_tokens(documents, model_name)
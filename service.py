@@ -0,0 +1,18 @@
+import argparse
+
+from modules.job_service import serve
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the job queue, its workers and the job HTTP API.")
+    parser.add_argument("--host", default="127.0.0.1", help="Interface to bind")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=2, help="Jobs processed concurrently")
+    parser.add_argument("--queue", help="SQLite file of the job queue (default: JOB_QUEUE_PATH)")
+    args = parser.parse_args()
+
+    serve(host=args.host, port=args.port, concurrency=args.workers, queue_path=args.queue)
+
+
+if __name__ == "__main__":
+    main()